@@ -6,8 +6,10 @@ from django.urls import path
 
 from tasks import views
 from tasks.services import tasks_actions, objects
+from tasks.services.autocomplete import autocomplete_view
 from tasks.services.notifications import mark_notifications_as_read, mark_one_notifications_as_read
-from tasks.services.service import update_cache_view
+from tasks.services.service import update_cache_view, cache_stats_view
+from tasks.services.tree_json import tree_json_view
 from tasks.services.tasks_actions import update_date_task
 
 urlpatterns = [
@@ -34,9 +36,13 @@ urlpatterns = [
     path("ajax/objects/<slug:slug>/edit", views.get_obj_edit_form, name="ajax-obj-edit-form"),
     path('ajax/tasks/<int:task_id>/action/<str:action_type>', views.get_task_action_form, name='ajax-task-action-form'),
     path('ajax/tasks/<int:task_id>/comment', views.get_task_comment_form, name='ajax-task-action-form-comment'),
+    path("ajax/objects-tree/", views.get_objects_tree_level, name="ajax-objects-tree"),
+    path("ajax/trees/<str:kind>/<slug:etag>.json", tree_json_view, name="tree-json"),
+    path("ajax/autocomplete/<str:kind>/", autocomplete_view, name="autocomplete"),
     path('notifications/read/all', mark_notifications_as_read, name='mark_notifications_as_read'),
     path("notifications/read/<int:notification_id>/", mark_one_notifications_as_read, name="mark_one_notifications_as_read"),
     path("update-cache/", update_cache_view, name="update_cache"),
+    path("cache-stats/", cache_stats_view, name="cache_stats"),
     path("update-date_task/", update_date_task, name="update_date_task"),
 
     # CKEDITOR
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "tasks"
+
+    def ready(self):
+        from tasks.services.object_hierarchy import connect_object_hierarchy_signals
+        from tasks.services.search import connect_search_signals
+        from tasks.services.task_visibility import connect_task_visibility_signals
+        from tasks.services.tree_nodes.cached_tree_nodes import connect_tree_signals
+
+        connect_tree_signals()
+        connect_task_visibility_signals()
+        connect_search_signals()
+        connect_object_hierarchy_signals()
@@ -1,14 +1,24 @@
+import hashlib
 from urllib.parse import urlencode
 
 import django_filters
-from django.core.cache import cache
 from django.db.models import Q
 
-from .models import Object, Task, Engineer
-from .services.cache_version import CacheVersion
-from .services.service import default_date
-from .services.tree_nodes import GroupsTree, ObjectsTree, EngineersTree
-from .services.tree_nodes.tree_nodes import AllTagsTree
+from .models import Object, Task, Engineer, SearchDocument
+from .services.cache_aside import cache_aside
+from .services.cache_tags import (
+    TASKS_FILTER_FIELDS_TAG,
+    TASKS_FILTER_RELATIONS_TAG,
+    OBJECTS_FILTER_FIELDS_TAG,
+    OBJECTS_FILTER_RELATIONS_TAG,
+)
+from .services.cache_version import filter_version_key, get_version
+from .services.request_cache import memoize
+from .services.search import search_filter
+from .services.visibility import objects_tree_fingerprint
+from .services.service import default_date, day_range
+from .services.tree_json import tree_url, TAGS, ENGINEERS, GROUPS, OBJECTS
+from .services.tree_nodes import selected_objects_nodes
 
 
 class ObjectFilter(django_filters.FilterSet):
@@ -21,47 +31,64 @@ class ObjectFilter(django_filters.FilterSet):
         fields = ["search", "tags", "groups", "priority"]
 
     def search_filter(self, queryset, name: str, value: str):
-        return queryset.filter(Q(name__icontains=value) | Q(description__icontains=value))
+        # По тексту без HTML-разметки через полнотекстовый индекс
+        return search_filter(queryset, SearchDocument.Kind.OBJECT, value)
 
 
-def get_fields_for_filter(user, page):
-    """
-    Возвращает древовидную структуру полей для отображения в фильтре
+# Деревья полей фильтра по страницам. Теги и инженеры не зависят от пользователя и кешируются
+# одной записью на страницу, остальные - записью на класс доступа (см. `visibility`)
+SHARED_FILTER_TREES = {"objects": (TAGS,), "tasks": (TAGS, ENGINEERS)}
+USER_FILTER_TREES = {"objects": (GROUPS, OBJECTS), "tasks": (OBJECTS,)}
+
+
+def get_fields_for_filter(user, page, versions=None):
     """
+    Возвращает поля для отображения в фильтре: адреса деревьев для виджетов выбора и значения по умолчанию.
+    `versions` - версии кеша, заранее полученные через `CacheVersion.get_many`
 
-    cache_key = f'filter_components:{page}:{user}'
-    version_cache_key = f"filter_components_cache_version_{page}"
-    cache_version = CacheVersion(version_cache_key)
-    cache_version_value = cache_version.get_cache_version()
-    context = {"user": user}
-
-    # Попытка получить данные из кеша
-    cached_data = cache.get(cache_key, version=cache_version_value)
-    if cached_data:
-        return cached_data
-    # context = {"user": user}
-    # Заполняем filter_fields_content в зависимости от страницы
-    if page == "objects":
-        filter_fields_content = {
-            "tags_json": AllTagsTree(context).get_nodes(),
-            "groups_json": GroupsTree(context).get_nodes(),
-            "objects_json": ObjectsTree(context).get_nodes()
-        }
-    elif page == "tasks":
-        filter_fields_content = {
-            "tags_json": AllTagsTree(context).get_nodes(),
-            "engineers_json": EngineersTree(context).get_nodes(),
-            "objects_json": ObjectsTree(context).get_nodes(),
-            "default_date": default_date(),
-            "default_time": "17:30",
-        }
-    else:
+    Общая часть (`filter_components:{page}:shared`) одна на всех пользователей, поэтому размер
+    кеша и число пересборок не растут с числом пользователей. К ней на каждый запрос
+    добавляется часть класса доступа пользователя.
+    """
+    if page not in SHARED_FILTER_TREES:
         # Обработка неизвестного значения page
         raise ValueError(f"Неизвестное значение параметра 'page': {page}")
 
-    # # Устанавливаем данные в кеш
-    cache.set(cache_key, filter_fields_content, timeout=600, version=cache_version_value)
-    return filter_fields_content
+    cache_version_value = get_version(filter_version_key(page), versions)
+
+    shared = _cached_fields(
+        f"filter_components:{page}:shared", cache_version_value, lambda: _get_shared_fields(page)
+    )
+    # Деревья фильтров зависят только от групп пользователя
+    personal = _cached_fields(
+        f"filter_components:{page}:{objects_tree_fingerprint(user)}",
+        cache_version_value,
+        lambda: _get_tree_fields(user, USER_FILTER_TREES[page]),
+    )
+    return {**shared, **personal}
+
+
+def _cached_fields(cache_key, version, compute):
+    # Страница и формы в рамках одного запроса могут запрашивать компоненты фильтра несколько раз
+    return memoize(
+        f"{cache_key}:{version}",
+        lambda: cache_aside(cache_key, compute, timeout=600, version=version),
+    )
+
+
+def _get_tree_fields(user, kinds) -> dict:
+    # Деревья - адресами с отпечатком содержимого: виджеты загружают их отдельно, и браузер
+    # не скачивает дерево повторно, пока оно не изменилось (см. `tree_json`).
+    # Дерево объектов - только корневой уровень, ветки виджет подгружает при раскрытии
+    return {f"{kind}_url": tree_url(user, kind) for kind in kinds}
+
+
+def _get_shared_fields(page) -> dict:
+    # Деревья общей части от пользователя не зависят
+    fields = _get_tree_fields(None, SHARED_FILTER_TREES[page])
+    if page == "tasks":
+        fields.update({"default_date": default_date(), "default_time": "17:30"})
+    return fields
 
 
 def get_current_filter_params(request, page):
@@ -74,7 +101,7 @@ def get_current_filter_params(request, page):
         current_params = {
             "current_tags": request.GET.getlist("tags"),
             "current_engineers": request.GET.getlist("engineers"),
-            "current_objects": request.GET.getlist("objects_set")}
+            "current_objects": selected_objects_nodes(request.user, request.GET.getlist("objects_set"))}
 
     else:
         # Обработка неизвестного значения page
@@ -83,15 +110,24 @@ def get_current_filter_params(request, page):
     return current_params
 
 
+# Порядок задач в перечне. Первичный ключ в конце делает порядок однозначным, что нужно
+# для постраничного вывода по ключу сортировки (`tasks.services.keyset`)
+TASKS_ORDERING = {
+    "asc": ("completion_time", "create_time", "id"),
+    "desc": ("-completion_time", "-create_time", "-id"),
+}
+
+
+def tasks_ordering(sort_order: str | None) -> tuple[str, ...]:
+    return TASKS_ORDERING["asc" if sort_order == "asc" else "desc"]
+
+
 class TaskFilter(django_filters.FilterSet):
     search = django_filters.CharFilter(method="search_filter")
     engineers = django_filters.CharFilter(method="dep_to_engineers")
-    completion_time_after = django_filters.DateFilter(
-        field_name="completion_time", lookup_expr="date__gte", label="От"
-    )
-    completion_time_before = django_filters.DateFilter(
-        field_name="completion_time", lookup_expr="date__lte", label="До"
-    )
+    # Даты сравниваются с границами суток, а не через `completion_time__date`, чтобы работал индекс
+    completion_time_after = django_filters.DateFilter(method="filter_completion_time_after", label="От")
+    completion_time_before = django_filters.DateFilter(method="filter_completion_time_before", label="До")
     sort_order = django_filters.CharFilter(method="filter_sort_order")
     show_my_tasks_only = django_filters.BooleanFilter(method="filter_show_my_tasks_only")
 
@@ -128,9 +164,15 @@ class TaskFilter(django_filters.FilterSet):
     @staticmethod
     def filter_sort_order(queryset, name: str, value: str):
         # Применяем сортировку по дате завершения
-        if value == "asc":
-            return queryset.order_by("completion_time", "create_time")
-        return queryset.order_by("-completion_time", "-create_time")
+        return queryset.order_by(*tasks_ordering(value))
+
+    @staticmethod
+    def filter_completion_time_after(queryset, name: str, value):
+        return queryset.filter(completion_time__gte=day_range(value)[0])
+
+    @staticmethod
+    def filter_completion_time_before(queryset, name: str, value):
+        return queryset.filter(completion_time__lt=day_range(value)[1])
 
     def filter_show_my_tasks_only(self, queryset, name: str, value: bool):
         engineer: Engineer | None = self.request.user.get_engineer_or_none()
@@ -165,11 +207,12 @@ class TaskFilter(django_filters.FilterSet):
                 # 2. Самим задачам, где в исполнителях указан департамент
                 q_objects |= Q(engineers__department__id=id_) | Q(departments__id=id_)
 
-        return queryset.filter(q_objects)
+        # OR по нескольким связям размножает строки задачи
+        return queryset.filter(q_objects).distinct()
 
     @staticmethod
     def search_filter(queryset, name: str, value: str):
-        return queryset.filter(Q(header__icontains=value) | Q(text__icontains=value))
+        return search_filter(queryset, SearchDocument.Kind.TASK, value)
 
     @property
     def applied_filters_count_taks(self):
@@ -177,8 +220,8 @@ class TaskFilter(django_filters.FilterSet):
         Считаем только те параметры, которые не в списке `not_count_params` и имеют значение
         :return:  int
         """
-        not_count_params = ["show_my_tasks_only", "sort_order", "page", "show_active_task", "show_done_task",
-                            "per_page"]
+        not_count_params = ["show_my_tasks_only", "sort_order", "page", "cursor", "show_active_task",
+                            "show_done_task", "per_page", "subtree"]
 
         applied_params = [param for key, param in self.data.items() if param and key not in not_count_params]
 
@@ -197,7 +240,7 @@ def applied_filters_count(request):
     Считаем только те параметры, которые не в списке `not_count_params` и имеют значение
     :return:  int
     """
-    not_count_params = ["page", "per_page"]
+    not_count_params = ["page", "cursor", "per_page", "subtree"]
     return len([
         param for param, value in request.GET.items()
         if value and param not in not_count_params
@@ -210,7 +253,7 @@ def filter_url(request, obj=None):
     Если передан объект, добавляем его в фильтр.
     """
 
-    filter_data = {key: value for key, value in request.GET.items() if key not in ["page"]}
+    filter_data = {key: value for key, value in request.GET.items() if key not in ["page", "cursor"]}
 
     # Если объект передан, добавляем его ID в параметры
     if obj:
@@ -250,3 +293,79 @@ class TaskFilterByDone(django_filters.FilterSet):
 
         # Если никакие фильтры не применены, возвращаем пустой queryset
         return queryset.none()
+
+
+# ============================== Отпечаток фильтра для кеша ==============================
+
+# Параметры, от которых зависит перечень. Остальные (номер, курсор и размер страницы - они входят
+# в ключ кеша отдельно, а также любые посторонние параметры) в отпечаток не попадают,
+# иначе клиент мог бы создавать новые записи кеша произвольными параметрами
+TASKS_FILTER_PARAMS = frozenset({*TaskFilter.base_filters, *TaskFilterByDone.base_filters, "subtree"})
+OBJECTS_FILTER_PARAMS = frozenset(ObjectFilter.base_filters)
+# Параметры со списком значений (?tags=1&tags=2) и со списком через запятую (?engineers=eng_1,dep_2)
+MULTI_VALUE_PARAMS = ("tags", "groups", "objects_set")
+COMMA_LIST_PARAMS = ("engineers",)
+
+# Значения, которые TaskFilter и TaskFilterByDone подставляют, если параметр не передан
+TASKS_FILTER_DEFAULTS = {
+    "show_my_tasks_only": "false",
+    "sort_order": "desc",
+    "show_active_task": "true",
+    "show_done_task": "false",
+    "subtree": "false",
+}
+
+# От каких изменений зависит результат фильтра по параметру.
+# Остальные параметры (даты, выполненные/активные, "только мои") зависят от тех же полей и связей,
+# что и неотфильтрованный перечень, и покрываются его тегами.
+TASKS_FILTER_CACHE_TAGS = {
+    "search": TASKS_FILTER_FIELDS_TAG,
+    "priority": TASKS_FILTER_FIELDS_TAG,
+    "tags": TASKS_FILTER_RELATIONS_TAG,
+    "engineers": TASKS_FILTER_RELATIONS_TAG,
+    "objects_set": TASKS_FILTER_RELATIONS_TAG,
+}
+OBJECTS_FILTER_CACHE_TAGS = {
+    "search": OBJECTS_FILTER_FIELDS_TAG,
+    "priority": OBJECTS_FILTER_FIELDS_TAG,
+    "tags": OBJECTS_FILTER_RELATIONS_TAG,
+    "groups": OBJECTS_FILTER_RELATIONS_TAG,
+}
+
+
+def filter_signature(query_dict, params: frozenset[str], defaults: dict | None = None) -> str:
+    """
+    Канонический отпечаток параметров фильтра `params` для ключа кеша.
+    Не зависит от порядка параметров и значений в списках. Отсутствующие параметры
+    и параметры со значением по умолчанию отбрасываются, а явно пустые остаются: для
+    `TaskFilterByDone` пустое значение не то же самое, что отсутствующее (по умолчанию).
+    Пустая строка - фильтры не применяются.
+    """
+    defaults = defaults or {}
+    items = []
+
+    for key in sorted(query_dict):
+        if key not in params:
+            continue
+
+        if key in MULTI_VALUE_PARAMS:
+            value = ",".join(sorted({v for v in query_dict.getlist(key) if v}))
+        elif key in COMMA_LIST_PARAMS:
+            value = ",".join(sorted({v for v in query_dict.get(key, "").split(",") if v}))
+        else:
+            # FilterSet берёт последнее значение параметра
+            value = query_dict.get(key, "")
+
+        if value != defaults.get(key):
+            items.append((key, value))
+
+    if not items:
+        return ""
+    return hashlib.sha1(urlencode(items).encode()).hexdigest()[:16]
+
+
+def filter_cache_tags(query_dict, cache_tags: dict[str, str]) -> set[str]:
+    """
+    Теги, от которых дополнительно зависит отфильтрованная страница.
+    """
+    return {tag for key, tag in cache_tags.items() if query_dict.get(key)}
@@ -0,0 +1,168 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q, QuerySet
+
+from tasks.models import Task, Engineer, Department
+from user.models import User
+
+HEAD = "head"
+ENGINEER = "engineer"
+ENGINEER_NO_DEPARTMENT = "engineer_no_dep"
+NO_ENGINEER = "no_engineer"
+ROLES = (HEAD, ENGINEER, ENGINEER_NO_DEPARTMENT, NO_ENGINEER)
+
+
+def baseline_queryset(user: User) -> QuerySet[Task]:
+    """
+    Прежняя логика `permission_filter` для обычного пользователя: OR по m2m и DISTINCT.
+    Сохранена только как база для сравнения с `Task.objects.visible_to`.
+    """
+    engineer: Engineer | None = user.get_engineer_or_none()
+
+    if engineer and engineer.head_of_department and engineer.department_id:
+        department_users = User.objects.filter(engineer__department=engineer.department_id)
+        queryset = Task.objects.filter(
+            Q(departments=engineer.department_id)
+            | Q(engineers__department=engineer.department_id)
+            | Q(creator__in=department_users)
+            | Q(creator=user),
+            deleted=False,
+        )
+    elif engineer and engineer.department_id:
+        queryset = Task.objects.filter(
+            Q(engineers=engineer) | Q(departments=engineer.department_id) | Q(creator=user),
+            deleted=False,
+        )
+    elif engineer:
+        queryset = Task.objects.filter(Q(engineers=engineer) | Q(creator=user), deleted=False)
+    else:
+        queryset = Task.objects.filter(creator=user, deleted=False)
+
+    return queryset.distinct()
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает Task.objects.visible_to (IN-подзапросы) с прежней логикой permission_filter "
+        "(OR по m2m + DISTINCT) на синтетических данных для всех ролей. Данные создаются в транзакции "
+        "и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tasks", type=int, default=100_000, help="Количество задач.")
+        parser.add_argument("--engineers", type=int, default=1_000, help="Количество инженеров.")
+        parser.add_argument("--departments", type=int, default=50, help="Количество отделов.")
+        parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого замера (берётся медиана).")
+        parser.add_argument("--per-page", type=int, default=8, help="Размер страницы для замера первой страницы.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        with transaction.atomic():
+            start = time.perf_counter()
+            users = self.create_data(options["tasks"], options["engineers"], options["departments"])
+            self.stdout.write(f"Данные созданы за {time.perf_counter() - start:.1f} с")
+
+            mismatches = []
+            self.stdout.write(
+                f"{'Роль':<16} {'Задач':>7} {'count old, мс':>14} {'count new, мс':>14} "
+                f"{'page old, мс':>13} {'page new, мс':>13} {'Ускорение':>10}"
+            )
+            for role in ROLES:
+                user = users[role]
+                old_qs, new_qs = baseline_queryset(user), Task.objects.visible_to(user)
+                if set(old_qs.values_list("id", flat=True)) != set(new_qs.values_list("id", flat=True)):
+                    mismatches.append(role)
+
+                old_count = self.measure(lambda: old_qs.count(), options["repeat"])
+                new_count = self.measure(lambda: new_qs.count(), options["repeat"])
+                old_page = self.measure(lambda: self.first_page(old_qs, options["per_page"]), options["repeat"])
+                new_page = self.measure(lambda: self.first_page(new_qs, options["per_page"]), options["repeat"])
+                speedup = (old_count + old_page) / max(new_count + new_page, 1e-6)
+                self.stdout.write(
+                    f"{role:<16} {new_qs.count():>7} {old_count:>14.1f} {new_count:>14.1f} "
+                    f"{old_page:>13.1f} {new_page:>13.1f} {speedup:>9.1f}x"
+                )
+
+            transaction.set_rollback(True)
+
+        if mismatches:
+            raise CommandError(f"Результаты различаются для ролей: {', '.join(mismatches)}")
+        self.stdout.write(self.style.SUCCESS("Результаты совпадают для всех ролей"))
+
+    @staticmethod
+    def first_page(queryset, per_page: int) -> list:
+        return list(queryset.order_by("-create_time").values_list("id", flat=True)[:per_page])
+
+    @staticmethod
+    def measure(func, repeat: int) -> float:
+        timings = []
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def create_data(self, tasks_count: int, engineers_count: int, departments_count: int) -> dict[str, User]:
+        """
+        Отделы с руководителями, 10% инженеров без отдела и 10% пользователей без инженера.
+        Возвращает по пользователю на каждую роль.
+        """
+        prefix = f"bench_{random.randrange(10 ** 8)}"
+        departments = Department.objects.bulk_create(
+            [Department(name=f"{prefix}_dep_{i}") for i in range(departments_count)]
+        )
+        users = User.objects.bulk_create(
+            [User(username=f"{prefix}_{i}") for i in range(engineers_count + engineers_count // 10)]
+        )
+        engineer_users, plain_users = users[:engineers_count], users[engineers_count:]
+
+        engineers = []
+        for i, user in enumerate(engineer_users):
+            department = departments[i % departments_count] if i % 10 else None
+            engineers.append(Engineer(
+                first_name="bench",
+                second_name=str(i),
+                user=user,
+                department=department,
+                # Первые инженеры отделов - руководители
+                head_of_department=department is not None and i < departments_count,
+            ))
+        engineers = Engineer.objects.bulk_create(engineers)
+
+        tasks = Task.objects.bulk_create(
+            [
+                Task(
+                    priority=Task.Priority.MEDIUM,
+                    is_done=random.random() < 0.5,
+                    deleted=random.random() < 0.05,
+                    completion_time="2024-10-01T12:00:00Z",
+                    header=f"{prefix}_{i}",
+                    creator=random.choice(users),
+                )
+                for i in range(tasks_count)
+            ],
+            batch_size=5000,
+        )
+
+        task_engineers, task_departments = [], []
+        for task in tasks:
+            for engineer in random.sample(engineers, random.randint(0, 3)):
+                task_engineers.append(Task.engineers.through(task_id=task.id, engineer_id=engineer.id))
+            if random.random() < 0.3:
+                task_departments.append(
+                    Task.departments.through(task_id=task.id, department_id=random.choice(departments).id)
+                )
+        Task.engineers.through.objects.bulk_create(task_engineers, batch_size=5000)
+        Task.departments.through.objects.bulk_create(task_departments, batch_size=5000)
+
+        return {
+            HEAD: next(e.user for e in engineers if e.head_of_department),
+            ENGINEER: next(e.user for e in engineers if e.department and not e.head_of_department),
+            ENGINEER_NO_DEPARTMENT: next(e.user for e in engineers if e.department is None),
+            NO_ENGINEER: plain_users[0],
+        }
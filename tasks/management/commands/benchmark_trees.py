@@ -0,0 +1,69 @@
+import random
+import statistics
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks.services.tree_nodes.base import build_forest
+
+WIDE = "wide"
+DEEP = "deep"
+RANDOM = "random"
+ORPHANS = "orphans"
+CYCLES = "cycles"
+SHAPES = (WIDE, DEEP, RANDOM, ORPHANS, CYCLES)
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет сборку дерева (build_forest) на синтетических иерархиях: широкий родитель, "
+        "цепочка, случайное дерево, недоступные родители и циклы. База данных не используется."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[10_000, 100_000], help="Количества узлов (по умолчанию 10k и 100k)."
+        )
+        parser.add_argument("--repeat", type=int, default=5, help="Повторов каждого замера (берётся медиана).")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'Форма':<10} {'Узлов':>8} {'Корней':>8} {'Сборка, мс':>11} {'мкс/узел':>9}")
+        for size in options["sizes"]:
+            for shape in SHAPES:
+                random.seed(options["seed"])
+                parents = self.parents(shape, size)
+                timings = []
+                for _ in range(max(options["repeat"], 1)):
+                    # Узлы создаются заново: build_forest дописывает в них children
+                    items = [(node_id, parent_id, {"id": node_id, "label": str(node_id)})
+                             for node_id, parent_id in parents.items()]
+                    start = time.perf_counter()
+                    roots = build_forest(items)
+                    timings.append((time.perf_counter() - start) * 1000)
+                median = statistics.median(timings)
+                self.stdout.write(
+                    f"{shape:<10} {size:>8} {len(roots):>8} {median:>11.1f} {median * 1000 / size:>9.2f}"
+                )
+        self.stdout.write(self.style.SUCCESS(f"Глубина рекурсии не используется (лимит {sys.getrecursionlimit()})"))
+
+    @staticmethod
+    def parents(shape: str, size: int) -> dict[int, int | None]:
+        if shape == WIDE:
+            return {node_id: (None if node_id == 0 else 0) for node_id in range(size)}
+        if shape == DEEP:
+            return {node_id: (node_id - 1 if node_id else None) for node_id in range(size)}
+        if shape == RANDOM:
+            return {node_id: (random.randrange(node_id) if node_id else None) for node_id in range(size)}
+        if shape == ORPHANS:
+            # Каждый десятый родитель отсутствует в перечне (недоступен пользователю)
+            return {
+                node_id: (random.randrange(node_id) if random.random() > 0.1 else -node_id) if node_id else None
+                for node_id in range(size)
+            }
+        # CYCLES: случайное дерево, в котором каждый сотый узел замкнут на своего потомка
+        parents = {node_id: (random.randrange(node_id) if node_id else None) for node_id in range(size)}
+        for node_id in range(1, size - 1, 100):
+            parents[node_id] = random.randrange(node_id + 1, size)
+        return parents
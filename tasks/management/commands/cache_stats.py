@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from tasks.services import cache_stats
+
+
+class Command(BaseCommand):
+    help = "Статистика кеша по семействам ключей: попадания, промахи, время пересчёта и размер значений."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--json", action="store_true", help="Вывести статистику в формате JSON.")
+        parser.add_argument("--reset", action="store_true", help="Сбросить счётчики после вывода.")
+
+    def handle(self, *args, **options):
+        stats = cache_stats.get_stats()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, indent=2))
+        elif not stats:
+            self.stdout.write("Статистики пока нет")
+        else:
+            self.print_table(stats)
+
+        if options["reset"]:
+            cache_stats.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счётчики сброшены"))
+
+    def print_table(self, stats: dict[str, dict]):
+        self.stdout.write(
+            f"{'Семейство':<18} {'Попад.':>8} {'Устар.':>7} {'Промахи':>8} {'Нет':>6} {'Истекло':>8} "
+            f"{'Инвал.':>7} {'Доля':>6} {'Пересч., мс':>12} {'Размер, Б':>10}"
+        )
+        for family, row in stats.items():
+            hit_ratio = f"{row['hit_ratio']:.0%}" if row["hit_ratio"] is not None else "-"
+            avg_ms = row["avg_recompute_ms"] if row["avg_recompute_ms"] is not None else "-"
+            avg_bytes = row["avg_bytes"] if row["avg_bytes"] is not None else "-"
+            self.stdout.write(
+                f"{family:<18} {row[cache_stats.HITS]:>8} {row[cache_stats.STALE]:>7} {row['misses']:>8} "
+                f"{row[cache_stats.MISS_ABSENT]:>6} {row[cache_stats.MISS_EXPIRED]:>8} "
+                f"{row[cache_stats.MISS_INVALIDATED]:>7} {hit_ratio:>6} {avg_ms:>12} {avg_bytes:>10}"
+            )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.services import object_hierarchy
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает таблицу иерархии объектов (ObjectClosure) по полю parent и сверяет её. "
+        "Нужна после массовых изменений в обход сигналов (QuerySet.update)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify", action="store_true", help="Только сверить таблицу с полем parent, не изменяя её."
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            total = object_hierarchy.rebuild_all()
+            self.stdout.write(f"Строк в таблице: {total}")
+
+        differences = object_hierarchy.verify()
+        if not differences:
+            self.stdout.write(self.style.SUCCESS("Таблица иерархии совпадает с полем parent"))
+            return
+
+        for kind, rows in differences.items():
+            self.stdout.write(self.style.ERROR(f"{kind}: {rows[:20]}"))
+        raise CommandError(f"Расхождений: {sum(map(len, differences.values()))}")
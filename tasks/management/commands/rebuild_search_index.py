@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from tasks.services import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересобирает документы полнотекстового поиска задач и объектов. "
+        "Нужна после массовых изменений в обход сигналов (QuerySet.update, bulk_create, loaddata)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=search.REBUILD_CHUNK_SIZE,
+            help="Количество документов, записываемых за один запрос.",
+        )
+
+    def handle(self, *args, **options):
+        total = search.rebuild_search_index(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Документов в индексе: {total}"))
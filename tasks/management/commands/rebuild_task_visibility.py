@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.services import task_visibility
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает таблицу видимости задач (TaskVisibility) и сверяет её с эталонной логикой. "
+        "Нужна после массовых изменений в обход сигналов (QuerySet.update, loaddata)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify", action="store_true", help="Только сверить таблицу с эталонной логикой, не изменяя её."
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=task_visibility.REBUILD_CHUNK_SIZE,
+            help="Количество задач, пересчитываемых в одной транзакции.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            added, removed = task_visibility.rebuild_all(chunk_size=options["chunk_size"])
+            self.stdout.write(f"Добавлено строк: {added}, удалено: {removed}")
+
+        differences = task_visibility.verify()
+        if not differences:
+            self.stdout.write(self.style.SUCCESS("Таблица видимости совпадает с эталонной логикой"))
+            return
+
+        for username, diff in differences.items():
+            self.stdout.write(
+                self.style.ERROR(f"{username}: не хватает {diff['missing'][:20]}, лишние {diff['extra'][:20]}")
+            )
+        raise CommandError(f"Расхождения у пользователей: {len(differences)}")
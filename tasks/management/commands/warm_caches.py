@@ -0,0 +1,80 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tasks.services.cache_warmup import ALL_FAMILIES, STAT, WarmupReport, init_worker, warm_stat, warm_user
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Прогревает кеш: первые страницы задач и объектов, компоненты фильтров и статистику "
+        "для всех активных пользователей. Имеет смысл для общего кеша (Redis)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=3, help="Сколько первых страниц строить (по умолчанию 3).")
+        parser.add_argument("--per-page", type=int, default=8, help="Размер страницы, как в представлениях.")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=2,
+            help="Число процессов пула. 0 - прогрев в текущем процессе. Не больше числа CPU.",
+        )
+        parser.add_argument(
+            "--nice", type=int, default=10, help="Понижение приоритета процессов пула, чтобы не мешать сайту."
+        )
+        parser.add_argument(
+            "--pause", type=float, default=0, help="Пауза в секундах после построения каждой записи."
+        )
+        parser.add_argument(
+            "--only", nargs="+", choices=ALL_FAMILIES, default=ALL_FAMILIES, help="Какие семейства ключей прогревать."
+        )
+        parser.add_argument("--users", nargs="+", default=None, help="Имена пользователей (по умолчанию все активные).")
+
+    def handle(self, *args, **options):
+        families = tuple(options["only"])
+        pages, per_page, pause = options["pages"], options["per_page"], options["pause"]
+        workers = min(max(options["workers"], 0), os.cpu_count() or 1)
+
+        users = User.objects.filter(is_active=True)
+        if options["users"]:
+            users = users.filter(username__in=options["users"])
+        user_ids = list(users.values_list("id", flat=True))
+
+        report = WarmupReport()
+        start = time.perf_counter()
+
+        if workers == 0:
+            if STAT in families:
+                report.merge(warm_stat(pause))
+            for user_id in user_ids:
+                report.merge(warm_user(user_id, families, pages, per_page, pause))
+        else:
+            # Дочерние процессы не должны пользоваться соединениями родителя
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(options["nice"],)) as pool:
+                futures = [pool.submit(warm_user, user_id, families, pages, per_page, pause) for user_id in user_ids]
+                if STAT in families:
+                    futures.append(pool.submit(warm_stat, pause))
+                for future in as_completed(futures):
+                    report.merge(future.result())
+
+        self.print_report(report, len(user_ids), workers, time.perf_counter() - start)
+
+    def print_report(self, report: WarmupReport, users_count: int, workers: int, elapsed: float):
+        self.stdout.write(f"Пользователей: {users_count}, процессов: {workers or 'без пула'}")
+        self.stdout.write(f"{'Семейство':<10} {'Записей':>8} {'Всего, с':>10} {'Среднее, с':>11} {'Макс, с':>9}")
+        for family, timing in sorted(report.timings.items()):
+            average = timing.seconds / timing.entries if timing.entries else 0
+            self.stdout.write(
+                f"{family:<10} {timing.entries:>8} {timing.seconds:>10.2f} {average:>11.3f} {timing.max_seconds:>9.3f}"
+            )
+
+        for error in report.errors:
+            self.stderr.write(error)
+
+        self.stdout.write(self.style.SUCCESS(f"Кеш прогрет за {elapsed:.2f} с"))
@@ -0,0 +1,45 @@
+import logging
+
+from django.conf import settings
+
+from tasks.services import cache_stats
+from tasks.services.request_cache import start_request_cache, end_request_cache, get_request_cache
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCacheMiddleware:
+    """
+    Создаёт кеш уровня запроса (см. `tasks.services.request_cache`) и удаляет его после ответа.
+    В режиме DEBUG количество сэкономленных обращений к кешу/БД отдаётся в заголовке ответа.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = start_request_cache()
+        try:
+            response = self.get_response(request)
+            saved = get_request_cache().saved_round_trips
+        finally:
+            end_request_cache(token)
+
+        logger.debug("%s: request cache saved %d round trips", request.path, saved)
+        if settings.DEBUG:
+            response["X-Request-Cache-Saved"] = str(saved)
+        return response
+
+
+class CacheStatsMiddleware:
+    """
+    Периодически сбрасывает накопленную в процессе статистику кеша в общий кеш (см. `cache_stats`).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        cache_stats.flush()
+        return response
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_task_visibility(apps, schema_editor):
+    # Те же правила, что в tasks.services.task_visibility, но на исторических моделях
+    Task = apps.get_model("tasks", "Task")
+    TaskVisibility = apps.get_model("tasks", "TaskVisibility")
+    sources = [
+        (Task.objects.all(), {}, "id", "creator_id"),
+        (Task.engineers.through.objects.all(), {}, "task_id", "engineer__user"),
+        (Task.departments.through.objects.all(), {}, "task_id", "department__engineers__user"),
+        (
+            Task.engineers.through.objects.all(),
+            {"engineer__department__engineers__head_of_department": True},
+            "task_id",
+            "engineer__department__engineers__user",
+        ),
+        (
+            Task.objects.all(),
+            {"creator__engineer__department__engineers__head_of_department": True},
+            "id",
+            "creator__engineer__department__engineers__user",
+        ),
+    ]
+    pairs = set()
+    for queryset, conditions, task_field, user_field in sources:
+        conditions = {**conditions, f"{user_field}__isnull": False}
+        pairs.update(queryset.filter(**conditions).values_list(task_field, user_field))
+
+    TaskVisibility.objects.bulk_create(
+        [TaskVisibility(task_id=task_id, user_id=user_id) for task_id, user_id in pairs],
+        batch_size=5000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0022_notification_message'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskVisibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibility', to='tasks.task')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'tasks_visibility',
+                'constraints': [models.UniqueConstraint(fields=('user', 'task'), name='tasks_visibility_user_task_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_task_visibility, migrations.RunPython.noop),
+    ]
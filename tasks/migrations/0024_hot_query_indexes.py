@@ -0,0 +1,39 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Связующие таблицы m2m создаются Django автоматически, и их индексы нельзя описать в Meta.
+# Уникальный индекс (task_id, engineer_id) обслуживает переход от задачи к инженерам; обратные
+# составные индексы дают поиск задач инженера, отдела и объектов группы только по индексу.
+REVERSE_M2M_INDEXES = (
+    ("tasks_engineers_m2m", "tasks_engineers_m2m_engineer_task_idx", "engineer_id", "task_id"),
+    ("tasks_departments_m2m", "tasks_departments_m2m_department_task_idx", "department_id", "task_id"),
+    ("objects_groups_m2m", "objects_groups_m2m_group_object_idx", "objectgroup_id", "object_id"),
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0023_taskvisibility'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['user'], name='notification_user_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('deleted', False)), fields=['completion_time', 'is_done'], name='task_active_compl_done_idx'),
+        ),
+        *(
+            migrations.RunSQL(
+                f'CREATE INDEX "{name}" ON "{table}" ("{first}", "{second}")',
+                f'DROP INDEX "{name}"',
+            )
+            for table, name, first, second in REVERSE_M2M_INDEXES
+        ),
+    ]
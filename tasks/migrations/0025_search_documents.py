@@ -0,0 +1,104 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:35
+
+import html
+import re
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+# Полнотекстовый индекс над документами поиска зависит от СУБД (см. tasks.services.search).
+# В SQLite триггеры пропадут, если Django пересоздаст таблицу при изменении её полей, -
+# такая миграция должна создать их заново.
+FULL_TEXT_SQL = {
+    "postgresql": (
+        [
+            "ALTER TABLE search_documents ADD COLUMN vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('russian', body)) STORED",
+            "CREATE INDEX search_documents_vector_idx ON search_documents USING GIN (vector)",
+        ],
+        [
+            "DROP INDEX search_documents_vector_idx",
+            "ALTER TABLE search_documents DROP COLUMN vector",
+        ],
+    ),
+    "sqlite": (
+        [
+            "CREATE VIRTUAL TABLE search_documents_fts USING fts5("
+            "body, content='search_documents', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+            "CREATE TRIGGER search_documents_ai AFTER INSERT ON search_documents BEGIN "
+            "INSERT INTO search_documents_fts(rowid, body) VALUES (new.id, new.body); END",
+            "CREATE TRIGGER search_documents_ad AFTER DELETE ON search_documents BEGIN "
+            "INSERT INTO search_documents_fts(search_documents_fts, rowid, body) VALUES ('delete', old.id, old.body); END",
+            "CREATE TRIGGER search_documents_au AFTER UPDATE ON search_documents BEGIN "
+            "INSERT INTO search_documents_fts(search_documents_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+            "INSERT INTO search_documents_fts(rowid, body) VALUES (new.id, new.body); END",
+        ],
+        [
+            "DROP TRIGGER search_documents_au",
+            "DROP TRIGGER search_documents_ad",
+            "DROP TRIGGER search_documents_ai",
+            "DROP TABLE search_documents_fts",
+        ],
+    ),
+}
+
+
+def _run_full_text_sql(schema_editor, forward: bool):
+    statements = FULL_TEXT_SQL.get(schema_editor.connection.vendor)
+    if statements:
+        for sql in statements[0 if forward else 1]:
+            schema_editor.execute(sql)
+
+
+def create_full_text_index(apps, schema_editor):
+    _run_full_text_sql(schema_editor, forward=True)
+
+
+def drop_full_text_index(apps, schema_editor):
+    _run_full_text_sql(schema_editor, forward=False)
+
+
+def _text(value):
+    # Как tasks.services.search.html_to_text
+    return re.sub(r"\s+", " ", html.unescape(strip_tags(value or "")).replace("\xa0", " ")).strip()
+
+
+def populate_search_documents(apps, schema_editor):
+    SearchDocument = apps.get_model("tasks", "SearchDocument")
+    sources = (
+        ("task", apps.get_model("tasks", "Task"), ("header", "text")),
+        ("object", apps.get_model("tasks", "Object"), ("name", "description")),
+    )
+    for kind, model, fields in sources:
+        SearchDocument.objects.bulk_create(
+            (
+                SearchDocument(kind=kind, ref_id=values[0], body=" ".join(filter(None, map(_text, values[1:]))))
+                for values in model.objects.values_list("pk", *fields).iterator()
+            ),
+            batch_size=2000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0024_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('task', 'Task'), ('object', 'Object')], max_length=16)),
+                ('ref_id', models.BigIntegerField()),
+                ('body', models.TextField()),
+            ],
+            options={
+                'db_table': 'search_documents',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'ref_id'), name='search_documents_kind_ref_uniq')],
+            },
+        ),
+        migrations.RunPython(create_full_text_index, drop_full_text_index),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_object_closure(apps, schema_editor):
+    # Те же строки, что строит tasks.services.object_hierarchy.rebuild_all, на исторических моделях
+    Object = apps.get_model("tasks", "Object")
+    ObjectClosure = apps.get_model("tasks", "ObjectClosure")
+    parents = dict(Object.objects.values_list("id", "parent_id"))
+
+    rows = []
+    for obj_id in parents:
+        ancestor_id, depth, seen = obj_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.append(ObjectClosure(ancestor_id=ancestor_id, descendant_id=obj_id, depth=depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    ObjectClosure.objects.bulk_create(rows, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0025_search_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObjectClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='tasks.object')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='tasks.object')),
+            ],
+            options={
+                'db_table': 'objects_closure',
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='objects_closure_desc_depth')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='objects_closure_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_object_closure, migrations.RunPython.noop),
+    ]
@@ -8,10 +8,32 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator, MinValueValidator
 from django.db import models
-from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.db.models.signals import post_save, post_delete, m2m_changed, pre_save, pre_delete
 from django.dispatch import receiver
 
-from tasks.services.cache_version import CacheVersion
+from tasks.services.cache_tags import (
+    TASKS_FILTER_FIELDS_TAG,
+    TASKS_FILTER_RELATIONS_TAG,
+    OBJECTS_FILTER_FIELDS_TAG,
+    OBJECTS_FILTER_RELATIONS_TAG,
+    invalidate_tags,
+    task_tag,
+    object_tag,
+    user_tag,
+    group_tag,
+    department_tag,
+    engineers_tags,
+    task_membership_tags,
+)
+from tasks.services.cache_version import (
+    CacheVersion,
+    TASKS_PAGE_VERSION,
+    OBJECTS_PAGE_VERSION,
+    FILTER_TASKS_VERSION,
+    FILTER_OBJECTS_VERSION,
+    OBJECT_VISIBILITY_VERSION,
+    AUTOCOMPLETE_VERSION,
+)
 
 
 class UserObjectGroup(models.Model):
@@ -72,22 +94,78 @@ class Object(models.Model):
 
     def clean(self):
         # Check if the object is trying to set itself as a parent
-        if self.parent == self:
+        if self.pk and self.parent_id == self.pk:
             raise ValidationError("Рекурсия")
 
-        # Check if the parent object is trying to set itself as a parent
-        if self.parent:
-            # Initialize a variable to store the current parent
-            current_parent = self.parent
+        # Check if the chosen parent is a descendant of self (one lookup in the closure table)
+        if self.parent_id and self.pk and ObjectClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_id
+        ).exists():
+            raise ValidationError(
+                "Твой выбранный родитель это твой же потомок, осуждаем"
+            )
 
-            # Loop through the parents to check if self is already on the chain
-            while current_parent:
-                if current_parent == self:
-                    raise ValidationError(
-                        "Твой выбранный родитель это твой же потомок, осуждаем"
-                    )
-                # Move up the chain
-                current_parent = current_parent.parent
+
+class ObjectClosure(models.Model):
+    """
+    Замыкание иерархии объектов: строка (ancestor, descendant, depth) на каждую пару
+    "предок - потомок", включая сам объект с глубиной 0. Предки, потомки и проверка на цикл -
+    один запрос по индексу вместо подъёма по `parent`. Поддерживается сигналами,
+    см. `tasks.services.object_hierarchy`.
+    """
+
+    ancestor = models.ForeignKey(Object, on_delete=models.CASCADE, related_name="descendant_links")
+    descendant = models.ForeignKey(Object, on_delete=models.CASCADE, related_name="ancestor_links")
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        db_table = "objects_closure"
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "descendant"], name="objects_closure_uniq"),
+        ]
+        indexes = [
+            # Предки объекта по порядку - для хлебных крошек
+            models.Index(fields=["descendant", "depth"], name="objects_closure_desc_depth"),
+        ]
+
+
+class TaskQuerySet(models.QuerySet):
+
+    def visible_to(self, user) -> "TaskQuerySet":
+        """
+        Неудалённые задачи, видимые пользователю, без обращения к `TaskVisibility`.
+        Эталонные правила видимости: с ними сверяется таблица (`task_visibility.verify`).
+
+        Каждое правило - некоррелированный подзапрос `id IN (...)` по индексу связующей таблицы,
+        поэтому строки задач не размножаются соединениями по m2m и DISTINCT не нужен: `count`,
+        `aggregate` и пагинация считают задачи напрямую.
+        """
+        queryset = self.filter(deleted=False)
+        if user.is_superuser:
+            return queryset
+
+        engineer = user.get_engineer_or_none()
+        condition = models.Q(creator=user)
+        if engineer is None:
+            return queryset.filter(condition)
+
+        task_engineers = Task.engineers.through.objects
+        task_departments = Task.departments.through.objects
+        department_id = engineer.department_id
+
+        if engineer.head_of_department and department_id:
+            # Задачи отдела, задачи инженеров отдела и задачи, созданные подчинёнными
+            condition |= (
+                models.Q(pk__in=task_departments.filter(department=department_id).values("task_id"))
+                | models.Q(pk__in=task_engineers.filter(engineer__department=department_id).values("task_id"))
+                | models.Q(creator__in=Engineer.objects.filter(department=department_id).values("user"))
+            )
+        else:
+            condition |= models.Q(pk__in=task_engineers.filter(engineer=engineer).values("task_id"))
+            if department_id:
+                condition |= models.Q(pk__in=task_departments.filter(department=department_id).values("task_id"))
+
+        return queryset.filter(condition)
 
 
 class Task(models.Model):
@@ -113,15 +191,30 @@ class Task(models.Model):
     creator = models.ForeignKey(get_user_model(), related_name="created_tasks", on_delete=models.PROTECT)
     status_changed_by = models.CharField(max_length=32, blank=True, null=True)
 
+    objects = TaskQuerySet.as_manager()
+
     # slug = models.SlugField(max_length=255, unique=True, db_index=True, verbose_name="URL")
 
     class Meta:
         db_table = "object_tasks"
         ordering = ["create_time"]
+        indexes = [
+            # Перечни и счётчики смотрят только неудалённые задачи: частичный индекс по сроку выполнения.
+            # Django записывает deleted=False как `NOT deleted`, поэтому составной индекс с deleted
+            # в начале SQLite не использует, а условие частичного индекса совпадает с запросом дословно
+            models.Index(
+                fields=["completion_time", "is_done"],
+                condition=models.Q(deleted=False),
+                name="task_active_compl_done_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.header
 
+    # Поля, изменение которых меняет состав или порядок перечней задач
+    LISTING_FIELDS = ("is_done", "deleted", "completion_time", "creator_id")
+
     def save(self, *args, **kwargs):
         # Проверяем, существовала ли задача ранее
         is_new = self.pk is None
@@ -129,6 +222,11 @@ class Task(models.Model):
         if not is_new:
             previous = Task.objects.filter(pk=self.pk).first()
 
+        # Используется сигналами для выбора тегов кеша, которые нужно инвалидировать
+        self.listing_changed = previous is None or any(
+            getattr(previous, field) != getattr(self, field) for field in self.LISTING_FIELDS
+        )
+
         # Вызываем стандартное сохранение
         super().save(*args, **kwargs)
 
@@ -144,6 +242,46 @@ class Task(models.Model):
         super().save(update_fields=["status_changed_by"])
 
 
+class TaskVisibility(models.Model):
+    """
+    Материализованная видимость задач: строка (user, task) означает, что пользователь видит задачу
+    по правилам `permission_filter` для обычных пользователей. Суперпользователи видят все задачи
+    без этой таблицы. Удалённые задачи из таблицы не исключаются - их отсекает `deleted=False`.
+    Поддерживается сигналами, см. `tasks.services.task_visibility`.
+    """
+
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="+")
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="visibility")
+
+    class Meta:
+        db_table = "tasks_visibility"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "task"], name="tasks_visibility_user_task_uniq"),
+        ]
+
+
+class SearchDocument(models.Model):
+    """
+    Текст задачи или объекта для полнотекстового поиска: поля без HTML-разметки CKEditor одной строкой.
+    Полнотекстовый индекс поверх таблицы зависит от СУБД (tsvector + GIN в Postgres, FTS5 в SQLite)
+    и создаётся миграцией. Поддерживается сигналами, см. `tasks.services.search`.
+    """
+
+    class Kind(models.TextChoices):
+        TASK = "task"
+        OBJECT = "object"
+
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    ref_id = models.BigIntegerField()
+    body = models.TextField()
+
+    class Meta:
+        db_table = "search_documents"
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "ref_id"], name="search_documents_kind_ref_uniq"),
+        ]
+
+
 # class Notification(models.Model):
 #     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="notifications")
 #     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="notifications")
@@ -163,6 +301,12 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)  # Флаг для прочитанных уведомлений
     message = models.CharField(max_length=255, blank=True)
 
+    class Meta:
+        indexes = [
+            # Непрочитанные уведомления пользователя в шапке каждой страницы (is_read=False, см. индекс задач)
+            models.Index(fields=["user"], condition=models.Q(is_read=False), name="notification_user_unread_idx"),
+        ]
+
     def str(self):
         return f"{self.user} - {self.event_type}"
 
@@ -359,87 +503,269 @@ class Address(models.Model):
 
 # --- Task ---
 @receiver(post_save, sender=Task)
-def update_cache_version1_save(sender, created, **kwargs):
-    CacheVersion("tasks_page_version_cache").increment_cache_version()
-    CacheVersion("objects_page_cache_version").increment_cache_version()
+def update_cache_tags1_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {"status_changed_by"}:
+        return  # Служебное повторное сохранение из Task.save
+    # Любое изменение полей может изменить результат поиска и фильтра по приоритету
+    if getattr(instance, "listing_changed", True):
+        invalidate_tags(*task_membership_tags(instance), TASKS_FILTER_FIELDS_TAG)
+    else:
+        invalidate_tags(task_tag(instance.pk), TASKS_FILTER_FIELDS_TAG)
+
+
+@receiver(pre_delete, sender=Task)
+def update_cache_tags1_delete(sender, instance, **kwargs):
+    # До удаления, пока связи задачи ещё существуют
+    invalidate_tags(*task_membership_tags(instance))
+
+
+@receiver(m2m_changed, sender=Task.engineers.through)
+def update_cache_tags1_engineers(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        # Изменены задачи инженера: instance - Engineer, pk_set - id задач
+        if action in ("post_add", "post_remove", "pre_clear"):
+            tags = engineers_tags([instance])
+            tags.update(task_tag(task_id) for task_id in pk_set or ())
+            invalidate_tags(*tags, TASKS_FILTER_RELATIONS_TAG)
+        return
+
+    if action == "pre_clear":
+        invalidate_tags(*task_membership_tags(instance), TASKS_FILTER_RELATIONS_TAG)
+    elif action in ("post_add", "post_remove"):
+        tags = task_membership_tags(instance)
+        # Снятые с задачи инженеры перестают её видеть
+        tags.update(engineers_tags(Engineer.objects.filter(pk__in=pk_set)))
+        invalidate_tags(*tags, TASKS_FILTER_RELATIONS_TAG)
 
 
-@receiver(post_delete, sender=Task)
-def update_cache_version1_delete(sender, instance, **kwargs):
-    CacheVersion("tasks_page_version_cache").increment_cache_version()
-    CacheVersion("objects_page_cache_version").increment_cache_version()
+@receiver(m2m_changed, sender=Task.departments.through)
+def update_cache_tags1_departments(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        tags = {department_tag(instance.pk)}
+        tags.update(task_tag(task_id) for task_id in pk_set or ())
+    else:
+        tags = task_membership_tags(instance)
+        tags.update(department_tag(dep_id) for dep_id in pk_set or ())
+    invalidate_tags(*tags, TASKS_FILTER_RELATIONS_TAG)
+
+
+@receiver(m2m_changed, sender=Task.tags.through)
+@receiver(m2m_changed, sender=Task.files.through)
+def update_cache_tags1_content(sender, instance, action, reverse, pk_set, **kwargs):
+    # Теги и файлы влияют на содержимое карточки задачи, теги - ещё и на фильтр по тегам
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if sender is Task.tags.through:
+        invalidate_tags(TASKS_FILTER_RELATIONS_TAG)
+    if not reverse:
+        invalidate_tags(task_tag(instance.pk))
+    elif action == "pre_clear":
+        invalidate_tags(*(task_tag(task_id) for task_id in instance.tasks.values_list("id", flat=True)))
+    else:
+        invalidate_tags(*(task_tag(task_id) for task_id in pk_set))
 
 
 # --- Object ---
+@receiver(pre_save, sender=Object)
+def remember_object_parent(sender, instance, **kwargs):
+    # Запоминаем прежнего родителя, чтобы обновить количество дочерних объектов в его карточке
+    instance.previous_parent_id = (
+        Object.objects.filter(pk=instance.pk).values_list("parent_id", flat=True).first() if instance.pk else None
+    )
+
+
 @receiver(post_save, sender=Object)
-def update_cache_version2_save(sender, created, **kwargs):
-    CacheVersion("objects_page_cache_version").increment_cache_version()
-    CacheVersion("filter_components_cache_version_tasks").increment_cache_version()
+def update_cache_version2_save(sender, instance, created, **kwargs):
+    tags = {object_tag(instance.pk)}
+    for parent_id in (instance.parent_id, getattr(instance, "previous_parent_id", None)):
+        if parent_id:
+            tags.add(object_tag(parent_id))
+    invalidate_tags(*tags, OBJECTS_FILTER_FIELDS_TAG)
+    CacheVersion(FILTER_TASKS_VERSION).increment_cache_version()
 
 
-@receiver(post_delete, sender=Object)
+@receiver(pre_delete, sender=Object)
 def update_cache_version2_delete(sender, instance, **kwargs):
-    CacheVersion("objects_page_cache_version").increment_cache_version()
-    CacheVersion("filter_components_cache_version_tasks").increment_cache_version()
+    tags = {object_tag(instance.pk)}
+    tags.update(group_tag(group_id) for group_id in instance.groups.values_list("id", flat=True))
+    tags.update(task_tag(task_id) for task_id in instance.tasks.values_list("id", flat=True))
+    if instance.parent_id:
+        tags.add(object_tag(instance.parent_id))
+    invalidate_tags(*tags, OBJECTS_FILTER_FIELDS_TAG, TASKS_FILTER_RELATIONS_TAG)
+    CacheVersion(FILTER_TASKS_VERSION).increment_cache_version()
+
+
+@receiver(m2m_changed, sender=Object.groups.through)
+def update_cache_tags2_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    # Изменение групп объекта меняет состав перечней объектов у пользователей этих групп
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        tags = {group_tag(instance.pk)}
+        tags.update(object_tag(obj_id) for obj_id in pk_set or instance.objects_set.values_list("id", flat=True))
+    else:
+        tags = {object_tag(instance.pk)}
+        tags.update(group_tag(group_id) for group_id in pk_set or instance.groups.values_list("id", flat=True))
+    invalidate_tags(*tags, OBJECTS_FILTER_RELATIONS_TAG)
+    # Деревья объектов в фильтрах зависят от групп
+    CacheVersion(FILTER_OBJECTS_VERSION).increment_cache_version()
+    CacheVersion(FILTER_TASKS_VERSION).increment_cache_version()
+
+
+@receiver(m2m_changed, sender=Object.groups.through)
+def update_object_visibility_groups(sender, action, **kwargs):
+    # Перечни доступных объектов (object_visibility) строятся по составу групп. После изменения,
+    # а не в pre_clear, чтобы параллельный запрос не закешировал прежний состав под новой версией
+    if action in ("post_add", "post_remove", "post_clear"):
+        CacheVersion(OBJECT_VISIBILITY_VERSION).increment_cache_version()
+
+
+@receiver(post_save, sender=Object)
+@receiver(post_delete, sender=Object)
+def update_object_visibility_objects(sender, raw=False, **kwargs):
+    # Связи объекта с группами удаляются вместе с ним, а loaddata (raw) загружает их без m2m_changed
+    if raw or kwargs.get("signal") is post_delete:
+        CacheVersion(OBJECT_VISIBILITY_VERSION).increment_cache_version()
+
+
+@receiver(m2m_changed, sender=Object.tasks.through)
+def update_cache_tags2_tasks(sender, instance, action, reverse, pk_set, **kwargs):
+    # Привязка задачи к объекту: меняется карточка задачи и счётчик задач объекта
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        # instance - Task, pk_set - id объектов
+        tags = {task_tag(instance.pk)}
+        tags.update(object_tag(obj_id) for obj_id in pk_set or instance.objects_set.values_list("id", flat=True))
+    else:
+        tags = {object_tag(instance.pk)}
+        tags.update(task_tag(task_id) for task_id in pk_set or instance.tasks.values_list("id", flat=True))
+    invalidate_tags(*tags, TASKS_FILTER_RELATIONS_TAG)
+
+
+@receiver(m2m_changed, sender=Object.tags.through)
+@receiver(m2m_changed, sender=Object.files.through)
+def update_cache_tags2_content(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if sender is Object.tags.through:
+        invalidate_tags(OBJECTS_FILTER_RELATIONS_TAG)
+    if not reverse:
+        invalidate_tags(object_tag(instance.pk))
+    elif action == "pre_clear":
+        invalidate_tags(*(object_tag(obj_id) for obj_id in instance.objects_set.values_list("id", flat=True)))
+    else:
+        invalidate_tags(*(object_tag(obj_id) for obj_id in pk_set))
+
+
+# --- UserObjectGroup ---
+@receiver(post_save, sender=UserObjectGroup)
+@receiver(post_delete, sender=UserObjectGroup)
+def update_cache_tags_user_groups(sender, instance, **kwargs):
+    # Изменился перечень групп пользователя - устаревают все его страницы объектов
+    invalidate_tags(user_tag(instance.user_id))
+    CacheVersion(FILTER_OBJECTS_VERSION).increment_cache_version()
+    CacheVersion(FILTER_TASKS_VERSION).increment_cache_version()
+
+
+@receiver(m2m_changed, sender=UserObjectGroup)
+def update_cache_tags_user_groups_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    # group.users.add() / user.object_groups.add() создают UserObjectGroup без post_save
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        # instance - User
+        invalidate_tags(user_tag(instance.pk))
+    else:
+        # instance - ObjectGroup, pk_set - id пользователей
+        invalidate_tags(*(user_tag(user_id) for user_id in pk_set or instance.users.values_list("id", flat=True)))
+    CacheVersion(FILTER_OBJECTS_VERSION).increment_cache_version()
+    CacheVersion(FILTER_TASKS_VERSION).increment_cache_version()
 
 
 # --- Tag ---
 @receiver(post_save, sender=Tag)
 def update_cache_version3_save(sender, created, **kwargs):
-    CacheVersion("filter_components_cache_version_objects").increment_cache_version()
-    CacheVersion("filter_components_cache_version_tasks").increment_cache_version()
+    CacheVersion(FILTER_OBJECTS_VERSION).increment_cache_version()
+    CacheVersion(FILTER_TASKS_VERSION).increment_cache_version()
 
 
 @receiver(post_delete, sender=Tag)
 def update_cache_version3_delete(sender, instance, **kwargs):
-    CacheVersion("filter_components_cache_version_objects").increment_cache_version()
-    CacheVersion("filter_components_cache_version_tasks").increment_cache_version()
+    CacheVersion(FILTER_OBJECTS_VERSION).increment_cache_version()
+    CacheVersion(FILTER_TASKS_VERSION).increment_cache_version()
 
 
 # --- ObjectGroup ---
 @receiver(post_save, sender=ObjectGroup)
 def update_cache_version4_save(sender, created, **kwargs):
-    CacheVersion("filter_components_cache_version_objects").increment_cache_version()
+    CacheVersion(FILTER_OBJECTS_VERSION).increment_cache_version()
 
 
 @receiver(post_delete, sender=ObjectGroup)
 def update_cache_version4_delete(sender, instance, **kwargs):
-    CacheVersion("filter_components_cache_version_objects").increment_cache_version()
+    CacheVersion(FILTER_OBJECTS_VERSION).increment_cache_version()
+    invalidate_tags(group_tag(instance.pk))
 
 
 # --- Engineer ---
+# Инженеры и отделы меняются редко, но влияют на видимость задач у многих пользователей,
+# поэтому сбрасываем весь кеш страниц задач через глобальную версию. Страницы объектов
+# показывают количество видимых задач, поэтому сбрасываются вместе с ними.
 @receiver(post_save, sender=Engineer)
 def update_cache_version5_save(sender, created, **kwargs):
-    CacheVersion("filter_components_cache_version_tasks").increment_cache_version()
+    CacheVersion(FILTER_TASKS_VERSION).increment_cache_version()
+    CacheVersion(TASKS_PAGE_VERSION).increment_cache_version()
+    CacheVersion(OBJECTS_PAGE_VERSION).increment_cache_version()
 
 
 @receiver(post_delete, sender=Engineer)
 def update_cache_version5_delete(sender, instance, **kwargs):
-    CacheVersion("filter_components_cache_version_tasks").increment_cache_version()
+    CacheVersion(FILTER_TASKS_VERSION).increment_cache_version()
+    CacheVersion(TASKS_PAGE_VERSION).increment_cache_version()
+    CacheVersion(OBJECTS_PAGE_VERSION).increment_cache_version()
 
 
 # --- Department ---
 @receiver(post_save, sender=Department)
 def update_cache_version6_save(sender, created, **kwargs):
-    CacheVersion("filter_components_cache_version_tasks").increment_cache_version()
+    CacheVersion(FILTER_TASKS_VERSION).increment_cache_version()
+    CacheVersion(TASKS_PAGE_VERSION).increment_cache_version()
+    CacheVersion(OBJECTS_PAGE_VERSION).increment_cache_version()
 
 
 @receiver(post_delete, sender=Department)
 def update_cache_version6_delete(sender, instance, **kwargs):
-    CacheVersion("filter_components_cache_version_tasks").increment_cache_version()
+    CacheVersion(FILTER_TASKS_VERSION).increment_cache_version()
+    CacheVersion(TASKS_PAGE_VERSION).increment_cache_version()
+    CacheVersion(OBJECTS_PAGE_VERSION).increment_cache_version()
+
+
+# --- Автодополнение ---
+# Индексы подсказок строятся из названий объектов, тегов, инженеров и отделов
+@receiver(post_save, sender=Object)
+@receiver(post_delete, sender=Object)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Engineer)
+@receiver(post_delete, sender=Engineer)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def update_autocomplete_version(sender, **kwargs):
+    CacheVersion(AUTOCOMPLETE_VERSION).increment_cache_version()
 
 
 # --- Comments ---
 @receiver(post_save, sender=Comment)
-def update_cache_version7_save(sender, created, **kwargs):
-    CacheVersion("tasks_page_version_cache").increment_cache_version()
-    CacheVersion("objects_page_cache_version").increment_cache_version()
+def update_cache_tags7_save(sender, instance, created, **kwargs):
+    invalidate_tags(task_tag(instance.task_id))
 
 
 @receiver(post_delete, sender=Comment)
-def update_cache_version7_delete(sender, instance, **kwargs):
-    CacheVersion("tasks_page_version_cache").increment_cache_version()
-    CacheVersion("objects_page_cache_version").increment_cache_version()
+def update_cache_tags7_delete(sender, instance, **kwargs):
+    invalidate_tags(task_tag(instance.task_id))
 
 
 def create_notification(user, task, event_type, message, data):
@@ -0,0 +1,219 @@
+"""
+Автодополнение объектов, тегов и инженеров.
+
+Вместо полных деревьев (`tree_json`), которые виджет выбора
+фильтрует на клиенте, подсказки ищутся на сервере по индексу в памяти процесса:
+
+- префиксный индекс - отсортированные ключи (каждое слово названия, у объектов ещё и slug,
+  в нижнем регистре) и двоичный поиск первого ключа с префиксом запроса;
+- индекс триграмм - для совпадений внутри слова, если по началу слов подсказок не хватило.
+
+Индексы строятся при первом обращении в процессе и перестраиваются, когда меняется версия
+`AUTOCOMPLETE_VERSION` (её увеличивают сигналы изменения объектов, тегов, инженеров и отделов),
+так что запрос подсказок обходится без обращений к БД, кроме перечня доступных объектов.
+"""
+
+import re
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, Http404
+
+from tasks.models import Object, Tag, Engineer, Department
+from .cache_version import CacheVersion, AUTOCOMPLETE_VERSION
+from .object_visibility import visible_object_ids, contains
+
+OBJECTS = "objects"
+TAGS = "tags"
+ENGINEERS = "engineers"
+KINDS = (OBJECTS, TAGS, ENGINEERS)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Сколько совпадений просматривается для ранжирования
+MAX_CANDIDATES = 500
+
+_WORD = re.compile(r"\w+")
+# Больше любого символа в словах: [слово, слово + _MAX_CHAR) - диапазон ключей с префиксом "слово"
+_MAX_CHAR = "\U0010ffff"
+
+
+def normalize(value: str) -> str:
+    return value.lower().replace("ё", "е")
+
+
+def _words(value: str) -> list[str]:
+    return _WORD.findall(normalize(value))
+
+
+def _trigrams(value: str) -> set[str]:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+@dataclass(frozen=True)
+class Entry:
+    # Для инженеров и отделов - id в том же виде, что и в дереве инженеров (eng_1, dep_2)
+    id: int | str
+    label: str
+    slug: str = ""
+    # Объект, по доступу к которому показывается подсказка; None - видна всем
+    object_id: int | None = None
+    text: str = field(default="", compare=False)
+
+    def as_dict(self) -> dict:
+        result = {"id": self.id, "label": self.label}
+        if self.slug:
+            result["slug"] = self.slug
+        return result
+
+
+class PrefixIndex:
+    """
+    Подсказки по началу любого слова названия, а при нехватке - по подстроке (через триграммы).
+    """
+
+    def __init__(self, entries: Iterable[Entry]):
+        self.entries = [
+            Entry(entry.id, entry.label, entry.slug, entry.object_id, normalize(f"{entry.label} {entry.slug}"))
+            for entry in entries
+        ]
+
+        # Слова каждой записи - для проверки остальных слов запроса без повторного разбора
+        self.words = [tuple(set(_words(entry.text))) for entry in self.entries]
+        pairs = sorted((word, number) for number, words in enumerate(self.words) for word in words)
+        # Параллельные списки: bisect по строкам без создания кортежей на каждый запрос
+        self.keys = [word for word, _ in pairs]
+        self.numbers = [number for _, number in pairs]
+
+        self.trigrams: dict[str, list[int]] = {}
+        for number, entry in enumerate(self.entries):
+            for trigram in _trigrams(entry.text):
+                self.trigrams.setdefault(trigram, []).append(number)
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT,
+               visible: Callable[[Entry], bool] | None = None) -> list[Entry]:
+        words = _words(query)
+        if not words:
+            return []
+
+        # По индексу ищется слово запроса с самым узким диапазоном ключей,
+        # остальные проверяются у найденных записей
+        ranges = [(bisect_left(self.keys, word), bisect_left(self.keys, word + _MAX_CHAR)) for word in words]
+        start, end = min(ranges, key=lambda bounds: bounds[1] - bounds[0])
+        matches = self._prefix_matches(start, end, words, visible)
+        if len(matches) < limit:
+            matches.update(self._infix_matches(normalize(query).strip(), visible))
+
+        phrase = normalize(query).strip()
+        ranked = sorted(
+            matches.values(),
+            key=lambda entry: (not entry.text.startswith(phrase), len(entry.label), entry.label),
+        )
+        return ranked[:limit]
+
+    def _prefix_matches(self, start: int, end: int, words: list[str], visible) -> dict[int, Entry]:
+        matches = {}
+        for number in self.numbers[start:end]:
+            if len(matches) >= MAX_CANDIDATES:
+                break
+            if number in matches:
+                continue
+            entry_words = self.words[number]
+            if len(words) > 1 and not all(any(word.startswith(prefix) for word in entry_words) for prefix in words):
+                continue
+            entry = self.entries[number]
+            if visible is None or visible(entry):
+                matches[number] = entry
+        return matches
+
+    def _infix_matches(self, phrase: str, visible) -> dict[int, Entry]:
+        trigrams = _trigrams(phrase)
+        if not trigrams:
+            return {}
+        postings = sorted((self.trigrams.get(trigram, []) for trigram in trigrams), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+
+        matches = {}
+        for number in candidates:
+            entry = self.entries[number]
+            if phrase in entry.text and not (visible and not visible(entry)):
+                matches[number] = entry
+                if len(matches) >= MAX_CANDIDATES:
+                    break
+        return matches
+
+
+def _object_entries() -> list[Entry]:
+    return [
+        Entry(obj_id, name, slug, object_id=obj_id)
+        for obj_id, name, slug in Object.objects.values_list("id", "name", "slug")
+    ]
+
+
+def _tag_entries() -> list[Entry]:
+    return [Entry(tag_id, name) for tag_id, name in Tag.objects.values_list("id", "tag_name")]
+
+
+def _engineer_entries() -> list[Entry]:
+    entries = [Entry(f"dep_{dep_id}", name) for dep_id, name in Department.objects.values_list("id", "name")]
+    entries.extend(
+        Entry(f"eng_{engineer_id}", f"{first_name} {second_name}")
+        for engineer_id, first_name, second_name in Engineer.objects.values_list("id", "first_name", "second_name")
+    )
+    return entries
+
+
+_BUILDERS: dict[str, Callable[[], list[Entry]]] = {
+    OBJECTS: _object_entries,
+    TAGS: _tag_entries,
+    ENGINEERS: _engineer_entries,
+}
+
+_indexes: dict[str, tuple[int, PrefixIndex]] = {}
+_lock = threading.Lock()
+
+
+def get_index(kind: str) -> PrefixIndex:
+    """Индекс текущей версии; устаревший перестраивается один раз на процесс."""
+    version = CacheVersion(AUTOCOMPLETE_VERSION).get_cache_version()
+    cached = _indexes.get(kind)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _lock:
+        cached = _indexes.get(kind)
+        if cached is None or cached[0] != version:
+            cached = (version, PrefixIndex(_BUILDERS[kind]()))
+            _indexes[kind] = cached
+    return cached[1]
+
+
+def autocomplete(user, kind: str, query: str, limit: int = DEFAULT_LIMIT) -> list[dict]:
+    """
+    Подсказки для виджета выбора. Объекты - только доступные пользователю по группам,
+    как в дереве объектов (`ObjectsTree`).
+    """
+    visible = None
+    if kind == OBJECTS and not user.is_superuser:
+        ids = visible_object_ids(user)
+
+        def visible(entry: Entry) -> bool:
+            return contains(ids, entry.object_id)
+
+    limit = max(1, min(limit, MAX_LIMIT))
+    return [entry.as_dict() for entry in get_index(kind).search(query, limit, visible)]
+
+
+@login_required
+def autocomplete_view(request, kind: str):
+    """Подсказки для `?q=` в JSON: `{"results": [{"id": ..., "label": ...}, ...]}`."""
+    if kind not in KINDS:
+        raise Http404()
+    try:
+        limit = int(request.GET.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    return JsonResponse({"results": autocomplete(request.user, kind, request.GET.get("q", ""), limit)})
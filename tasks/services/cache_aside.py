@@ -0,0 +1,131 @@
+"""
+Cache-aside с защитой от "лавины" (cache stampede).
+
+- Single-flight: пересчитывает значение только тот воркер, который успел взять блокировку
+  (`cache.add`), остальные отдают прежнее значение или ждут, пока оно появится.
+- Вероятностное раннее обновление (XFetch): незадолго до истечения срока значение
+  пересчитывается заранее, причём тем раньше, чем дольше оно вычисляется.
+  Поэтому записи популярных страниц не истекают одновременно у всех воркеров.
+"""
+
+import math
+import random
+import time
+from typing import Callable, Iterable
+
+from django.core.cache import cache
+
+from . import cache_stats
+from .cache_tags import read_tagged, set_tagged, tags_snapshot
+
+# Сколько секунд держится блокировка пересчёта, если воркер упал, не освободив её
+LOCK_TIMEOUT = 30
+# Сколько ждать значения, которое пересчитывает другой воркер
+WAIT_TIMEOUT = 10
+WAIT_INTERVAL = 0.05
+# Сколько секунд запись хранится после логического истечения, чтобы её можно было отдать
+# остальным воркерам, пока один пересчитывает новое значение
+STALE_TTL = 60
+
+
+def cache_aside(
+    cache_key: str,
+    compute: Callable[[], object],
+    timeout: int,
+    version=None,
+    tags: Callable[[object], Iterable[str]] | None = None,
+    beta: float = 1.0,
+):
+    """
+    Возвращает значение из кеша или вычисляет его через `compute` и сохраняет.
+
+    :param cache_key: Ключ кеша.
+    :param compute: Функция без аргументов, вычисляющая значение.
+    :param timeout: Время жизни значения в секундах.
+    :param version: Версия кеша (см. `CacheVersion`).
+    :param tags: Функция, возвращающая теги для вычисленного значения (см. `cache_tags`).
+        Значение с инвалидированным тегом считается отсутствующим.
+    :param beta: Коэффициент раннего обновления; больше 1 - обновлять раньше, 0 - не обновлять заранее.
+    """
+    entry, is_fresh = _read(cache_key, version, tags is not None)
+
+    if entry is None:
+        cause = cache_stats.MISS_ABSENT
+    elif not is_fresh:
+        cause = cache_stats.MISS_INVALIDATED
+    elif time.time() >= entry["expires"]:
+        cause = cache_stats.MISS_EXPIRED
+    elif _should_refresh(entry, beta):
+        cause = cache_stats.EARLY_REFRESH
+    else:
+        cache_stats.record(cache_key, cache_stats.HITS)
+        return entry["value"]
+
+    lock_key = f"lock:{cache_key}:{version}"
+    if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        cache_stats.record(cache_key, cause)
+        try:
+            return _compute_and_store(cache_key, compute, timeout, version, tags)
+        finally:
+            cache.delete(lock_key)
+
+    # Значение уже пересчитывает другой воркер.
+    # Пока оно не истекло окончательно и теги актуальны - отдаём прежнее значение.
+    if entry is not None and is_fresh:
+        metric = cache_stats.HITS if cause == cache_stats.EARLY_REFRESH else cache_stats.STALE
+        cache_stats.record(cache_key, metric)
+        return entry["value"]
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry, is_fresh = _read(cache_key, version, tags is not None)
+        if entry is not None and is_fresh:
+            cache_stats.record(cache_key, cache_stats.WAITS)
+            return entry["value"]
+
+    # Воркер с блокировкой не успел - считаем сами
+    cache_stats.record(cache_key, cause)
+    return _compute_and_store(cache_key, compute, timeout, version, tags)
+
+
+def delete(cache_key: str, version=None) -> None:
+    """
+    Удаляет значение, сохранённое через `cache_aside`.
+    """
+    cache.delete(cache_key, version=version)
+    cache_stats.record(cache_key, cache_stats.DELETES)
+
+
+def _read(cache_key: str, version, tagged: bool) -> tuple[dict | None, bool]:
+    if tagged:
+        return read_tagged(cache_key, version=version)
+    entry = cache.get(cache_key, version=version)
+    return entry, entry is not None
+
+
+def _should_refresh(entry: dict, beta: float) -> bool:
+    """
+    XFetch: обновляем неистёкшее значение заранее с вероятностью, растущей к моменту истечения
+    и пропорциональной времени вычисления значения.
+    """
+    now = time.time()
+    if beta <= 0:
+        return False
+    return now - entry["delta"] * beta * math.log(1.0 - random.random()) >= entry["expires"]
+
+
+def _compute_and_store(cache_key: str, compute, timeout: int, version, tags):
+    # Теги, инвалидированные во время вычисления, не должны попасть в кеш с новыми версиями
+    snapshot = tags_snapshot() if tags is not None else None
+    start = time.time()
+    value = compute()
+    delta = time.time() - start
+    cache_stats.record_compute(cache_key, delta, value)
+
+    entry = {"value": value, "expires": time.time() + timeout, "delta": delta}
+    if tags is not None:
+        set_tagged(cache_key, entry, tags(value), timeout=timeout + STALE_TTL, version=version, snapshot=snapshot)
+    else:
+        cache.set(cache_key, entry, timeout=timeout + STALE_TTL, version=version)
+    return value
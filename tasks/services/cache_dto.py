@@ -0,0 +1,315 @@
+"""
+Компактные записи для хранения карточек задач и объектов в кеше.
+
+Вместо pickle моделей Django (со всем состоянием, кешами prefetch, а для страниц - ещё и с
+Paginator и полным QuerySet внутри) в кеш попадают плоские записи на `__slots__`:
+идентификаторы, строки, даты и небольшие списки. Записи содержат ровно те поля,
+которые используют шаблоны карточек, и ведут себя в шаблонах как модели
+(`task.tags.all`, `request.user == task.creator`, `engineer in task.engineers.all`).
+"""
+
+
+class Record:
+    """
+    Базовая запись. Поля перечисляются в `__slots__`, pickle хранит только кортеж значений.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def __reduce__(self):
+        return self.__class__, tuple(getattr(self, name, None) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({getattr(self, 'id', '')})"
+
+
+class ModelRecord(Record):
+    """
+    Запись, сравнимая с экземплярами моделей по первичному ключу.
+    """
+
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __eq__(self, other):
+        if other is None:
+            return False
+        # __class__ вместо type(), чтобы сравнение работало и с SimpleLazyObject (request.user)
+        other_model = getattr(other, "model_name", other.__class__.__name__)
+        return other_model == self.model_name and getattr(other, "pk", None) == self.id
+
+    def __hash__(self):
+        return hash((self.model_name, self.id))
+
+    model_name = ""
+
+
+class RelatedList(list):
+    """
+    Список связанных записей, к которому в шаблоне можно обращаться как к менеджеру: `task.tags.all`.
+    """
+
+    def all(self):
+        return self
+
+
+class UserRecord(ModelRecord):
+    __slots__ = ("id", "username", "engineer")
+    model_name = "User"
+
+    def __str__(self):
+        return self.username
+
+
+class EngineerRecord(ModelRecord):
+    __slots__ = ("id", "first_name", "second_name")
+    model_name = "Engineer"
+
+    def __str__(self):
+        return f"{self.first_name} {self.second_name}"
+
+
+class DepartmentRecord(ModelRecord):
+    __slots__ = ("id", "name")
+    model_name = "Department"
+
+    def __str__(self):
+        return self.name
+
+
+class TagRecord(ModelRecord):
+    __slots__ = ("id", "tag_name")
+    model_name = "Tag"
+
+    def __str__(self):
+        return self.tag_name
+
+
+class GroupRecord(ModelRecord):
+    __slots__ = ("id", "name")
+    model_name = "ObjectGroup"
+
+    def __str__(self):
+        return self.name
+
+
+class ObjectRefRecord(ModelRecord):
+    __slots__ = ("id", "slug", "name")
+    model_name = "Object"
+
+    def __str__(self):
+        return self.name
+
+
+class FileRecord(ModelRecord):
+    __slots__ = ("id", "url", "clear_file_name", "extension", "is_image")
+    model_name = "AttachedFile"
+
+    @property
+    def file(self):
+        # В шаблонах используется `file.file.url`
+        return self
+
+
+class CommentRecord(Record):
+    __slots__ = ("author", "text", "created_at")
+
+
+class TaskCard(ModelRecord):
+    __slots__ = (
+        "id",
+        "header",
+        "text",
+        "completion_text",
+        "priority",
+        "is_done",
+        "deleted",
+        "completion_time",
+        "create_time",
+        "creator",
+        "engineers",
+        "departments",
+        "tags",
+        "files",
+        "objects_set",
+        "comments",
+        "time_left",
+        "time_now",
+    )
+    model_name = "Task"
+
+
+class ObjectCard(ModelRecord):
+    __slots__ = (
+        "id",
+        "name",
+        "slug",
+        "priority",
+        "description",
+        "short_description",
+        "img_preview",
+        "child_count",
+        "tasks_count",
+        "groups",
+        "tags",
+    )
+    model_name = "Object"
+
+
+class PaginatorRecord(Record):
+    __slots__ = ("count", "num_pages", "per_page")
+
+    @property
+    def page_range(self):
+        return range(1, self.num_pages + 1)
+
+
+class PageRecord(Record):
+    """
+    Замена `django.core.paginator.Page` для закешированной страницы.
+    """
+
+    __slots__ = ("object_list", "number", "paginator")
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.number < self.paginator.num_pages
+
+    def has_previous(self):
+        return self.number > 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class KeysetPageRecord(Record):
+    """
+    Страница постраничного вывода по ключу сортировки (см. `tasks.services.keyset`).
+    Переходы - на соседние страницы по курсорам, общее количество строк в самой странице не хранится.
+    """
+
+    __slots__ = ("object_list", "number", "next_cursor", "previous_cursor")
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def _file_record(file) -> FileRecord:
+    return FileRecord(
+        file.id,
+        file.file.url if file.file else "",
+        file.clear_file_name(),
+        file.extension,
+        file.is_image,
+    )
+
+
+def _engineer_record(engineer) -> EngineerRecord | None:
+    if engineer is None:
+        return None
+    return EngineerRecord(engineer.id, engineer.first_name, engineer.second_name)
+
+
+def _user_record(user) -> UserRecord:
+    return UserRecord(user.id, user.username, _engineer_record(user.get_engineer_or_none()))
+
+
+def task_card(task) -> TaskCard:
+    """
+    Карточка задачи. Связи должны быть предзагружены (см. `get_filtered_tasks`).
+    """
+    return TaskCard(
+        task.id,
+        task.header,
+        task.text,
+        task.completion_text,
+        task.priority,
+        task.is_done,
+        task.deleted,
+        task.completion_time,
+        task.create_time,
+        _user_record(task.creator),
+        RelatedList(_engineer_record(engineer) for engineer in task.engineers.all()),
+        RelatedList(DepartmentRecord(dep.id, dep.name) for dep in task.departments.all()),
+        RelatedList(TagRecord(tag.id, tag.tag_name) for tag in task.tags.all()),
+        RelatedList(_file_record(file) for file in task.files.all()),
+        RelatedList(ObjectRefRecord(obj.id, obj.slug, obj.name) for obj in task.objects_set.all()),
+        RelatedList(
+            CommentRecord(_user_record(comment.author), comment.text, comment.created_at)
+            for comment in task.comments.all()
+        ),
+        getattr(task, "time_left", 0),
+        getattr(task, "time_now", None),
+    )
+
+
+def object_card(obj) -> ObjectCard:
+    """
+    Карточка объекта. Аннотации и связи должны быть предзагружены (см. `get_objects_list`).
+    """
+    return ObjectCard(
+        obj.id,
+        obj.name,
+        obj.slug,
+        obj.priority,
+        obj.description,
+        getattr(obj, "short_description", ""),
+        getattr(obj, "img_preview", None),
+        getattr(obj, "child_count", 0),
+        getattr(obj, "tasks_count", 0),
+        RelatedList(GroupRecord(group.id, group.name) for group in obj.groups.all()),
+        RelatedList(TagRecord(tag.id, tag.tag_name) for tag in obj.tags.all()),
+    )
+
+
+def compact_pagination(pagination_data: dict, cards: list) -> dict:
+    """
+    Заменяет Page и Paginator в данных пагинации (`paginate_queryset`, `paginate_keyset`) компактными записями.
+    """
+    if pagination_data.get("keyset"):
+        page = pagination_data["page_obj"]
+        return {
+            **pagination_data,
+            "page_obj": KeysetPageRecord(cards, page.number, page.next_cursor, page.previous_cursor),
+        }
+
+    paginator = pagination_data["paginator"]
+    paginator_record = PaginatorRecord(paginator.count, paginator.num_pages, paginator.per_page)
+    page_record = PageRecord(cards, pagination_data["page_obj"].number, paginator_record)
+    return {
+        **pagination_data,
+        "paginator": paginator_record,
+        "page_obj": page_record,
+    }
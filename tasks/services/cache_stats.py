@@ -0,0 +1,159 @@
+"""
+Статистика кеша по семействам ключей.
+
+Для каждого семейства (`tasks_page`, `objects_page`, `filter_components`, `single_obj`,
+`obj_childs`, `stat`, деревья фильтров) считаются попадания, промахи с причиной
+(запись отсутствует, истекла, инвалидирована тегом), время пересчёта и размер
+сериализованного значения. Размер измеряется выборочно (см. `SIZE_SAMPLE_EVERY`), чтобы не
+сериализовать значение второй раз на каждом пересчёте.
+
+Счётчики копятся в памяти процесса и периодически сбрасываются в общий кеш
+атомарными `incr`, поэтому статистика суммируется по всем воркерам gunicorn,
+а запись статистики не добавляет обращений к Redis на каждый запрос.
+"""
+
+import pickle
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Метрики
+HITS = "hits"  # значение отдано из кеша
+STALE = "stale"  # отдано истёкшее значение, пока другой воркер его пересчитывает
+WAITS = "waits"  # значение получено после ожидания пересчёта другим воркером
+EARLY_REFRESH = "early_refresh"  # значение пересчитано заранее (XFetch)
+MISS_ABSENT = "miss_absent"  # записи нет: не вычислялась, вытеснена или сменилась версия
+MISS_EXPIRED = "miss_expired"  # запись истекла по времени
+MISS_INVALIDATED = "miss_invalidated"  # запись инвалидирована тегом
+DELETES = "deletes"  # запись удалена явно
+RECOMPUTES = "recomputes"
+RECOMPUTE_MS = "recompute_ms"
+BYTES = "bytes"  # суммарный размер измеренных значений
+SIZED = "sized"  # пересчёты, у которых измерен размер значения
+
+MISS_CAUSES = (MISS_ABSENT, MISS_EXPIRED, MISS_INVALIDATED)
+METRICS = (HITS, STALE, WAITS, EARLY_REFRESH, *MISS_CAUSES, DELETES, RECOMPUTES, RECOMPUTE_MS, BYTES, SIZED)
+
+OTHER_FAMILY = "other"
+_FAMILY_PATTERNS = (
+    ("tasks_page", re.compile(r"^tasks_page:")),
+    ("objects_page", re.compile(r"^objects_page:")),
+    ("filter_components", re.compile(r"^filter_components:")),
+    ("single_obj", re.compile(r"^single_obj_")),
+    ("obj_childs", re.compile(r"^obj_.+_childs$")),
+    ("object_visibility", re.compile(r"^object_visibility:")),
+    ("obj_tasks_count", re.compile(r"^obj_tasks_count:")),
+    ("listing_count", re.compile(r"^(tasks|objects)_count:")),
+    ("stat", re.compile(r"^stat$")),
+    ("trees", re.compile(r"^\w+Tree:")),
+)
+FAMILIES = tuple(name for name, _ in _FAMILY_PATTERNS) + (OTHER_FAMILY,)
+
+# Как часто процесс сбрасывает накопленные счётчики в общий кеш
+FLUSH_INTERVAL = 10
+
+# Размер значения измеряется у каждого N-го пересчёта семейства (при DEBUG - у каждого)
+SIZE_SAMPLE_EVERY = 20
+
+_pending: Counter = Counter()
+_computes: Counter = Counter()  # пересчёты по семействам в процессе, для выборки размера
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def key_family(cache_key: str) -> str:
+    for name, pattern in _FAMILY_PATTERNS:
+        if pattern.match(cache_key):
+            return name
+    return OTHER_FAMILY
+
+
+def record(cache_key: str, metric: str, amount: int = 1) -> None:
+    with _lock:
+        _pending[(key_family(cache_key), metric)] += amount
+
+
+def record_compute(cache_key: str, seconds: float, value) -> None:
+    """
+    Учитывает пересчёт значения: время и размер значения в том виде, в котором его хранит Redis (pickle).
+    Размер измеряется у первого и далее у каждого `SIZE_SAMPLE_EVERY`-го пересчёта семейства.
+    """
+    family = key_family(cache_key)
+    with _lock:
+        sample = settings.DEBUG or _computes[family] % SIZE_SAMPLE_EVERY == 0
+        _computes[family] += 1
+    # Сериализация - вне блокировки: страница календаря может весить мегабайты
+    size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) if sample else 0
+    with _lock:
+        _pending[(family, RECOMPUTES)] += 1
+        _pending[(family, RECOMPUTE_MS)] += round(seconds * 1000)
+        if sample:
+            _pending[(family, BYTES)] += size
+            _pending[(family, SIZED)] += 1
+
+
+def _stats_key(family: str, metric: str) -> str:
+    return f"cache_stats:{family}:{metric}"
+
+
+def flush(force: bool = False) -> None:
+    """
+    Сбрасывает накопленные счётчики в общий кеш. Без `force` - не чаще раза в `FLUSH_INTERVAL` секунд.
+    """
+    global _last_flush
+
+    with _lock:
+        if not _pending or (not force and time.monotonic() - _last_flush < FLUSH_INTERVAL):
+            return
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+    for (family, metric), amount in pending.items():
+        if not amount:
+            continue
+        key = _stats_key(family, metric)
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            if not cache.add(key, amount, timeout=None):
+                cache.incr(key, amount)
+
+
+def get_stats() -> dict[str, dict]:
+    """
+    Возвращает статистику по всем семействам ключей, включая производные показатели.
+    """
+    flush(force=True)
+    keys = [_stats_key(family, metric) for family in FAMILIES for metric in METRICS]
+    values = cache.get_many(keys)
+
+    result = {}
+    for family in FAMILIES:
+        counters = {metric: values.get(_stats_key(family, metric), 0) for metric in METRICS}
+        if not any(counters.values()):
+            continue
+
+        misses = sum(counters[cause] for cause in MISS_CAUSES)
+        served = counters[HITS] + counters[STALE] + counters[WAITS]
+        recomputes = counters[RECOMPUTES]
+        sized = counters[SIZED]
+        result[family] = {
+            **counters,
+            "misses": misses,
+            "hit_ratio": round(served / (served + misses), 3) if served + misses else None,
+            "avg_recompute_ms": round(counters[RECOMPUTE_MS] / recomputes, 1) if recomputes else None,
+            "avg_bytes": round(counters[BYTES] / sized) if sized else None,
+        }
+    return result
+
+
+def reset_stats() -> None:
+    with _lock:
+        _pending.clear()
+        _computes.clear()
+    cache.delete_many([_stats_key(family, metric) for family in FAMILIES for metric in METRICS])
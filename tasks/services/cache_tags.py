@@ -0,0 +1,221 @@
+"""
+Теги кеша.
+
+Каждая запись кеша хранит набор тегов, от которых она зависит (задачи, объекты, пользователь,
+группы объектов...), вместе с версиями этих тегов на момент записи. У каждого тега есть
+собственная версия (`CacheVersion`). Инвалидация тега - это запись в его версию нового значения
+общего счётчика инвалидаций, после чего все записи, сохранённые со старой версией тега,
+считаются устаревшими.
+
+Значение счётчика, прочитанное до вычисления значения (`tags_snapshot`), позволяет при записи
+узнать, какие теги были инвалидированы, пока значение вычислялось, - даже теги, известные
+только по результату (например, показанные на странице задачи). Такие теги сохраняются
+заведомо устаревшими, и значение будет пересчитано при следующем обращении.
+
+Таким образом изменение одной задачи вытесняет только те страницы, на которых эта задача
+показана, а не весь кеш страниц всех пользователей.
+"""
+
+from typing import Iterable
+
+from django.core.cache import cache
+
+from .cache_version import CacheVersion
+
+# Тег "любая задача" - от него зависят страницы суперпользователей, которые видят все задачи
+ALL_TASKS_TAG = "tasks:all"
+
+# Теги отфильтрованных страниц: меняются при изменении полей и связей, по которым работают фильтры
+TASKS_FILTER_FIELDS_TAG = "tasks:filter_fields"
+TASKS_FILTER_RELATIONS_TAG = "tasks:filter_relations"
+OBJECTS_FILTER_FIELDS_TAG = "objects:filter_fields"
+OBJECTS_FILTER_RELATIONS_TAG = "objects:filter_relations"
+
+
+def task_tag(task_id) -> str:
+    return f"task:{task_id}"
+
+
+def object_tag(object_id) -> str:
+    return f"object:{object_id}"
+
+
+def user_tag(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def group_tag(group_id) -> str:
+    return f"group:{group_id}"
+
+
+def engineer_tag(engineer_id) -> str:
+    return f"engineer:{engineer_id}"
+
+
+def department_tag(department_id) -> str:
+    return f"department:{department_id}"
+
+
+# Общий счётчик инвалидаций: версия тега - значение счётчика при последней инвалидации тега
+TAGS_CLOCK_KEY = "cache_tags_clock"
+# Версия, которой нет ни у одного тега: запись с ней всегда устаревшая
+_STALE_VERSION = 0
+
+
+def _tag_version_key(tag: str) -> str:
+    return f"cache_tag_version:{tag}"
+
+
+def tags_snapshot() -> int:
+    """
+    Момент, на который значение будет актуально: берётся до вычисления значения
+    и передаётся в `set_tagged(..., snapshot=...)`.
+    """
+    return CacheVersion.get_many(TAGS_CLOCK_KEY)[TAGS_CLOCK_KEY]
+
+
+def read_tagged(cache_key: str, version=None) -> tuple[object | None, bool]:
+    """
+    Возвращает значение из кеша и признак его актуальности:
+    значение неактуально, если хотя бы один из его тегов был инвалидирован после записи.
+    """
+    entry = cache.get(cache_key, version=version)
+    if entry is None:
+        return None, False
+
+    saved_versions: dict[str, int] = entry["tags"]
+    if saved_versions and CacheVersion.get_many(*saved_versions) != saved_versions:
+        return entry["value"], False
+
+    return entry["value"], True
+
+
+def get_tagged(cache_key: str, version=None):
+    """
+    Возвращает значение из кеша, если ни один из его тегов не был инвалидирован после записи.
+    Иначе возвращает None.
+    """
+    value, is_fresh = read_tagged(cache_key, version=version)
+    return value if is_fresh else None
+
+
+def get_many_tagged(cache_keys: Iterable[str], version=None) -> dict[str, object]:
+    """
+    Возвращает актуальные значения сразу для нескольких ключей: записи читаются одним `get_many`,
+    версии всех их тегов - одним `CacheVersion.get_many`. Отсутствующих и устаревших ключей в ответе нет.
+    """
+    entries = cache.get_many(list(cache_keys), version=version)
+    tag_keys = set()
+    for entry in entries.values():
+        tag_keys.update(entry["tags"])
+    current = CacheVersion.get_many(*tag_keys) if tag_keys else {}
+
+    return {
+        key: entry["value"]
+        for key, entry in entries.items()
+        if all(current[tag] == saved for tag, saved in entry["tags"].items())
+    }
+
+
+def set_tagged(
+    cache_key: str, value, tags: Iterable[str], timeout: int | None = None, version=None, snapshot: int | None = None
+) -> None:
+    """
+    Сохраняет значение в кеш вместе с версиями его тегов на момент `snapshot` (см. `tags_snapshot`).
+    Тег, инвалидированный после `snapshot`, сохраняется с версией, которая никогда не станет текущей.
+    Без `snapshot` сохраняются текущие версии тегов.
+    """
+    set_many_tagged({cache_key: (value, tags)}, timeout=timeout, version=version, snapshot=snapshot)
+
+
+def set_many_tagged(
+    items: dict[str, tuple[object, Iterable[str]]], timeout: int | None = None, version=None,
+    snapshot: int | None = None,
+) -> None:
+    """
+    `set_tagged` для нескольких ключей {ключ: (значение, теги)}: версии всех тегов читаются
+    одним `CacheVersion.get_many`, записи сохраняются одним `set_many`.
+    """
+    tag_keys = {key: sorted({_tag_version_key(tag) for tag in tags}) for key, (_, tags) in items.items()}
+    all_tag_keys = set().union(*tag_keys.values())
+    tag_versions = CacheVersion.get_many(*all_tag_keys) if all_tag_keys else {}
+    if snapshot is not None:
+        tag_versions = {
+            key: tag_version if tag_version <= snapshot else _STALE_VERSION
+            for key, tag_version in tag_versions.items()
+        }
+
+    cache.set_many(
+        {
+            key: {"tags": {tag_key: tag_versions[tag_key] for tag_key in tag_keys[key]}, "value": value}
+            for key, (value, _) in items.items()
+        },
+        timeout=timeout,
+        version=version,
+    )
+
+
+def invalidate_tags(*tags: str) -> None:
+    """
+    Инвалидирует все записи кеша, помеченные хотя бы одним из тегов.
+    """
+    if not tags:
+        return
+    clock = CacheVersion(TAGS_CLOCK_KEY).increment_cache_version()
+    CacheVersion.set_many({_tag_version_key(tag): clock for tag in set(tags)})
+
+
+def user_tasks_tags(user) -> set[str]:
+    """
+    Теги, от которых зависит перечень задач, видимых пользователю (см. `permission_filter`).
+    """
+    tags = {user_tag(user.pk)}
+
+    if user.is_superuser:
+        tags.add(ALL_TASKS_TAG)
+
+    engineer = user.get_engineer_or_none()
+    if engineer:
+        tags.add(engineer_tag(engineer.pk))
+        if engineer.department_id:
+            tags.add(department_tag(engineer.department_id))
+
+    return tags
+
+
+def user_objects_tags(user) -> set[str]:
+    """
+    Теги, от которых зависит перечень объектов, видимых пользователю через группы.
+    """
+    tags = {user_tag(user.pk)}
+    tags.update(group_tag(group_id) for group_id in user.object_groups.values_list("id", flat=True))
+    return tags
+
+
+def engineers_tags(engineers) -> set[str]:
+    tags = set()
+    for engineer in engineers:
+        tags.add(engineer_tag(engineer.pk))
+        if engineer.user_id:
+            tags.add(user_tag(engineer.user_id))
+        if engineer.department_id:
+            tags.add(department_tag(engineer.department_id))
+    return tags
+
+
+def task_membership_tags(task) -> set[str]:
+    """
+    Теги всех перечней, в которые может входить задача: её исполнители, отделы, создатель и объекты.
+    Инвалидируются, когда меняется состав или порядок задач в перечнях.
+    """
+    tags = {task_tag(task.pk), ALL_TASKS_TAG, user_tag(task.creator_id)}
+
+    # Начальник отдела видит задачи, созданные подчинёнными
+    creator_engineer = task.creator.get_engineer_or_none()
+    if creator_engineer and creator_engineer.department_id:
+        tags.add(department_tag(creator_engineer.department_id))
+
+    tags.update(engineers_tags(task.engineers.all()))
+    tags.update(department_tag(dep_id) for dep_id in task.departments.values_list("id", flat=True))
+    tags.update(object_tag(obj_id) for obj_id in task.objects_set.values_list("id", flat=True))
+    return tags
@@ -1,20 +1,121 @@
 from django.core.cache import cache
 
+from .request_cache import get_request_cache
+
+# Ключи версий кеша страниц и компонентов фильтра
+TASKS_PAGE_VERSION = "tasks_page_version_cache"
+OBJECTS_PAGE_VERSION = "objects_page_cache_version"
+FILTER_TASKS_VERSION = "filter_components_cache_version_tasks"
+FILTER_OBJECTS_VERSION = "filter_components_cache_version_objects"
+# Перечни объектов, доступных по группам (см. `object_visibility`)
+OBJECT_VISIBILITY_VERSION = "object_visibility_cache_version"
+# Индексы автодополнения в памяти процессов (см. `autocomplete`)
+AUTOCOMPLETE_VERSION = "autocomplete_index_version"
+
+ALL_VERSION_KEYS = (
+    TASKS_PAGE_VERSION,
+    OBJECTS_PAGE_VERSION,
+    FILTER_TASKS_VERSION,
+    FILTER_OBJECTS_VERSION,
+    OBJECT_VISIBILITY_VERSION,
+    AUTOCOMPLETE_VERSION,
+)
+
+
+def filter_version_key(page: str) -> str:
+    """Ключ версии компонентов фильтра для страницы `tasks` или `objects`"""
+    return f"filter_components_cache_version_{page}"
+
+
+def get_version(cache_key: str, versions: dict[str, int] | None = None) -> int:
+    """
+    Возвращает версию из заранее полученного словаря `versions` (см. `CacheVersion.get_many`),
+    либо запрашивает её из кеша отдельно.
+    """
+    if versions is not None and cache_key in versions:
+        return versions[cache_key]
+    return CacheVersion(cache_key).get_cache_version()
+
 
 class CacheVersion:
+    """
+    Версия кеша, хранящаяся в отдельном ключе.
+
+    Версия не имеет TTL и увеличивается только атомарными операциями `add`/`incr`,
+    поэтому одновременные инкременты из разных воркеров gunicorn не теряются.
+    Версии тегов (`cache_tags`) записываются через `set_many` значениями общего счётчика.
+    """
+
     def __init__(self, cache_key):
         self.cache_key = cache_key
 
     def get_cache_version(self):
-        # Получаем версию из кеша; если её нет, устанавливаем в 1
-        version = cache.get(self.cache_key)
-        if version is None:
-            version = 1
-            cache.set(self.cache_key, version)
-        return version
+        return self.get_many(self.cache_key)[self.cache_key]
 
     def increment_cache_version(self):
-        # Увеличиваем версию кеша и обновляем её в кеше
-        version = self.get_cache_version() + 1
-        cache.set(self.cache_key, version)
+        # Увеличиваем версию кеша без окна чтение-изменение-запись
+        try:
+            version = cache.incr(self.cache_key)
+        except ValueError:
+            # Ключа ещё нет. Если другой воркер успел его создать - add вернёт False,
+            # и тогда инкрементируем уже существующее значение.
+            if cache.add(self.cache_key, 2, timeout=None):
+                version = 2
+            else:
+                version = cache.incr(self.cache_key)
+
+        request_cache = get_request_cache()
+        if request_cache is not None:
+            request_cache.set(self._memo_key(self.cache_key), version)
         return version
+
+    @classmethod
+    def get_many(cls, *cache_keys: str) -> dict[str, int]:
+        """
+        Возвращает версии сразу для нескольких ключей за один запрос `get_many`.
+        Отсутствующие версии создаются со значением 1.
+        Версии, уже полученные в рамках текущего HTTP запроса, берутся из кеша запроса.
+        """
+        request_cache = get_request_cache()
+        versions = {}
+        missing = []
+        for key in cache_keys:
+            if request_cache is not None and cls._memo_key(key) in request_cache:
+                versions[key] = request_cache.get(cls._memo_key(key))
+            else:
+                missing.append(key)
+
+        if missing:
+            fetched = cache.get_many(missing)
+            for key in missing:
+                version = fetched.get(key)
+                if version is None:
+                    version = cls._init_version(key)
+                versions[key] = version
+                if request_cache is not None:
+                    request_cache.set(cls._memo_key(key), version)
+
+        return versions
+
+    @classmethod
+    def set_many(cls, versions: dict[str, int]) -> None:
+        """
+        Записывает версии одним запросом `set_many`, без TTL.
+        Значения должны быть новыми для ключей (например, взятыми из `increment_cache_version` счётчика).
+        """
+        cache.set_many(versions, timeout=None)
+        request_cache = get_request_cache()
+        if request_cache is not None:
+            for key, version in versions.items():
+                request_cache.set(cls._memo_key(key), version)
+
+    @staticmethod
+    def _memo_key(cache_key: str) -> str:
+        return f"cache_version:{cache_key}"
+
+    @staticmethod
+    def _init_version(cache_key: str) -> int:
+        # add не перезапишет значение, если другой воркер уже создал ключ
+        if cache.add(cache_key, 1, timeout=None):
+            return 1
+        return cache.get(cache_key, 1)
@@ -0,0 +1,139 @@
+"""
+Прогрев кеша после деплоя или глобального сброса версий.
+
+Строит заранее первые страницы задач и объектов, компоненты фильтров и статистику,
+чтобы за построение не платил первый посетитель. Используется командой `warm_caches`.
+"""
+
+import os
+import time
+from dataclasses import dataclass, field
+
+import django
+from django.db import connections
+from django.test import RequestFactory
+
+from tasks.filters import get_fields_for_filter
+from user.models import User
+from . import cache_stats
+from .objects import get_objects
+from .request_cache import start_request_cache, end_request_cache
+from .statistics import get_stat
+from .tasks_prepare import get_tasks
+
+TASKS = "tasks"
+OBJECTS = "objects"
+FILTERS = "filters"
+STAT = "stat"
+ALL_FAMILIES = (TASKS, OBJECTS, FILTERS, STAT)
+
+
+@dataclass
+class FamilyTiming:
+    """Время прогрева одного семейства ключей кеша."""
+
+    entries: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.entries += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def merge(self, other: "FamilyTiming") -> None:
+        self.entries += other.entries
+        self.seconds += other.seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+
+
+@dataclass
+class WarmupReport:
+    timings: dict[str, FamilyTiming] = field(default_factory=dict)
+    errors: list[str] = field(default_factory=list)
+
+    def add(self, family: str, seconds: float) -> None:
+        self.timings.setdefault(family, FamilyTiming()).add(seconds)
+
+    def merge(self, other: "WarmupReport") -> None:
+        for family, timing in other.timings.items():
+            self.timings.setdefault(family, FamilyTiming()).merge(timing)
+        self.errors.extend(other.errors)
+
+
+def init_worker(nice: int = 0) -> None:
+    """
+    Инициализация процесса пула: настройка Django (для start method "spawn"),
+    свои соединения с БД вместо унаследованных от родителя и пониженный приоритет,
+    чтобы прогрев не отнимал процессорное время у рабочего сайта.
+    """
+    django.setup()
+    connections.close_all()
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+
+def warm_user(user_id: int, families: tuple[str, ...], pages: int, per_page: int, pause: float = 0) -> WarmupReport:
+    """
+    Прогревает страницы и фильтры одного пользователя.
+
+    :param pages: Сколько первых страниц задач и объектов строить.
+    :param pause: Пауза в секундах после каждой записи - ограничивает нагрузку на БД.
+    """
+    report = WarmupReport()
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return report
+
+    token = start_request_cache()
+    try:
+        if TASKS in families:
+            _warm_pages(report, TASKS, user, pages, per_page, pause)
+        if OBJECTS in families:
+            _warm_pages(report, OBJECTS, user, pages, per_page, pause)
+        if FILTERS in families:
+            for page in (TASKS, OBJECTS):
+                _timed(report, FILTERS, pause, lambda: get_fields_for_filter(user, page))
+    except Exception as exc:
+        report.errors.append(f"{user.username}: {exc!r}")
+    finally:
+        end_request_cache(token)
+        cache_stats.flush(force=True)
+
+    return report
+
+
+def warm_stat(pause: float = 0) -> WarmupReport:
+    report = WarmupReport()
+    try:
+        _timed(report, STAT, pause, get_stat)
+    except Exception as exc:
+        report.errors.append(f"{STAT}: {exc!r}")
+    cache_stats.flush(force=True)
+    return report
+
+
+def _warm_pages(report: WarmupReport, family: str, user, pages: int, per_page: int, pause: float) -> None:
+    request = RequestFactory().get("/")
+    request.user = user
+
+    # Страницы перечней выводятся по ключу сортировки - прогреваем их по цепочке курсоров, как их открывают
+    cursor = ""
+    for page_number in range(1, pages + 1):
+        if family == TASKS:
+            result = _timed(report, family, pause, lambda: get_tasks(request, page_number, per_page, cursor=cursor))
+        else:
+            result = _timed(report, family, pause, lambda: get_objects(request, page_number, per_page, cursor=cursor))
+
+        cursor = result["pagination_data"]["next_cursor"]
+        if cursor is None:
+            break
+
+
+def _timed(report: WarmupReport, family: str, pause: float, build):
+    start = time.perf_counter()
+    result = build()
+    report.add(family, time.perf_counter() - start)
+    if pause:
+        time.sleep(pause)
+    return result
@@ -0,0 +1,180 @@
+"""
+Постраничный вывод по ключу сортировки (keyset pagination).
+
+Вместо OFFSET и COUNT следующая страница выбирается условием "после последней показанной строки"
+по тем же полям, по которым идёт сортировка, поэтому дальние страницы строятся так же быстро,
+как первая, а вставка новых строк не сдвигает уже открытые страницы. Поля сортировки должны
+однозначно упорядочивать строки (последним идёт первичный ключ) и не принимать NULL.
+
+Курсор - подписанные значения полей сортировки граничной строки страницы, направление
+и номер страницы для отображения. Курсор "назад" без значений ведёт на последнюю страницу;
+при точном количестве строк в нём же передаётся размер последней страницы (остаток от деления),
+чтобы страницы, пройденные от неё назад, совпадали с пройденными вперёд. При количестве по оценке
+размер неизвестен, и такие страницы номера не получают (номер 0).
+Для клиента курсор непрозрачен, подделанный или устаревший даёт первую страницу,
+как `Paginator.get_page` для неверного номера.
+"""
+
+import hashlib
+import json
+import math
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Q, QuerySet
+
+from .cache_dto import KeysetPageRecord
+
+NEXT = "n"
+PREVIOUS = "p"
+
+# Подпись без метки времени: одна и та же позиция всегда даёт один и тот же курсор
+_CURSOR_SIGNER = signing.Signer(salt="tasks.keyset")
+
+
+@dataclass(frozen=True)
+class Cursor:
+    values: tuple
+    direction: str
+    number: int
+    size: int | None = None  # строк на последней странице, только для курсора на неё
+
+
+def encode_cursor(values, direction: str, number: int, size: int | None = None) -> str:
+    # Даты - строкой ISO 8601 с микросекундами, чтобы граница страницы не сместилась
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    data = [values, direction, number] if size is None else [values, direction, number, size]
+    return _CURSOR_SIGNER.sign_object(data, compress=True)
+
+
+def _load_cursor(cursor: str | None) -> list | None:
+    """Данные курсора без приведения типов. None - курсора нет или подпись неверна."""
+    if not cursor:
+        return None
+    try:
+        data = _CURSOR_SIGNER.unsign_object(cursor)
+    except (signing.BadSignature, ValueError):
+        return None
+    return data if isinstance(data, list) else None
+
+
+def decode_cursor(cursor: str | None, queryset: QuerySet, ordering: tuple[str, ...]) -> Cursor | None:
+    data = _load_cursor(cursor)
+    if data is None:
+        return None
+    try:
+        values, direction, number, *size = data
+        fields = [queryset.model._meta.get_field(name.lstrip("-")) for name in ordering]
+        if direction not in (NEXT, PREVIOUS) or len(values) != (len(fields) if values or direction == NEXT else 0):
+            return None
+        if len(size) > 1 or size and (values or int(size[0]) < 1):
+            return None
+        values = tuple(field.to_python(value) for field, value in zip(fields, values))
+        return Cursor(values, direction, max(int(number), 0), int(size[0]) if size else None)
+    except (ValueError, TypeError):
+        return None
+
+
+def cursor_digest(cursor: str | None) -> str:
+    """
+    Короткий отпечаток позиции курсора (значения, направление, номер, размер) для ключа кеша.
+    Пустая строка - первая страница, в том числе для неверного курсора.
+    """
+    data = _load_cursor(cursor)
+    if data is None:
+        return ""
+    return hashlib.sha1(json.dumps(data, separators=(",", ":")).encode()).hexdigest()[:16]
+
+
+def _reverse(ordering: tuple[str, ...]) -> tuple[str, ...]:
+    return tuple(name[1:] if name.startswith("-") else f"-{name}" for name in ordering)
+
+
+def keyset_condition(ordering: tuple[str, ...], values: tuple) -> Q:
+    """
+    Условие "строка идёт после `values` в порядке `ordering`":
+    (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) для возрастающих полей.
+    """
+    condition = Q()
+    equal = {}
+    for name, value in zip(ordering, values):
+        field = name.lstrip("-")
+        lookup = "lt" if name.startswith("-") else "gt"
+        condition |= Q(**equal, **{f"{field}__{lookup}": value})
+        equal[field] = value
+    return condition
+
+
+def _row_values(row, ordering: tuple[str, ...]) -> tuple:
+    return tuple(getattr(row, name.lstrip("-")) for name in ordering)
+
+
+def paginate_keyset(queryset: QuerySet, ordering: tuple[str, ...], cursor: str | None, per_page) -> dict:
+    """
+    Страница `queryset` в порядке `ordering` после (или перед) строкой из `cursor`.
+
+    Выбирается на одну строку больше размера страницы, чтобы узнать, есть ли страница дальше.
+    Общее количество строк не считается, его добавляет `add_total`.
+    Номер 0 - страница без номера (пройдена назад от последней при количестве по оценке).
+    """
+    position = decode_cursor(cursor, queryset, ordering)
+    backwards = position is not None and position.direction == PREVIOUS
+    # Последняя страница - остаток строк, иначе границы страниц назад не совпадут с границами вперёд
+    size = position.size if position is not None and position.size else int(per_page)
+
+    page_qs = queryset
+    if position is not None and position.values:
+        page_qs = page_qs.filter(keyset_condition(_reverse(ordering) if backwards else ordering, position.values))
+    page_qs = page_qs.order_by(*(_reverse(ordering) if backwards else ordering))
+
+    rows = list(page_qs[:size + 1])
+    has_more = len(rows) > size
+    rows = rows[:size]
+    if backwards:
+        rows.reverse()
+
+    number = position.number if position else 1
+    # Назад уходят только со страницы, которая идёт после текущей, кроме перехода на последнюю
+    has_next = has_more if not backwards else bool(position.values)
+    has_previous = has_more if backwards else position is not None
+    # Соседи страницы без номера тоже без номера
+    next_number, previous_number = (number + 1, number - 1) if number else (0, 0)
+
+    next_cursor = encode_cursor(_row_values(rows[-1], ordering), NEXT, next_number) if has_next and rows else None
+    previous_cursor = (
+        encode_cursor(_row_values(rows[0], ordering), PREVIOUS, previous_number) if has_previous and rows else None
+    )
+
+    return {
+        "page_obj": KeysetPageRecord(rows, number, next_cursor, previous_cursor),
+        "keyset": True,
+        "next_cursor": next_cursor,
+        "previous_cursor": previous_cursor,
+        "count": None,
+        "num_pages": None,
+        "last_cursor": None,
+        "per_page": per_page,
+    }
+
+
+def add_total(pagination_data: dict, total) -> dict:
+    """
+    Добавляет к данным страницы общее количество строк (`listing_counts.ListingCount`),
+    число страниц и курсор последней страницы. Номер последней страницы по оценке приблизительный,
+    поэтому последняя страница и страницы перед ней получают номер, только если количество точное.
+    """
+    per_page = int(pagination_data["per_page"])
+    num_pages = max(math.ceil(total.value / per_page), 1)
+    last_cursor = None
+    if pagination_data["page_obj"].has_next():
+        if total.is_exact:
+            last_cursor = encode_cursor((), PREVIOUS, num_pages, total.value - (num_pages - 1) * per_page)
+        else:
+            last_cursor = encode_cursor((), PREVIOUS, 0)
+    return {
+        **pagination_data,
+        "count": total,
+        "num_pages": num_pages,
+        "last_cursor": last_cursor,
+    }
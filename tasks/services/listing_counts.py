@@ -0,0 +1,79 @@
+"""
+Общее количество строк в постраничных перечнях задач и объектов.
+
+Количество кешируется отдельно от страниц - одна запись на класс видимости и канонический
+отпечаток фильтра (`filter_signature`), её делят все страницы перечня. Запись помечается
+теми же тегами, что и страницы (кроме тегов показанных строк), и устаревает вместе с перечнем.
+
+Для очень больших перечней без фильтров точный COUNT заменяется оценкой планировщика
+(Postgres: `reltuples` для таблицы целиком, число строк из EXPLAIN для запроса с условиями).
+Признак `is_exact` сообщает шаблону, точное ли число показано.
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from django.db import connections
+from django.db.models import QuerySet
+
+from .cache_aside import cache_aside
+
+# Начиная с такой оценки перечень без фильтров не пересчитывается точно
+EXACT_COUNT_LIMIT = 100_000
+COUNT_TIMEOUT = 600
+
+
+@dataclass(frozen=True)
+class ListingCount:
+    value: int
+    is_exact: bool
+
+
+def estimated_count(queryset: QuerySet) -> int | None:
+    """
+    Оценка количества строк по статистике планировщика. None, если СУБД оценку не даёт.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            # -1 - таблица ещё ни разу не анализировалась
+            if row and row[0] >= 0:
+                return int(row[0])
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+
+    # psycopg сам разбирает json, но не для всех типов столбца
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_listing(queryset: QuerySet, allow_estimate: bool = False) -> ListingCount:
+    if allow_estimate:
+        estimate = estimated_count(queryset)
+        if estimate is not None and estimate >= EXACT_COUNT_LIMIT:
+            return ListingCount(estimate, is_exact=False)
+    return ListingCount(queryset.count(), is_exact=True)
+
+
+def listing_total(cache_key: str, build_queryset: Callable[[], QuerySet], tags: Callable[[object], Iterable[str]],
+                  version, allow_estimate: bool = False) -> ListingCount:
+    """
+    Закешированное количество строк перечня. `build_queryset` вызывается только при пересчёте.
+    Оценка вместо точного числа допускается, только если `allow_estimate` (перечень без фильтров).
+    """
+    return cache_aside(
+        cache_key,
+        lambda: count_listing(build_queryset(), allow_estimate=allow_estimate),
+        timeout=COUNT_TIMEOUT,
+        version=version,
+        tags=tags,
+    )
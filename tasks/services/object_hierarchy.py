@@ -0,0 +1,166 @@
+"""
+Иерархия объектов в таблице замыкания (`ObjectClosure`).
+
+Для каждого объекта хранятся строки со всеми его предками (и с ним самим на глубине 0),
+поэтому предки, потомки и проверка на цикл - один запрос по индексу, а не подъём по `parent`
+по запросу на уровень.
+
+Таблица обновляется сигналами (см. `connect_object_hierarchy_signals`): при создании объекта
+и смене родителя поддерево объекта перевешивается целиком. Изменения в обход сигналов
+(`QuerySet.update(parent=...)`) исправляет команда `rebuild_object_hierarchy`.
+"""
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+
+from tasks.models import Object, ObjectClosure
+from .cache_tags import invalidate_tags, object_tag
+
+REBUILD_CHUNK_SIZE = 5000
+
+
+def closure_rows(parents: dict[int, int | None]) -> set[tuple[int, int, int]]:
+    """
+    Строки замыкания (предок, потомок, глубина) по словарю {id объекта: id родителя}.
+    Цикл в данных обрывается на повторном объекте.
+    """
+    rows = set()
+    for obj_id in parents:
+        ancestor_id, depth, seen = obj_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen:
+            seen.add(ancestor_id)
+            rows.add((ancestor_id, obj_id, depth))
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    return rows
+
+
+@transaction.atomic
+def rebuild_all(chunk_size: int = REBUILD_CHUNK_SIZE) -> int:
+    """Пересобирает таблицу по полю `parent`. Возвращает количество строк."""
+    rows = closure_rows(dict(Object.objects.values_list("id", "parent_id")))
+    ObjectClosure.objects.all().delete()
+    ObjectClosure.objects.bulk_create(
+        [ObjectClosure(ancestor_id=ancestor, descendant_id=descendant, depth=depth)
+         for ancestor, descendant, depth in rows],
+        batch_size=chunk_size,
+    )
+    return len(rows)
+
+
+def verify() -> dict[str, list[tuple[int, int, int]]]:
+    """Сверяет таблицу с полем `parent`: {"missing": [...], "extra": [...]}, пустой - расхождений нет."""
+    expected = closure_rows(dict(Object.objects.values_list("id", "parent_id")))
+    actual = set(ObjectClosure.objects.values_list("ancestor_id", "descendant_id", "depth"))
+    differences = {}
+    if expected - actual:
+        differences["missing"] = sorted(expected - actual)
+    if actual - expected:
+        differences["extra"] = sorted(actual - expected)
+    return differences
+
+
+def attach(obj_id: int, parent_id: int | None) -> set[int]:
+    """
+    Перевешивает поддерево объекта под `parent_id` (None - в корень).
+    Возвращает прежних и новых предков объекта.
+    """
+    with transaction.atomic():
+        ObjectClosure.objects.bulk_create(
+            [ObjectClosure(ancestor_id=obj_id, descendant_id=obj_id, depth=0)], ignore_conflicts=True
+        )
+        subtree = list(ObjectClosure.objects.filter(ancestor_id=obj_id).values_list("descendant_id", "depth"))
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+
+        previous = set(
+            ObjectClosure.objects.filter(descendant_id=obj_id).exclude(ancestor_id__in=subtree_ids)
+            .values_list("ancestor_id", flat=True)
+        )
+        if previous:
+            ObjectClosure.objects.filter(descendant_id__in=subtree_ids, ancestor_id__in=previous).delete()
+
+        # Родитель из собственного поддерева дал бы цикл: такой объект остаётся корнем (см. `Object.clean`)
+        if parent_id is None or parent_id in subtree_ids:
+            return previous
+
+        ObjectClosure.objects.bulk_create(
+            [ObjectClosure(ancestor_id=parent_id, descendant_id=parent_id, depth=0)], ignore_conflicts=True
+        )
+        parent_ancestors = list(
+            ObjectClosure.objects.filter(descendant_id=parent_id).values_list("ancestor_id", "depth")
+        )
+        ObjectClosure.objects.bulk_create([
+            ObjectClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+            for ancestor_id, ancestor_depth in parent_ancestors
+            for descendant_id, depth in subtree
+        ])
+    return previous | {ancestor_id for ancestor_id, _ in parent_ancestors}
+
+
+def ancestors(obj_id: int) -> QuerySet[Object]:
+    """Предки объекта от корня к родителю."""
+    return Object.objects.filter(
+        descendant_links__descendant_id=obj_id, descendant_links__depth__gt=0
+    ).order_by("-descendant_links__depth")
+
+
+def descendant_ids(obj_id: int, include_self: bool = True) -> QuerySet:
+    """id потомков объекта - для подзапроса `__in`."""
+    links = ObjectClosure.objects.filter(ancestor_id=obj_id)
+    if not include_self:
+        links = links.filter(depth__gt=0)
+    return links.values("descendant_id")
+
+
+def is_descendant(obj_id: int, ancestor_id: int) -> bool:
+    """Находится ли объект в поддереве `ancestor_id` (включая сам `ancestor_id`)."""
+    return ObjectClosure.objects.filter(ancestor_id=ancestor_id, descendant_id=obj_id).exists()
+
+
+def subtree_tasks(queryset: QuerySet, obj_id: int) -> QuerySet:
+    """Задачи из `queryset`, привязанные к объекту или любому его потомку, без повторов."""
+    links = Object.tasks.through.objects.filter(object_id__in=descendant_ids(obj_id))
+    return queryset.filter(pk__in=links.values("task_id"))
+
+
+# --- Сигналы ---
+
+def _object_pre_save(sender, instance: Object, raw=False, **kwargs):
+    if raw:
+        return
+    instance._hierarchy_previous_parent = (
+        Object.objects.filter(pk=instance.pk).values_list("parent_id", flat=True).first() if instance.pk else None
+    )
+
+
+def _object_saved(sender, instance: Object, created, raw=False, **kwargs):
+    # loaddata (raw) загружает объекты в произвольном порядке: поддерево, уже привязанное
+    # к ещё не загруженному родителю, перевешивается вместе с ним, когда дойдёт очередь родителя
+    if not (raw or created) and getattr(instance, "_hierarchy_previous_parent", None) == instance.parent_id:
+        return
+    # Поддерево перенесено - меняются перечни задач поддеревьев у прежних и новых предков
+    invalidate_tags(*(object_tag(ancestor_id) for ancestor_id in attach(instance.pk, instance.parent_id)))
+
+
+def _object_pre_delete(sender, instance: Object, **kwargs):
+    # Дочерние объекты станут корнями (SET_NULL без сигналов)
+    instance._hierarchy_children = list(instance.children.values_list("id", flat=True))
+
+
+def _object_deleted(sender, instance: Object, **kwargs):
+    # При удалении нескольких объектов сразу дочерние могли быть удалены вместе с родителем
+    children = Object.objects.filter(pk__in=getattr(instance, "_hierarchy_children", []))
+    previous = set()
+    for child_id in children.values_list("id", flat=True):
+        previous |= attach(child_id, None)
+    invalidate_tags(*(object_tag(ancestor_id) for ancestor_id in previous))
+
+
+def connect_object_hierarchy_signals() -> None:
+    """
+    Подключает обновление `ObjectClosure` к сигналам объектов. Вызывается из `AppConfig.ready`.
+    """
+    pre_save.connect(_object_pre_save, sender=Object, dispatch_uid="object_hierarchy_pre_save")
+    post_save.connect(_object_saved, sender=Object, dispatch_uid="object_hierarchy_saved")
+    pre_delete.connect(_object_pre_delete, sender=Object, dispatch_uid="object_hierarchy_pre_delete")
+    post_delete.connect(_object_deleted, sender=Object, dispatch_uid="object_hierarchy_deleted")
@@ -0,0 +1,72 @@
+"""
+Перечни объектов, доступных пользователю по группам.
+
+Объект виден пользователю, если состоит хотя бы в одной из его групп (`UserObjectGroup` и
+`objects_groups_m2m`). Перечень вычисляется один раз на набор групп (`groups_fingerprint`)
+и хранится в кеше отсортированным массивом id для проверок в процессе (`can_view_object`,
+`contains`) двоичным поиском. В SQL вместо соединения `groups__users=user` с DISTINCT
+фильтруют подзапросом `visible_objects_query`: массив в `id__in` передал бы каждый id
+отдельным параметром запроса.
+
+Изменение групп пользователя меняет его отпечаток, изменение состава групп и удаление
+объектов и групп увеличивает `OBJECT_VISIBILITY_VERSION` (см. сигналы в `tasks.models`).
+"""
+
+from array import array
+from bisect import bisect_left
+
+from django.db.models import QuerySet
+
+from tasks.models import Object, UserObjectGroup
+from .cache_aside import cache_aside
+from .cache_version import OBJECT_VISIBILITY_VERSION, get_version
+from .request_cache import memoize
+from .visibility import groups_fingerprint
+
+
+def _compact(ids) -> array:
+    ids = sorted(set(ids))
+    # 4 байта на id, пока id помещаются
+    return array("I" if not ids or ids[-1] < 2 ** 32 else "Q", ids)
+
+
+def visible_objects_query(user) -> QuerySet:
+    """
+    Подзапрос id объектов, доступных пользователю по группам, для `filter(id__in=...)`.
+    """
+    group_ids = UserObjectGroup.objects.filter(user=user).values("group_id")
+    return Object.groups.through.objects.filter(objectgroup_id__in=group_ids).values("object_id")
+
+
+def _compute_visible_object_ids(user) -> array:
+    return _compact(visible_objects_query(user).values_list("object_id", flat=True))
+
+
+def visible_object_ids(user, versions: dict[str, int] | None = None) -> array:
+    """
+    Отсортированный массив id объектов, доступных пользователю по группам,
+    для проверок в процессе (`contains`, `can_view_object`). В SQL - `visible_objects_query`.
+    """
+
+    def compute():
+        fingerprint = groups_fingerprint(user)
+        if fingerprint == "g:none":
+            return array("I")
+        return cache_aside(
+            f"object_visibility:{fingerprint}",
+            lambda: _compute_visible_object_ids(user),
+            timeout=3600,
+            version=get_version(OBJECT_VISIBILITY_VERSION, versions),
+        )
+
+    return memoize(f"visible_object_ids:{user.pk}", compute)
+
+
+def contains(ids: array, object_id: int) -> bool:
+    index = bisect_left(ids, object_id)
+    return index < len(ids) and ids[index] == object_id
+
+
+def can_view_object(user, object_id: int) -> bool:
+    """Доступен ли объект пользователю по группам."""
+    return contains(visible_object_ids(user), object_id)
@@ -1,6 +1,5 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.cache import cache
 from django.db.models import Count, Q, F
 from django.db.models import OuterRef, Subquery, Case, When, Value, CharField, QuerySet
 from django.db.models.functions import Concat, Substr, Length
@@ -12,15 +11,33 @@ from django.urls import reverse
 from tasks.forms import ObjectForm, ObjectCreateForm
 from tasks.models import Object, AttachedFile
 from user.models import User
-from .cache_version import CacheVersion
+from . import cache_stats
+from .cache_dto import object_card, compact_pagination
+from .cache_aside import cache_aside, delete as cache_aside_delete
+from .cache_tags import user_objects_tags, user_tasks_tags, object_tag, get_many_tagged, set_many_tagged, tags_snapshot
+from .cache_version import OBJECTS_PAGE_VERSION, TASKS_PAGE_VERSION, get_version
+from .keyset import paginate_keyset, cursor_digest, add_total
+from .listing_counts import ListingCount, listing_total
+from .object_hierarchy import ancestors
+from .object_visibility import visible_object_ids, visible_objects_query, can_view_object, contains
 from .service import paginate_queryset
 from .service import remove_unused_attached_files
 from .tasks_actions import create_tags, auto_resize_pic
 from .tasks_prepare import permission_filter
-from ..filters import ObjectFilter
+from .visibility import objects_page_fingerprint, tasks_fingerprint, groups_fingerprint
+from ..filters import ObjectFilter, OBJECTS_FILTER_PARAMS, OBJECTS_FILTER_CACHE_TAGS, filter_signature, filter_cache_tags
+
+
+# Порядок объектов в перечне, однозначный для постраничного вывода по ключу сортировки
+OBJECTS_ORDERING = ("-id",)
 
 
 def get_objects_list(user) -> QuerySet[Object]:
+    # Доступ по группам - подзапросом по связующей таблице, без соединения с группами и DISTINCT
+    return _annotated_objects().filter(id__in=visible_objects_query(user))
+
+
+def _annotated_objects() -> QuerySet[Object]:
     # Подзапрос для получения первого файла изображения (jpeg, jpg, png) для каждого объекта
     image_subquery = (
         AttachedFile.objects.filter(objects_set=OuterRef("pk"), file__iregex=r"\.(jpeg|jpg|png)$")
@@ -31,7 +48,6 @@ def get_objects_list(user) -> QuerySet[Object]:
     objects = (
         Object.objects.all()
             .prefetch_related("tags", "groups")
-            .filter(groups__users=user)
             .annotate(
             img_preview=Subquery(image_subquery, output_field=CharField()),  # Используем подзапрос с одним значением
             child_count=Count("children", distinct=True),  # Подсчет уникальных дочерних объектов
@@ -43,54 +59,145 @@ def get_objects_list(user) -> QuerySet[Object]:
             ),
         )
             .only("id", "name", "priority", "description", "slug", "zabbix_link", "notes_link", "ecstasy_link", "another_link")
-            .distinct()
-            .order_by("-id")
+            .order_by(*OBJECTS_ORDERING)
     )
 
     return objects
 
 
-def add_tasks_count_to_objects(queryset: QuerySet[Object], user: User, field_name: str) -> QuerySet[Object]:
-    for obj in queryset:
-        count: int = permission_filter(user).filter(objects_set=obj, is_done=False).count()
-        setattr(obj, field_name, count)
+def add_tasks_count_to_objects(objects, user: User, field_name: str, versions=None):
+    """
+    Проставляет объектам количество невыполненных задач, видимых пользователю.
 
-    return queryset
+    Счётчик кешируется для каждого объекта и класса видимости задач (`tasks_fingerprint`)
+    и помечается тегами объекта и перечня задач пользователя. Как и страницы задач, счётчики
+    устаревают с версией `TASKS_PAGE_VERSION`: её увеличивают изменения инженеров и отделов.
+    Недостающие счётчики считаются одним сгруппированным запросом по связующей таблице
+    для всех объектов сразу и сохраняются одним `set_many`.
+    """
+    objects = list(objects)
+    fingerprint = tasks_fingerprint(user)
+    keys = {obj.id: f"obj_tasks_count:{fingerprint}:{obj.id}" for obj in objects}
+    version = get_version(TASKS_PAGE_VERSION, versions)
+
+    cached = get_many_tagged(keys.values(), version=version)
+    counts = {obj_id: cached[key] for obj_id, key in keys.items() if key in cached}
+    missing = [obj_id for obj_id in keys if obj_id not in counts]
+    cache_stats.record("obj_tasks_count:", cache_stats.HITS, len(counts))
+
+    if missing:
+        cache_stats.record("obj_tasks_count:", cache_stats.MISS_ABSENT, len(missing))
+        snapshot = tags_snapshot()
+        counts.update(
+            Object.tasks.through.objects.filter(
+                object_id__in=missing,
+                task_id__in=permission_filter(user).filter(is_done=False).values("pk"),
+            )
+                .values("object_id")
+                .annotate(count=Count("task_id"))
+                .values_list("object_id", "count")
+        )
+        tags = user_tasks_tags(user)
+        for obj_id in missing:
+            counts.setdefault(obj_id, 0)
+        set_many_tagged(
+            {keys[obj_id]: (counts[obj_id], tags | {object_tag(obj_id)}) for obj_id in missing},
+            timeout=600,
+            version=version,
+            snapshot=snapshot,
+        )
 
+    for obj in objects:
+        setattr(obj, field_name, counts[obj.id])
+
+    return objects
 
-def get_objects(request, filter_params, page_number, per_page):
+
+def get_objects(request, page_number, per_page, versions=None, cursor=None, with_total=False):
+    """
+    Возвращает страницу объектов. Фильтры берутся из `request.GET`.
+    Страница кешируется под каноническим отпечатком фильтра (см. `filter_signature`).
+    С `cursor` страница выбирается по ключу сортировки, а с `with_total` к ней добавляется
+    общее количество объектов, как в `get_tasks`.
+    """
+    page_key = page_number if cursor is None else f"k{cursor_digest(cursor)}"
+    # Пользователи с одинаковыми группами и видимостью задач получают одну и ту же запись
+    cache_key = f'objects_page:{page_key}:{per_page}:{objects_page_fingerprint(request.user)}'
+    signature = filter_signature(request.GET, OBJECTS_FILTER_PARAMS)
+    if signature:
+        cache_key += f':f:{signature}'
+
+    def page_tags(result) -> set[str]:
+        # Страница зависит от показанных объектов и от групп пользователя,
+        # отфильтрованная - ещё и от полей и связей, по которым фильтруют.
+        tags = _listing_tags(request)
+        tags.update(object_tag(obj.id) for obj in result["objects_qs"])
+        return tags
+
+    result = cache_aside(
+        cache_key,
+        lambda: _build_objects_page(request, page_number, per_page, cursor=cursor, versions=versions),
+        timeout=600,
+        version=get_version(OBJECTS_PAGE_VERSION, versions),
+        tags=page_tags,
+    )
+
+    if cursor is not None and with_total:
+        result = {**result, "pagination_data": add_total(result["pagination_data"], objects_total(request, versions))}
+    return result
+
+
+def objects_total(request, versions=None) -> ListingCount:
     """
-    Возвращает список объектов. Если не применяются фильтры - возвращает объекты из кэша
+    Количество объектов в перечне с фильтрами из `request.GET` (см. `tasks_total`).
+    Количество задач объектов на него не влияет, поэтому запись общая для набора групп.
     """
-    cache_key = f'objects_page:{page_number}:{request.user}'
+    cache_key = f"objects_count:{groups_fingerprint(request.user)}"
+    signature = filter_signature(request.GET, OBJECTS_FILTER_PARAMS)
+    if signature:
+        cache_key += f":f:{signature}"
+
+    return listing_total(
+        cache_key,
+        lambda: ObjectFilter(request.GET, queryset=get_objects_list(request.user)).qs,
+        tags=lambda _: _listing_tags(request),
+        version=get_version(OBJECTS_PAGE_VERSION, versions),
+        allow_estimate=not signature,
+    )
 
-    version_cache_key = "objects_page_cache_version"
-    cache_version = CacheVersion(version_cache_key)
-    cache_version_value = cache_version.get_cache_version()
 
-    cached_data = cache.get(cache_key, version=cache_version_value) if not filter_params else None
+def _listing_tags(request) -> set[str]:
+    tags = user_objects_tags(request.user)
+    tags.update(filter_cache_tags(request.GET, OBJECTS_FILTER_CACHE_TAGS))
+    return tags
 
-    if cached_data:
-        return cached_data
 
+def _build_objects_page(request, page_number, per_page, cursor=None, versions=None):
     # Получение списка объектов и пагинирование
     filtered_objects = ObjectFilter(request.GET, queryset=get_objects_list(request.user)).qs
-    pagination_data = paginate_queryset(filtered_objects, page_number, per_page)
-    add_tasks_count_to_objects(pagination_data["page_obj"], user=request.user, field_name="tasks_count")
+    if cursor is None:
+        pagination_data = paginate_queryset(filtered_objects, page_number, per_page)
+    else:
+        pagination_data = paginate_keyset(filtered_objects, OBJECTS_ORDERING, cursor, per_page)
+    add_tasks_count_to_objects(
+        pagination_data["page_obj"], user=request.user, field_name="tasks_count", versions=versions
+    )
+
+    # В кеш кладём карточки объектов вместо Page с моделями и полным QuerySet внутри
+    pagination_data = compact_pagination(
+        pagination_data, [object_card(obj) for obj in pagination_data["page_obj"]]
+    )
 
-    result = {
+    return {
         "objects_qs": pagination_data["page_obj"],
         "pagination_data": pagination_data,
     }
 
-    # Кэшируем результат, если отсутствуют фильтры
-    if not filter_params:
-        cache.set(cache_key, result, timeout=600, version=cache_version_value)
-
-    return result
 
-
-def get_obj(object_slug, user):
+def get_obj(object_slug):
+    """
+    Данные страницы объекта. Не зависят от пользователя - доступ проверяет `get_single_object`.
+    """
     obj = (
         Object.objects.filter(slug=object_slug)
             .prefetch_related("files", "tags", "groups")
@@ -100,7 +207,6 @@ def get_obj(object_slug, user):
             done_tasks_count=Count("id", filter=Q(tasks__is_done=True)),
             undone_tasks_count=Count("id", filter=Q(tasks__is_done=False)),
         )
-            .filter(groups__users=user)
             .first()
     )
 
@@ -123,25 +229,34 @@ def get_obj(object_slug, user):
         "object": obj,
         "obj_images": images,
         "obj_files": non_images,
-        "object_id_list": [obj.id],
+        # Предвыбранный объект в форме создания задачи (виджет с подгрузкой веток, см. tree-select.html)
+        "object_id_list": [{"id": obj.id, "label": obj.name}],
     }
 
 
 def get_single_object(user, object_slug):
     """
-    Возвращает список объектов. Если не применяются фильтры - возвращает объекты из кэша
+    Возвращает данные страницы объекта. Запись в кеше общая для всех пользователей,
+    доступ по группам проверяется при каждом обращении.
     """
     cache_key = f'single_obj_{object_slug}'
-    cached_data = cache.get(cache_key)
-
-    if cached_data:
-        return cached_data
+    result = cache_aside(cache_key, lambda: get_obj(object_slug), timeout=600)
+    if not can_view_object(user, result["object"].id):
+        raise Http404()
+    return result
 
-    obj = get_obj(object_slug, user)
-    result = {**obj}
-    cache.set(cache_key, result, timeout=600)
 
-    return result
+def get_breadcrumbs(user, obj) -> list[dict]:
+    """
+    Предки объекта от корня к родителю. У недоступных пользователю предков нет `slug` -
+    они показываются без ссылки.
+    """
+    crumbs = list(ancestors(obj.id).values("id", "name", "slug"))
+    visible_ids = visible_object_ids(user)
+    for crumb in crumbs:
+        if not contains(visible_ids, crumb["id"]):
+            crumb["slug"] = None
+    return crumbs
 
 
 @login_required
@@ -174,8 +289,8 @@ def edit_object(request, object_slug):
                 updated_object.files.add(AttachedFile.objects.create(file=file))
             updated_object.save()
 
-            cache.delete(f'single_obj_{object_slug}')
-            cache.delete(f'obj_{object_slug}_childs')
+            cache_aside_delete(f'single_obj_{object_slug}')
+            cache_aside_delete(f'obj_{object_slug}_childs')
 
             messages.add_message(request, messages.SUCCESS, f"Объект '{updated_object.name}' отредактирован")
 
@@ -187,21 +302,27 @@ def edit_object(request, object_slug):
     return redirect(redirect_to)
 
 
-def get_child_objects(user, parent):
+def get_child_objects(user, parent, versions=None):
     """
-    Возвращает список объектов. Если не применяются фильтры - возвращает объекты из кэша
+    Возвращает список объектов. Если не применяются фильтры - возвращает объекты из кэша.
+
+    Запись помечена тегами родителя и дочерних объектов: сохранение и удаление объекта
+    инвалидируют тег его родителя (прежнего и нового), поэтому новый или перенесённый
+    дочерний объект появляется сразу. Количество задач зависит от пользователя и
+    проставляется после чтения, как на странице объектов.
     """
 
     cache_key = f'obj_{parent.slug}_childs'
-    cached_data = cache.get(cache_key)
-    if cached_data is not None:
-        return cached_data
-
-    result = get_objects_list(user).filter(parent=parent)
-
-    cache.set(cache_key, result, timeout=600)
-
-    return result
+    # В общей записи - карточки всех дочерних объектов, недоступные пользователю отбрасываем при чтении
+    children = cache_aside(
+        cache_key,
+        lambda: [object_card(obj) for obj in _annotated_objects().filter(parent=parent)],
+        timeout=600,
+        tags=lambda cards: {object_tag(parent.id), *(object_tag(card.id) for card in cards)},
+    )
+    visible_ids = visible_object_ids(user)
+    children = [card for card in children if contains(visible_ids, card.id)]
+    return add_tasks_count_to_objects(children, user=user, field_name="tasks_count", versions=versions)
 
 
 @login_required
@@ -0,0 +1,71 @@
+"""
+Кеш в пределах одного HTTP запроса (L1).
+
+Хранилище создаётся `RequestCacheMiddleware` в начале запроса и выбрасывается после ответа.
+Вспомогательные функции кеширования из `tasks/services` читают через него версии кеша,
+компоненты фильтров и прочие значения, поэтому повторные обращения внутри одного запроса
+не ходят ни в Redis, ни в базу данных.
+
+Вне запроса (management команды, тесты сервисов) хранилища нет и значения всегда
+вычисляются заново.
+"""
+
+from contextvars import ContextVar
+from typing import Any, Callable
+
+_MISSING = object()
+
+
+class RequestCache:
+    def __init__(self) -> None:
+        self._data: dict[str, Any] = {}
+        # Количество обращений к Redis/БД, которых удалось избежать
+        self.saved_round_trips = 0
+
+    def get(self, key: str, default=None):
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING:
+            return default
+        self.saved_round_trips += 1
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def set(self, key: str, value) -> None:
+        self._data[key] = value
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+
+_current: ContextVar[RequestCache | None] = ContextVar("request_cache", default=None)
+
+
+def get_request_cache() -> RequestCache | None:
+    return _current.get()
+
+
+def start_request_cache():
+    """Создаёт хранилище для текущего запроса и возвращает токен для `end_request_cache`."""
+    return _current.set(RequestCache())
+
+
+def end_request_cache(token) -> None:
+    _current.reset(token)
+
+
+def memoize(key: str, getter: Callable[[], Any]):
+    """
+    Возвращает значение из кеша запроса, либо вычисляет его через `getter` и запоминает.
+    """
+    request_cache = get_request_cache()
+    if request_cache is None:
+        return getter()
+
+    if key in request_cache:
+        return request_cache.get(key)
+
+    value = getter()
+    request_cache.set(key, value)
+    return value
@@ -0,0 +1,204 @@
+"""
+Полнотекстовый поиск задач и объектов.
+
+Для каждой задачи (заголовок и текст) и каждого объекта (название и описание) хранится документ
+`SearchDocument` - текст без HTML-разметки CKEditor, поэтому поиск не находит совпадений внутри
+тегов и атрибутов. Полнотекстовый индекс над документами создаёт миграция:
+
+- Postgres: вычисляемый столбец `vector` (`to_tsvector('russian', body)`) с индексом GIN,
+  слова запроса приводятся к основе русским словарём;
+- SQLite: внешняя таблица FTS5 `search_documents_fts`, которую триггеры синхронизируют с документами
+  (для локальной разработки, без морфологии - совпадение по началу слова).
+
+На других СУБД поиск идёт по `body` через `icontains`. Документы обновляются сигналами сохранения
+и удаления, `rebuild_search_index` пересобирает их целиком (после массовых изменений в обход сигналов).
+"""
+
+import html
+import re
+from dataclasses import dataclass
+
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete
+from django.utils.html import strip_tags
+
+from tasks.models import Task, Object, SearchDocument
+
+# Сколько первых слов запроса учитывается
+MAX_TERMS = 8
+REBUILD_CHUNK_SIZE = 2000
+
+_WORD = re.compile(r"\w+")
+_SPACES = re.compile(r"\s+")
+
+# Поля, из которых составляется документ
+_INDEXED_FIELDS = {
+    SearchDocument.Kind.TASK: ("header", "text"),
+    SearchDocument.Kind.OBJECT: ("name", "description"),
+}
+_MODELS = {
+    SearchDocument.Kind.TASK: Task,
+    SearchDocument.Kind.OBJECT: Object,
+}
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    id: int
+    rank: float
+
+
+def html_to_text(value: str | None) -> str:
+    """Текст без HTML-тегов и сущностей (&nbsp;, &laquo;...) с пробелами вместо переносов."""
+    if not value:
+        return ""
+    return _SPACES.sub(" ", html.unescape(strip_tags(value)).replace("\xa0", " ")).strip()
+
+
+def document_body(kind: str, instance) -> str:
+    return " ".join(filter(None, (html_to_text(getattr(instance, field)) for field in _INDEXED_FIELDS[kind])))
+
+
+def index(kind: str, instance) -> None:
+    SearchDocument.objects.update_or_create(
+        kind=kind, ref_id=instance.pk, defaults={"body": document_body(kind, instance)}
+    )
+
+
+def remove(kind: str, ref_id: int) -> None:
+    SearchDocument.objects.filter(kind=kind, ref_id=ref_id).delete()
+
+
+@transaction.atomic
+def rebuild_search_index(chunk_size: int = REBUILD_CHUNK_SIZE) -> int:
+    """Пересобирает документы всех задач и объектов. Возвращает количество документов."""
+    total = 0
+    SearchDocument.objects.all().delete()
+    for kind, model in _MODELS.items():
+        fields = _INDEXED_FIELDS[kind]
+        batch = []
+        for values in model.objects.order_by("pk").values_list("pk", *fields).iterator(chunk_size=chunk_size):
+            body = " ".join(filter(None, (html_to_text(value) for value in values[1:])))
+            batch.append(SearchDocument(kind=kind, ref_id=values[0], body=body))
+            if len(batch) >= chunk_size:
+                SearchDocument.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        SearchDocument.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+def _terms(query: str) -> list[str]:
+    return _WORD.findall(query.lower())[:MAX_TERMS]
+
+
+def _match(terms: list[str]) -> tuple[str, str, str, str] | None:
+    """
+    Соединение с индексом, условие совпадения, выражение релевантности и запрос к индексу
+    для текущей СУБД. Запрос подставляется в каждый `%s` условия и релевантности.
+    None - полнотекстового индекса нет.
+    """
+    if connection.vendor == "postgresql":
+        # Каждое слово - по началу основы: "серв" найдёт "сервера"
+        return (
+            "",
+            "d.vector @@ to_tsquery('russian', %s)",
+            "ts_rank_cd(d.vector, to_tsquery('russian', %s))",
+            " & ".join(f"{term}:*" for term in terms),
+        )
+    if connection.vendor == "sqlite":
+        # Слова в кавычках, чтобы символы запроса не разбирались как синтаксис FTS5.
+        # bm25 тем меньше, чем документ релевантнее
+        return (
+            "JOIN search_documents_fts ON search_documents_fts.rowid = d.id",
+            "search_documents_fts MATCH %s",
+            "-bm25(search_documents_fts)",
+            " ".join(f'"{term}"*' for term in terms),
+        )
+    return None
+
+
+def search_filter(queryset: QuerySet, kind: str, query: str) -> QuerySet:
+    """
+    Оставляет в `queryset` задачи или объекты, в документе которых есть все слова запроса.
+    Порядок `queryset` не меняется.
+    """
+    terms = _terms(query)
+    match = _match(terms) if terms else None
+    if match is None:
+        # Запрос без слов (одни знаки) или СУБД без индекса - подстрокой по тексту документа
+        documents = SearchDocument.objects.filter(kind=kind, body__icontains=query.strip())
+        return queryset.filter(pk__in=documents.values("ref_id"))
+
+    join, condition, _, param = match
+    sql = f"SELECT d.ref_id FROM search_documents d {join} WHERE d.kind = %s AND {condition}"
+    return queryset.filter(pk__in=RawSQL(sql, [kind, param]))
+
+
+def search(kind: str, query: str, queryset: QuerySet | None = None, limit: int = 20) -> list[SearchHit]:
+    """
+    Самые релевантные задачи или объекты по запросу, от более релевантных к менее.
+    `queryset` ограничивает выдачу (например, видимыми пользователю задачами).
+    """
+    terms = _terms(query)
+    match = _match(terms) if terms else None
+    if match is None:
+        candidates = search_filter(queryset if queryset is not None else _MODELS[kind].objects.all(), kind, query)
+        return [SearchHit(pk, 0.0) for pk in candidates.order_by("-pk").values_list("pk", flat=True)[:limit]]
+
+    join, condition, rank, param = match
+    sql = f"SELECT d.ref_id, {rank} AS rank FROM search_documents d {join} WHERE d.kind = %s AND {condition}"
+    sql_params = [param] * rank.count("%s") + [kind, param]
+    if queryset is not None:
+        subquery, subquery_params = queryset.order_by().values("pk").query.sql_with_params()
+        sql += f" AND d.ref_id IN ({subquery})"
+        sql_params.extend(subquery_params)
+    sql += " ORDER BY rank DESC, d.ref_id DESC LIMIT %s"
+    sql_params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, sql_params)
+        return [SearchHit(ref_id, float(rank)) for ref_id, rank in cursor.fetchall()]
+
+
+def ranked(queryset: QuerySet, kind: str, query: str, limit: int = 20) -> list:
+    """Экземпляры моделей из `queryset`, найденные по запросу, в порядке релевантности."""
+    hits = search(kind, query, queryset=queryset, limit=limit)
+    instances = queryset.in_bulk([hit.id for hit in hits])
+    return [instances[hit.id] for hit in hits if hit.id in instances]
+
+
+def _saved(kind: str, instance, update_fields) -> None:
+    # Служебные сохранения отдельных полей не меняют текст документа
+    if update_fields is not None and not set(update_fields) & set(_INDEXED_FIELDS[kind]):
+        return
+    index(kind, instance)
+
+
+def _task_saved(sender, instance, update_fields=None, **kwargs):
+    _saved(SearchDocument.Kind.TASK, instance, update_fields)
+
+
+def _object_saved(sender, instance, update_fields=None, **kwargs):
+    _saved(SearchDocument.Kind.OBJECT, instance, update_fields)
+
+
+def _task_deleted(sender, instance, **kwargs):
+    remove(SearchDocument.Kind.TASK, instance.pk)
+
+
+def _object_deleted(sender, instance, **kwargs):
+    remove(SearchDocument.Kind.OBJECT, instance.pk)
+
+
+def connect_search_signals() -> None:
+    """
+    Подключает обновление документов поиска к сигналам моделей. Вызывается из `AppConfig.ready`.
+    """
+    post_save.connect(_task_saved, sender=Task, dispatch_uid="search_task_saved")
+    post_delete.connect(_task_deleted, sender=Task, dispatch_uid="search_task_deleted")
+    post_save.connect(_object_saved, sender=Object, dispatch_uid="search_object_saved")
+    post_delete.connect(_object_deleted, sender=Object, dispatch_uid="search_object_deleted")
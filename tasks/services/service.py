@@ -2,8 +2,9 @@ import datetime
 import json
 
 from django.core.paginator import Paginator
+from django.utils import timezone
 
-from tasks.services.cache_version import CacheVersion
+from tasks.services.cache_version import CacheVersion, ALL_VERSION_KEYS
 
 
 def remove_unused_attached_files(file_uploader_data: str, qs_object, *, delete_orphan_files: bool = False):
@@ -73,6 +74,15 @@ def pagination_homepage():
     pass
 
 
+def day_range(day: datetime.date) -> tuple[datetime.datetime, datetime.datetime]:
+    """
+    Границы суток `day` в текущем часовом поясе: начало суток и начало следующих.
+    Сравнение самого поля с границами использует индекс, а `__date` приводит каждое значение.
+    """
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
 def default_date():
     # Получаем текущее время
     now = datetime.datetime.now()
@@ -114,21 +124,15 @@ def transliterate(text: str) -> str:
 
 
 
+from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 
+from tasks.services import cache_stats
+
 
 def update_all_caches():
-    cache_keys = [
-        "tasks_page_version_cache", "objects_page_cache_version",
-        "objects_page_cache_version", "filter_components_cache_version_tasks",
-        "filter_components_cache_version_objects", "filter_components_cache_version_tasks",
-        "filter_components_cache_version_objects",
-        "filter_components_cache_version_objects",
-        "tasks_page_version_cache", "objects_page_cache_version",
-    ]
-
-    for key in cache_keys:
+    for key in ALL_VERSION_KEYS:
         CacheVersion(key).increment_cache_version()
 
 
@@ -138,3 +142,11 @@ def update_cache_view(request):
         update_all_caches()
         return JsonResponse({"status": "success"})
     return JsonResponse({"status": "error"}, status=400)
+
+
+@staff_member_required
+def cache_stats_view(request):
+    """Статистика кеша по семействам ключей. POST сбрасывает счётчики."""
+    if request.method == "POST":
+        cache_stats.reset_stats()
+    return JsonResponse({"families": cache_stats.get_stats()})
@@ -1,14 +1,13 @@
-from django.core.cache import cache
-
 from tasks.models import Task
+from .cache_aside import cache_aside
 
 
 def get_stat():
-    cache_key = f"stat"
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return cached_data
+    # Статистика пересчитывается по всем задачам - защищаем пересчёт от одновременного запуска
+    return cache_aside("stat", _get_stat, timeout=600)
+
 
+def _get_stat():
     # Выбираем все задачи, которые не удалены
     tasks = Task.objects.filter(deleted=False)
 
@@ -54,6 +53,4 @@ def get_stat():
         'department_stats': department_stats_list,
     }
 
-    cache.set(cache_key, result, timeout=600)
-
     return result
\ No newline at end of file
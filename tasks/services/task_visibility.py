@@ -0,0 +1,274 @@
+"""
+Материализованная видимость задач (`TaskVisibility`).
+
+Таблица хранит пары (пользователь, задача) по правилам видимости для обычных пользователей,
+благодаря чему `permission_filter` сводится к одному соединению по индексу вместо OR по
+исполнителям, отделам и создателям с последующим DISTINCT.
+
+Задачу видят:
+    - её создатель;
+    - пользователи инженеров-исполнителей;
+    - пользователи инженеров отделов, назначенных на задачу;
+    - руководители отделов инженеров-исполнителей;
+    - руководители отдела создателя задачи.
+
+Таблица обновляется инкрементально сигналами (см. `connect_task_visibility_signals`).
+Изменения в обход сигналов (`QuerySet.update`, загрузка фикстур и т.п.) исправляет команда
+`rebuild_task_visibility`, она же сверяет таблицу с эталонной логикой (`reference_queryset`).
+"""
+
+from collections import defaultdict
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+
+from tasks.models import Task, TaskVisibility, Engineer, Department
+from user.models import User
+
+REBUILD_CHUNK_SIZE = 2000
+
+
+def reference_queryset(user: User) -> QuerySet[Task]:
+    """
+    Эталонная логика видимости задач - правила `TaskQuerySet.visible_to` без таблицы.
+    Используется для сверки таблицы.
+    """
+    return Task.objects.visible_to(user)
+
+
+def _visibility_sources() -> list[tuple[QuerySet, dict, str, str]]:
+    """
+    Запросы, дающие пары (задача, пользователь) по каждому правилу видимости.
+    Каждый элемент - (queryset, условия, путь к id задачи, путь к id пользователя).
+
+    Условия применяются одним вызовом `filter` вместе с отбором по пользователям: отдельный
+    вызов по многозначной связи добавил бы ещё одно соединение вместо уточнения текущего.
+    """
+    task_engineers = Task.engineers.through.objects.all()
+    task_departments = Task.departments.through.objects.all()
+    return [
+        # Создатель
+        (Task.objects.all(), {}, "id", "creator_id"),
+        # Исполнители
+        (task_engineers, {}, "task_id", "engineer__user"),
+        # Инженеры назначенных отделов
+        (task_departments, {}, "task_id", "department__engineers__user"),
+        # Руководители отделов исполнителей
+        (
+            task_engineers,
+            {"engineer__department__engineers__head_of_department": True},
+            "task_id",
+            "engineer__department__engineers__user",
+        ),
+        # Руководители отдела создателя
+        (
+            Task.objects.all(),
+            {"creator__engineer__department__engineers__head_of_department": True},
+            "id",
+            "creator__engineer__department__engineers__user",
+        ),
+    ]
+
+
+def _desired_pairs(task_ids: list[int] | None = None, user_ids: list[int] | None = None) -> set[tuple]:
+    pairs = set()
+    for queryset, conditions, task_field, user_field in _visibility_sources():
+        conditions = {**conditions, f"{user_field}__isnull": False}
+        if task_ids is not None:
+            conditions[f"{task_field}__in"] = task_ids
+        if user_ids is not None:
+            conditions[f"{user_field}__in"] = user_ids
+        pairs.update(queryset.filter(**conditions).values_list(task_field, user_field))
+    return pairs
+
+
+def _sync(task_ids: Iterable[int] | None = None, user_ids: Iterable[int] | None = None) -> tuple[int, int]:
+    """
+    Приводит строки таблицы для указанных задач и/или пользователей к вычисленному состоянию.
+    Пишет только разницу. Возвращает количество добавленных и удалённых строк.
+    """
+    task_ids = list(task_ids) if task_ids is not None else None
+    user_ids = list(user_ids) if user_ids is not None else None
+
+    existing_qs = TaskVisibility.objects.all()
+    if task_ids is not None:
+        existing_qs = existing_qs.filter(task_id__in=task_ids)
+    if user_ids is not None:
+        existing_qs = existing_qs.filter(user_id__in=user_ids)
+
+    with transaction.atomic():
+        desired = _desired_pairs(task_ids, user_ids)
+        existing = set(existing_qs.values_list("task_id", "user_id"))
+
+        stale: dict[int, list[int]] = defaultdict(list)
+        for task_id, user_id in existing - desired:
+            stale[task_id].append(user_id)
+        if stale:
+            condition = Q()
+            for task_id, stale_user_ids in stale.items():
+                condition |= Q(task_id=task_id, user_id__in=stale_user_ids)
+            TaskVisibility.objects.filter(condition).delete()
+
+        missing = desired - existing
+        TaskVisibility.objects.bulk_create(
+            [TaskVisibility(task_id=task_id, user_id=user_id) for task_id, user_id in missing],
+            ignore_conflicts=True,
+        )
+
+    return len(missing), sum(map(len, stale.values()))
+
+
+def rebuild_for_tasks(task_ids: Iterable[int]) -> tuple[int, int]:
+    """Пересчитывает видимость указанных задач для всех пользователей."""
+    return _sync(task_ids=task_ids)
+
+
+def rebuild_for_users(user_ids: Iterable[int]) -> tuple[int, int]:
+    """Пересчитывает видимость всех задач для указанных пользователей."""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return 0, 0
+    return _sync(user_ids=user_ids)
+
+
+def rebuild_all(chunk_size: int = REBUILD_CHUNK_SIZE) -> tuple[int, int]:
+    """
+    Пересчитывает всю таблицу частями по `chunk_size` задач.
+    """
+    added = removed = 0
+    task_ids = list(Task.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(task_ids), chunk_size):
+        chunk_added, chunk_removed = _sync(task_ids=task_ids[start:start + chunk_size])
+        added += chunk_added
+        removed += chunk_removed
+    return added, removed
+
+
+def verify(users: Iterable[User] | None = None) -> dict[str, dict]:
+    """
+    Сверяет таблицу с эталонной логикой `reference_queryset` (без удалённых задач).
+    Возвращает расхождения по пользователям: {username: {"missing": [...], "extra": [...]}}.
+    Суперпользователи видят все задачи без таблицы (см. `permission_filter`) и не сверяются.
+    """
+    if users is None:
+        users = User.objects.filter(is_superuser=False)
+
+    differences = {}
+    for user in users:
+        if user.is_superuser:
+            continue
+        expected = set(reference_queryset(user).values_list("id", flat=True))
+        actual = set(
+            TaskVisibility.objects.filter(user=user, task__deleted=False).values_list("task_id", flat=True)
+        )
+        if expected != actual:
+            differences[user.username] = {
+                "missing": sorted(expected - actual),
+                "extra": sorted(actual - expected),
+            }
+    return differences
+
+
+def heads_of_departments(department_ids: Iterable[int | None]) -> list[int]:
+    """Пользователи руководителей указанных отделов."""
+    department_ids = {dep_id for dep_id in department_ids if dep_id is not None}
+    if not department_ids:
+        return []
+    return list(
+        Engineer.objects.filter(
+            department__in=department_ids, head_of_department=True, user__isnull=False
+        ).values_list("user_id", flat=True)
+    )
+
+
+# --- Сигналы ---
+
+def _task_saved(sender, instance: Task, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return  # loaddata: связи ещё не загружены, таблицу пересчитывает rebuild_task_visibility
+    if update_fields is not None and set(update_fields) == {"status_changed_by"}:
+        return  # Служебное повторное сохранение из Task.save
+    # Из полей задачи на видимость влияет только создатель (входит в LISTING_FIELDS)
+    if created or getattr(instance, "listing_changed", True):
+        rebuild_for_tasks([instance.pk])
+
+
+def _task_relations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Исполнители и отделы задачи. При reverse instance - Engineer/Department, pk_set - id задач
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            rebuild_for_tasks([instance.pk])
+        return
+
+    if action == "pre_clear":
+        # После очистки связей pk_set пуст, поэтому запоминаем задачи заранее
+        instance._visibility_task_ids = list(instance.tasks.values_list("id", flat=True))
+    elif action == "post_clear":
+        rebuild_for_tasks(getattr(instance, "_visibility_task_ids", []))
+    elif action in ("post_add", "post_remove"):
+        rebuild_for_tasks(pk_set)
+
+
+def _engineer_pre_save(sender, instance: Engineer, raw=False, **kwargs):
+    if raw:
+        return
+    # Запоминаем прежние пользователя, отдел и роль, чтобы пересчитать и старое окружение
+    instance._visibility_previous = (
+        Engineer.objects.filter(pk=instance.pk).values_list("user_id", "department_id", "head_of_department").first()
+        if instance.pk else None
+    )
+
+
+def _engineer_saved(sender, instance: Engineer, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = (instance.user_id, instance.department_id, instance.head_of_department)
+    previous = getattr(instance, "_visibility_previous", None)
+    if previous == current:
+        return
+
+    user_ids = {instance.user_id}
+    department_ids = {instance.department_id}
+    if previous:
+        user_ids.add(previous[0])
+        department_ids.add(previous[1])
+    # Руководители видят задачи подчинённых и созданные ими, поэтому смена отдела касается и их
+    user_ids.update(heads_of_departments(department_ids))
+    rebuild_for_users(user_ids)
+
+
+def _engineer_deleted(sender, instance: Engineer, **kwargs):
+    rebuild_for_users({instance.user_id, *heads_of_departments([instance.department_id])})
+
+
+def _department_pre_delete(sender, instance: Department, **kwargs):
+    # Инженеры отдела останутся без отдела (SET_NULL без сигналов)
+    instance._visibility_user_ids = list(
+        instance.engineers.filter(user__isnull=False).values_list("user_id", flat=True)
+    )
+
+
+def _department_deleted(sender, instance: Department, **kwargs):
+    rebuild_for_users(getattr(instance, "_visibility_user_ids", []))
+
+
+def connect_task_visibility_signals() -> None:
+    """
+    Подключает обновление `TaskVisibility` к сигналам моделей. Вызывается из `AppConfig.ready`.
+    """
+    post_save.connect(_task_saved, sender=Task, dispatch_uid="task_visibility_task_saved")
+    m2m_changed.connect(
+        _task_relations_changed, sender=Task.engineers.through, dispatch_uid="task_visibility_engineers"
+    )
+    m2m_changed.connect(
+        _task_relations_changed, sender=Task.departments.through, dispatch_uid="task_visibility_departments"
+    )
+    pre_save.connect(_engineer_pre_save, sender=Engineer, dispatch_uid="task_visibility_engineer_pre_save")
+    post_save.connect(_engineer_saved, sender=Engineer, dispatch_uid="task_visibility_engineer_saved")
+    post_delete.connect(_engineer_deleted, sender=Engineer, dispatch_uid="task_visibility_engineer_deleted")
+    pre_delete.connect(
+        _department_pre_delete, sender=Department, dispatch_uid="task_visibility_department_pre_delete"
+    )
+    post_delete.connect(_department_deleted, sender=Department, dispatch_uid="task_visibility_department_deleted")
@@ -321,7 +321,7 @@ def comment_task(request, task_id):
 
 @login_required
 def export_to_excel(request):
-    tasks = get_tasks(request, "filter_params", page_number=1, per_page=100)
+    tasks = get_tasks(request, page_number=1, per_page=100, use_cache=False)
 
     export = TasksExcelExport("Tasks")
 
@@ -337,10 +337,8 @@ def export_to_excel(request):
 
 @login_required
 def print_tasks(request):
-    filter_params = request.GET.urlencode()  # Сохраняем все фильтры из запроса
-
-    # Указываем большое значение per_page, чтобы получить все задачи
-    tasks = get_tasks(request, filter_params, page_number=1, per_page=100000)
+    # Фильтры берутся из request.GET. Указываем большое значение per_page, чтобы получить все задачи
+    tasks = get_tasks(request, page_number=1, per_page=100000, use_cache=False)
 
     # Получаем список всех задач
     all_tasks = tasks["pagination_data"]["paginator"].object_list
@@ -371,10 +369,8 @@ def print_tasks(request):
 
 @login_required
 def update_date_task(request):
-    filter_params = ""  # Если нужно, можно передавать фильтры
-
     # Получаем задачи из запроса
-    tasks = get_tasks(request, filter_params, page_number=1, per_page=100000)
+    tasks = get_tasks(request, page_number=1, per_page=100000, use_cache=False)
     all_tasks = tasks["pagination_data"]["paginator"].object_list
 
     today = now().date()
@@ -2,62 +2,44 @@ import datetime
 from dataclasses import dataclass
 from zoneinfo import ZoneInfo
 
-from django.core.cache import cache
 from django.db.models import Prefetch
-from django.db.models import Q, Count, Case, When, QuerySet
-
-from tasks.filters import TaskFilter, TaskFilterByDone
+from django.utils import timezone
+from django.db.models import Q, Count, QuerySet
+
+from tasks.filters import (
+    TaskFilter,
+    TaskFilterByDone,
+    tasks_ordering,
+    TASKS_FILTER_PARAMS,
+    TASKS_FILTER_DEFAULTS,
+    TASKS_FILTER_CACHE_TAGS,
+    filter_signature,
+    filter_cache_tags,
+)
 from tasks.models import Task, Engineer, Comment
-from tasks.services.cache_version import CacheVersion
-from tasks.services.service import paginate_queryset
+from tasks.services.cache_dto import task_card, compact_pagination
+from tasks.services.cache_aside import cache_aside
+from tasks.services.cache_tags import user_tasks_tags, task_tag, object_tag
+from tasks.services.cache_version import TASKS_PAGE_VERSION, get_version
+from tasks.services.keyset import paginate_keyset, cursor_digest, add_total
+from tasks.services.listing_counts import ListingCount, listing_total
+from tasks.services.object_hierarchy import subtree_tasks, descendant_ids
+from tasks.services.service import paginate_queryset, day_range
+from tasks.services.visibility import tasks_fingerprint
 from user.models import User
 
 
 def permission_filter(user: User) -> QuerySet[Task]:
-    engineer: Engineer | None = user.get_engineer_or_none()
+    """
+    Задачи, видимые пользователю.
 
-    # Если пользователь администратор, он видит все задачи
+    Администратор видит все задачи. Для остальных видимость материализована в `TaskVisibility`
+    (правила описаны в `tasks.services.task_visibility`), поэтому запрос - одно соединение
+    по индексу (user_id, task_id) без DISTINCT.
+    """
     if user.is_superuser:
-        queryset = Task.objects.filter(deleted=False)
-        queryset |= Task.objects.filter(creator=user, deleted=False)
-        return queryset.distinct()
-
-    # Если пользователь head_of_department
-    elif engineer and engineer.head_of_department:
-        # Получаем всех пользователей, связанных с инженерами департамента
-        department_users = User.objects.filter(engineer__department=engineer.department)
-        # Пользователь head_of_department видит задачи, связанные с его департаментом, подчиненными и задачи,
-        # которые подчиненные создали для других департаментов
-        queryset = Task.objects.filter(
-            (Q(departments=engineer.department)  # Задачи департамента
-             | Q(engineers__department=engineer.department)  # Задачи всех в департаменте
-             | Q(creator__in=department_users)),  # Задачи, созданные подчиненными
-            deleted=False
-        )
-        queryset |= Task.objects.filter(creator=user, deleted=False)
-        return queryset.distinct()
-
-    # Если пользователь не администратор и не head_of_department
-    elif engineer:
-        if engineer.department:
-            # Пользователь видит только свои задачи и задачи департамента
-            queryset = Task.objects.filter(
-                (Q(engineers=engineer) | Q(departments=engineer.department)),
-                deleted=False
-            )
-            queryset |= Task.objects.filter(creator=user, deleted=False)
-            return queryset.distinct()
-        else:
-            # Если у пользователя нет департамента, он видит только свои задачи
-            queryset = Task.objects.filter(engineers=engineer, deleted=False)
-            queryset |= Task.objects.filter(creator=user, deleted=False)
-            return queryset.distinct()
-
-    # Если нет инженера
-    else:
-        queryset = Task.objects.none()
-        queryset |= Task.objects.filter(creator=user, deleted=False)
-        return queryset.distinct()
+        return Task.objects.visible_to(user)
+    return Task.objects.filter(visibility__user=user, deleted=False)
 
 
 @dataclass
@@ -81,44 +63,46 @@ class FilterParams:
 class FilteredTasksResult:
     tasks: QuerySet[Task]
     # tasks_id_list: list
-    tasks_counters: TasksCounter
+    tasks_counters: TasksCounter | None
     filter_params: FilterParams
     tasks_filter_by_done: TaskFilterByDone
 
 
 def get_tasks_count(queryset: QuerySet[Task], engineer: Engineer, available_queryset: QuerySet[Task]) -> TasksCounter:
-    # Счётчик всех задач
-    all_tasks_status = queryset.aggregate(
-        done_tasks_count=Count(Case(When(is_done=True, then=1))),
-        not_done_count=Count(Case(When(is_done=False, then=1))),
-    )
-
-    # Счётчик задач, созданных текущим пользователем
-    my_tasks_status = queryset.filter(engineers=engineer).aggregate(
-        my_done_tasks_count=Count(Case(When(is_done=True, then=1))),
-        my_not_done_count=Count(Case(When(is_done=False, then=1))),
+    """
+    Все счётчики шапки одним запросом: условная агрегация по доступным задачам, а отфильтрованные
+    задачи и задачи инженера отбираются подзапросами по id внутри условий.
+    """
+    filtered = Q(pk__in=queryset.values("pk"))
+    # Задачи, назначенные текущему пользователю
+    mine = Q(pk__in=queryset.filter(engineers=engineer).values("pk"))
+    today_start, today_end = day_range(timezone.localdate())
+
+    counters = available_queryset.order_by().aggregate(
+        done_count=Count("pk", filter=filtered & Q(is_done=True)),
+        not_done_count=Count("pk", filter=filtered & Q(is_done=False)),
+        # Задачи со сроком выполнения сегодня
+        tasks_due_today_count=Count(
+            "pk",
+            filter=filtered & Q(is_done=False, completion_time__gte=today_start, completion_time__lt=today_end),
+        ),
+        my_tasks_count=Count("pk", filter=mine),
+        # Доступные задачи (включает задачи департамента, подчинённых и прочие) без учёта фильтров
+        available_tasks_count=Count("pk"),
     )
 
-    # Подсчет задач со сроком выполнения сегодня для всех задач и только моих
-    tasks_due_today_count = queryset.filter(
-        completion_time__date=datetime.datetime.now().date(), is_done=False
-    ).count()
+    return TasksCounter(**counters)
 
-    # Счётчик доступных задач (включает задачи департамента, подчинённых и прочие)
-    available_tasks_count = available_queryset.count()
 
-    return TasksCounter(
-        done_count=all_tasks_status["done_tasks_count"],
-        not_done_count=all_tasks_status["not_done_count"],
-        tasks_due_today_count=tasks_due_today_count,
-        my_tasks_count=my_tasks_status["my_done_tasks_count"] + my_tasks_status["my_not_done_count"],
-        available_tasks_count=available_tasks_count
-    )
+def with_subtree(request) -> bool:
+    """Показывать на странице объекта задачи и его дочерних объектов."""
+    return request.GET.get("subtree") == "true"
 
 
-def get_filtered_tasks(request, obj=None):
+def get_filtered_tasks(request, obj=None, counters=True):
     """
-    Возвращает часть задач, которые отфильтрованы или включены/выключены в шаблоне
+    Возвращает часть задач, которые отфильтрованы или включены/выключены в шаблоне.
+    Без `counters` счётчики шапки не считаются (`tasks_counters` - None).
     """
     tasks_qs = permission_filter(user=request.user)
 
@@ -129,8 +113,8 @@ def get_filtered_tasks(request, obj=None):
         "engineers",
         "objects_set",
         "departments",
-        "creator",
-        Prefetch("comments", queryset=Comment.objects.order_by('created_at'))
+        "creator__engineer",
+        Prefetch("comments", queryset=Comment.objects.select_related("author__engineer").order_by('created_at'))
     )
 
     # Сохраняем исходный QuerySet для подсчета доступных задач
@@ -139,8 +123,11 @@ def get_filtered_tasks(request, obj=None):
     tasks_filter = TaskFilter(request.GET, queryset=tasks_qs, request=request)
     tasks_qs = tasks_filter.qs
 
-    # Если передан объект, фильтруем задачи по нему
-    if obj:
+    # Если передан объект, фильтруем задачи по нему (с `?subtree=true` - по всему его поддереву)
+    if obj and with_subtree(request):
+        tasks_qs = subtree_tasks(tasks_qs, obj.id)
+        available_queryset = subtree_tasks(tasks_qs_all, obj.id)
+    elif obj:
         tasks_qs = tasks_qs.filter(objects_set=obj)
         available_queryset = tasks_qs_all.filter(objects_set=obj)
     else:
@@ -150,7 +137,7 @@ def get_filtered_tasks(request, obj=None):
         queryset=tasks_qs,
         available_queryset=available_queryset,
         engineer=request.user.get_engineer_or_none()
-    )
+    ) if counters else None
 
     tasks_filter_by_done = TaskFilterByDone(request.GET, queryset=tasks_qs, request=request)
     tasks_qs = tasks_filter_by_done.qs
@@ -169,31 +156,14 @@ def get_filtered_tasks(request, obj=None):
     )
 
 
-def get_tasks(request, filter_params, page_number, per_page, obj=None):
+def set_time_left(tasks) -> None:
     """
-    Возвращает список объектов. Если фильтры не применяются - использует кэш,
-    обновляя его раз в 5 минут. Если есть фильтры, кэш не используется.
+    Проставляет задачам количество часов до дедлайна (по московскому времени)
     """
-    obj_key = obj.id if obj else 'none'
-    # Создаём уникальный ключ для кэша, если фильтров нет
-    cache_key = f'tasks_page:{page_number}:{request.user}:{obj_key}' if not filter_params else None
-    cache_timeout = 300  # 5 минут (300 секунд)
-
-    version_cache_key = "tasks_page_version_cache"
-    cache_version = CacheVersion(version_cache_key)
-    cache_version_value = cache_version.get_cache_version()
-
-    cached_data = cache.get(cache_key, version=cache_version_value) if not filter_params else None
-
-    # Фильтрация задач
-    filtered_task = get_filtered_tasks(request, obj=obj)
-    pagination_data = paginate_queryset(filtered_task.tasks, page_number, per_page)
-
-    # Московский часовой пояс
     moscow_tz = ZoneInfo("Europe/Moscow")
     now_moscow = datetime.datetime.now(moscow_tz)
 
-    for task in pagination_data["page_obj"]:
+    for task in tasks:
         if task.completion_time:
             completion_time_moscow = task.completion_time.astimezone(moscow_tz)
             time_left = max(int((completion_time_moscow - now_moscow).total_seconds() // 3600), 0)
@@ -202,17 +172,105 @@ def get_tasks(request, filter_params, page_number, per_page, obj=None):
         else:
             task.time_left = 0  # Если дедлайн не задан
 
-    result = {
-        "tasks": pagination_data["page_obj"],
-        "pagination_data": pagination_data,
-        "task_count": filtered_task.tasks_counters,
-        "filter_params": filtered_task.filter_params,
-    }
 
-    # Кэшируем только если фильтров нет
-    if cache_key:
-        cache.set(cache_key, result, timeout=cache_timeout)
+def get_tasks(request, page_number, per_page, obj=None, versions=None, use_cache=True, cursor=None, with_total=False):
+    """
+    Возвращает страницу задач. Фильтры берутся из `request.GET`.
+    Страница кешируется на 5 минут под каноническим отпечатком фильтра (см. `filter_signature`).
+
+    Если передан `cursor` (пустая строка - первая страница), страница выбирается по ключу
+    сортировки (`tasks.services.keyset`) без OFFSET и COUNT, а `page_number` не используется.
+    С `with_total` к такой странице добавляется общее количество задач (см. `tasks_total`).
+
+    Из кеша возвращаются компактные карточки задач (`cache_dto.TaskCard`), а не модели.
+    Если нужны сами модели (экспорт, массовое обновление), следует передать `use_cache=False`.
+    """
+    if not use_cache:
+        return _build_tasks_page(request, page_number, per_page, obj=obj, compact=False, cursor=cursor)
+
+    page_key = page_number if cursor is None else f"k{cursor_digest(cursor)}"
+    cache_key = f'tasks_page:{page_key}:{per_page}:{_listing_key(request, obj)}'
+    cache_timeout = 300  # 5 минут (300 секунд)
+
+    def page_tags(result) -> set[str]:
+        # Страница зависит от показанных задач и от перечня задач, доступных пользователю.
+        tags = _listing_tags(request, obj)
+        tags.update(task_tag(task.id) for task in result["tasks"])
+        return tags
+
+    result = cache_aside(
+        cache_key,
+        lambda: _build_tasks_page(request, page_number, per_page, obj=obj, compact=True, cursor=cursor),
+        timeout=cache_timeout,
+        version=get_version(TASKS_PAGE_VERSION, versions),
+        tags=page_tags,
+    )
+
+    if cursor is not None and with_total:
+        total = tasks_total(request, obj=obj, versions=versions)
+        result = {**result, "pagination_data": add_total(result["pagination_data"], total)}
 
+    # Время до дедлайна считаем на момент запроса, а не на момент записи в кеш
+    set_time_left(result["tasks"])
     return result
 
 
+def tasks_total(request, obj=None, versions=None) -> ListingCount:
+    """
+    Количество задач в перечне с фильтрами из `request.GET`. Одна запись на все страницы перечня,
+    устаревает вместе с ними. Для большого перечня без фильтров - оценка (см. `listing_counts`).
+    """
+    return listing_total(
+        f"tasks_count:{_listing_key(request, obj)}",
+        lambda: get_filtered_tasks(request, obj=obj, counters=False).tasks,
+        tags=lambda _: _listing_tags(request, obj),
+        version=get_version(TASKS_PAGE_VERSION, versions),
+        allow_estimate=not filter_signature(request.GET, TASKS_FILTER_PARAMS, TASKS_FILTER_DEFAULTS),
+    )
+
+
+def _listing_key(request, obj=None) -> str:
+    obj_key = obj.id if obj else 'none'
+    # Пользователи с одинаковой видимостью задач получают одну и ту же запись
+    key = f'{tasks_fingerprint(request.user)}:{obj_key}'
+    signature = filter_signature(request.GET, TASKS_FILTER_PARAMS, TASKS_FILTER_DEFAULTS)
+    if signature:
+        key += f':f:{signature}'
+    return key
+
+
+def _listing_tags(request, obj=None) -> set[str]:
+    # Перечень зависит от задач, доступных пользователю, и от объекта, если задачи объекта
+    tags = user_tasks_tags(request.user)
+    if obj and with_subtree(request):
+        tags.update(object_tag(obj_id) for obj_id in descendant_ids(obj.id).values_list("descendant_id", flat=True))
+    elif obj:
+        tags.add(object_tag(obj.id))
+    # Отфильтрованный - ещё и от полей и связей, по которым фильтруют
+    tags.update(filter_cache_tags(request.GET, TASKS_FILTER_CACHE_TAGS))
+    return tags
+
+
+def _build_tasks_page(request, page_number, per_page, obj=None, compact=False, cursor=None):
+    # Фильтрация задач
+    filtered_task = get_filtered_tasks(request, obj=obj)
+    if cursor is None:
+        pagination_data = paginate_queryset(filtered_task.tasks, page_number, per_page)
+    else:
+        ordering = tasks_ordering(filtered_task.filter_params.sort_order)
+        pagination_data = paginate_keyset(filtered_task.tasks, ordering, cursor, per_page)
+
+    if compact:
+        # Для кеша - карточки задач вместо Page с моделями и полным QuerySet внутри
+        pagination_data = compact_pagination(
+            pagination_data, [task_card(task) for task in pagination_data["page_obj"]]
+        )
+    else:
+        set_time_left(pagination_data["page_obj"])
+
+    return {
+        "tasks": pagination_data["page_obj"],
+        "pagination_data": pagination_data,
+        "task_count": filtered_task.tasks_counters,
+        "filter_params": filtered_task.filter_params,
+    }
@@ -0,0 +1,71 @@
+"""
+Деревья виджетов выбора (теги, инженеры, группы, корневой уровень объектов) по адресам с версией.
+
+Страница не встраивает деревья в HTML, а передаёт виджету адрес вида
+`/ajax/trees/<вид>/<отпечаток>.json`, где отпечаток - хеш содержимого дерева для пользователя.
+Пока дерево не изменилось, адрес тот же, и браузер берёт дерево из своего кеша
+(`Cache-Control: immutable`) при переходах между страницами. После изменения страница
+получает новый адрес, а по старому отдаётся актуальное дерево без долгого кеширования.
+
+JSON хранится в кеше деревьев готовым (`TreePayload`) и отдаётся без сериализации.
+"""
+
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, HttpResponseNotModified, Http404
+from django.urls import reverse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from .tree_nodes import CachedAllTagsTree, CachedEngineersTree, CachedGroupsTree, CachedObjectsTreeLevel
+from .tree_nodes.base import CachedTree, TreePayload
+
+TAGS = "tags"
+ENGINEERS = "engineers"
+GROUPS = "groups"
+OBJECTS = "objects"  # корневой уровень, ветки подгружаются через `ajax-objects-tree`
+
+TREES: dict[str, type[CachedTree]] = {
+    TAGS: CachedAllTagsTree,
+    ENGINEERS: CachedEngineersTree,
+    GROUPS: CachedGroupsTree,
+    OBJECTS: CachedObjectsTreeLevel,
+}
+
+# Содержимое по адресу с отпечатком не меняется
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def tree_payload(user, kind: str) -> TreePayload:
+    return TREES[kind]({"user": user}).get_cached_payload()
+
+
+def tree_url(user, kind: str) -> str:
+    return reverse("tree-json", kwargs={"kind": kind, "etag": tree_payload(user, kind).etag})
+
+
+def payload_response(request, payload: TreePayload, data: bytes | None = None, immutable: bool = False):
+    """
+    Ответ с JSON дерева и ETag по отпечатку `payload`; `data` - тело, если оно не совпадает с деревом.
+    На `If-None-Match` с тем же отпечатком - 304 без тела.
+    """
+    etag = f'"{payload.etag}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(payload.data if data is None else data, content_type="application/json")
+    response["ETag"] = etag
+    # Деревья объектов и групп зависят от прав: только кеш браузера, не общие прокси
+    if immutable:
+        patch_cache_control(response, private=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+
+@login_required
+def tree_json_view(request, kind: str, etag: str):
+    """Дерево `kind` пользователя. Долго кешируется, только если `etag` совпадает с текущим отпечатком."""
+    if kind not in TREES:
+        raise Http404()
+    payload = tree_payload(request.user, kind)
+    return payload_response(request, payload, immutable=payload.etag == etag)
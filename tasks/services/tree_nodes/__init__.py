@@ -1,2 +1,19 @@
-from .cached_tree_nodes import CachedObjectsTree
-from .tree_nodes import TasksTagsTree, ObjectsTree, EngineersTree, ObjectsTagsTree, GroupsTree
+from .base import TreePayload
+from .cached_tree_nodes import (
+    CachedObjectsTree,
+    CachedObjectsTreeLevel,
+    CachedGroupsTree,
+    CachedObjectsTagsTree,
+    CachedTasksTagsTree,
+    CachedEngineersTree,
+    CachedAllTagsTree,
+)
+from .tree_nodes import (
+    TasksTagsTree,
+    ObjectsTree,
+    ObjectsTreeLevel,
+    EngineersTree,
+    ObjectsTagsTree,
+    GroupsTree,
+    selected_objects_nodes,
+)
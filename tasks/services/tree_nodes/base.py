@@ -1,13 +1,107 @@
+import hashlib
+import json
+import logging
+import time
 from abc import ABC, abstractmethod
-from typing import TypedDict, NotRequired
+from typing import TypedDict, NotRequired, Iterable, Hashable, NamedTuple
 
 from django.core.cache import cache
 
+try:
+    import orjson
+except ImportError:  # без orjson - стандартный json, результат тот же
+    orjson = None
+
+from tasks.services import cache_stats
+from tasks.services.cache_version import CacheVersion
+
+logger = logging.getLogger(__name__)
+
 
 class Node(TypedDict):
     id: int | str
     label: str
-    children: NotRequired[list["Node"]]
+    # None - ветка есть, но не загружена (подгружается виджетом при раскрытии)
+    children: NotRequired[list["Node"] | None]
+
+
+def build_forest(items: Iterable[tuple[Hashable, Hashable | None, Node]]) -> list[Node]:
+    """
+    Собирает лес из плоского перечня (id, id родителя, узел) за O(n), без рекурсии.
+
+    - Порядок корней и дочерних узлов - порядок перечня.
+    - Узел, родителя которого нет в перечне (например, родитель недоступен пользователю),
+      становится корнем, чтобы вместе с поддеревом не пропасть из дерева.
+    - Узлы, замкнутые в цикл по родителям, не достижимы из корней: первый из них в порядке
+      перечня становится корнем, ссылка на него из цикла отбрасывается.
+
+    Дочерние узлы записываются в `children` только у узлов, у которых они есть.
+    """
+    nodes: dict[Hashable, Node] = {}
+    parents: dict[Hashable, Hashable | None] = {}
+    for node_id, parent_id, node in items:
+        nodes[node_id] = node
+        parents[node_id] = parent_id
+
+    roots = []
+    children: dict[Hashable, list] = {}
+    for node_id, parent_id in parents.items():
+        if parent_id is None or parent_id not in nodes:
+            roots.append(node_id)
+        else:
+            children.setdefault(parent_id, []).append(node_id)
+
+    placed = set(roots)
+
+    def attach(stack: list, in_cycle: bool) -> None:
+        while stack:
+            node_id = stack.pop()
+            child_ids = children.get(node_id)
+            if in_cycle and child_ids:
+                # Уже размещённый узел (вход в цикл) второй раз не добавляется
+                child_ids = [child_id for child_id in child_ids if child_id not in placed]
+            if child_ids:
+                placed.update(child_ids)
+                nodes[node_id]["children"] = [nodes[child_id] for child_id in child_ids]
+                stack.extend(child_ids)
+
+    # Цепочка родителей узла, достижимого из корня, заканчивается корнем, поэтому
+    # при обходе от корней циклов нет и проверять повторы не нужно
+    attach(list(roots), in_cycle=False)
+
+    if len(placed) < len(nodes):
+        for node_id in nodes:
+            if node_id not in placed:
+                logger.warning("Цикл в иерархии: узел %s (родитель %s) вынесен в корень", node_id, parents[node_id])
+                roots.append(node_id)
+                placed.add(node_id)
+                attach([node_id], in_cycle=True)
+
+    return [nodes[root_id] for root_id in roots]
+
+
+def dumps_nodes(nodes: list[Node]) -> bytes:
+    """Компактный JSON (UTF-8, без пробелов) для отдачи в ответе как есть."""
+    if orjson is not None:
+        return orjson.dumps(nodes)
+    return json.dumps(nodes, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads_nodes(data: bytes) -> list[Node]:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class TreePayload(NamedTuple):
+    """Дерево, готовое к отправке: JSON и отпечаток содержимого (для ETag и адреса с версией)."""
+    data: bytes
+    etag: str
+
+    @classmethod
+    def from_nodes(cls, nodes: list[Node]) -> "TreePayload":
+        data = dumps_nodes(nodes)
+        return cls(data, hashlib.blake2b(data, digest_size=8).hexdigest())
 
 
 class Tree(ABC):
@@ -21,8 +115,16 @@ class Tree(ABC):
 
 
 class CachedTree(Tree, ABC):
+    """
+    Дерево, закешированное по ключу `<класс>:<unique_cache_part>`.
+    У каждого класса своя глобальная версия, её увеличивают сигналы моделей,
+    от которых зависит дерево (см. `cached_tree_nodes.TREE_DEPENDENCIES`).
 
-    def __init__(self, context: dict, timeout: int = 60) -> None:
+    В кеше хранится готовый JSON (`TreePayload`): ответ с деревом отдаёт его без повторной
+    сериализации, а отпечаток содержимого используется в адресе дерева и в ETag.
+    """
+
+    def __init__(self, context: dict, timeout: int = 600) -> None:
         super().__init__(context)
         self._timeout = timeout
 
@@ -39,34 +141,44 @@ class CachedTree(Tree, ABC):
     def cache_key(self) -> str:
         return self.base_cache_key + ":" + self.unique_cache_part
 
-    def get_cache(self) -> list[Node] | None:
-        print("Getting nodes from cache", self.cache_key)
+    def get_cache(self) -> TreePayload | None:
         return cache.get(self.cache_key, default=None, version=self.get_global_version())
 
-    def set_cache(self, nodes: list[Node], timeout: int | None = None) -> None:
-        print("Setting nodes to cache", self.cache_key)
-        cache.set(self.cache_key, nodes, timeout=timeout, version=self.get_global_version())
+    def set_cache(self, payload: TreePayload, timeout: int | None = None) -> None:
+        cache.set(self.cache_key, payload, timeout=timeout, version=self.get_global_version())
 
     def clear_cache(self) -> None:
-        cache.delete(self.cache_key)
+        cache.delete(self.cache_key, version=self.get_global_version())
+        cache_stats.record(self.cache_key, cache_stats.DELETES)
 
-    def get_cached_nodes(self) -> list[Node]:
-        data = self.get_cache()
+    def get_cached_payload(self) -> TreePayload:
+        payload = self.get_cache()
 
-        if data is None:
-            data = self.get_nodes()
-            self.set_cache(data, timeout=self._timeout)  # 10min
+        if payload is not None:
+            cache_stats.record(self.cache_key, cache_stats.HITS)
+            logger.debug("%s: cache hit, %d bytes", self.cache_key, len(payload.data))
+            return payload
 
-        print("Getting cached nodes", data)
-        return data
+        start = time.perf_counter()
+        payload = TreePayload.from_nodes(self.get_nodes())
+        self.set_cache(payload, timeout=self._timeout)
+        seconds = time.perf_counter() - start
+
+        cache_stats.record(self.cache_key, cache_stats.MISS_ABSENT)
+        cache_stats.record_compute(self.cache_key, seconds, payload)
+        logger.debug("%s: cache miss, built %d bytes in %.3f s", self.cache_key, len(payload.data), seconds)
+        return payload
+
+    def get_cached_nodes(self) -> list[Node]:
+        return loads_nodes(self.get_cached_payload().data)
+
+    @property
+    def global_version_key(self) -> str:
+        return self.base_cache_key + ":version"
 
     def get_global_version(self) -> int:
-        print("Getting global version")
-        return cache.get(self.base_cache_key + ":version", 1)
+        # Версия читается из Redis не чаще одного раза за HTTP запрос
+        return CacheVersion(self.global_version_key).get_cache_version()
 
     def increment_global_version(self) -> None:
-        print("Incrementing global version")
-        try:
-            cache.incr(self.base_cache_key + ":version")
-        except ValueError:
-            cache.set(self.base_cache_key + ":version", 2)
+        CacheVersion(self.global_version_key).increment_cache_version()
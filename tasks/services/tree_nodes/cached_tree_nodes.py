@@ -1,15 +1,151 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from tasks.models import Object, ObjectGroup, UserObjectGroup, Tag, Task, Engineer, Department
+from tasks.services.visibility import objects_tree_fingerprint, tasks_tags_tree_fingerprint
 from .base import CachedTree
-from .tree_nodes import ObjectsTree
+from .tree_nodes import (
+    ObjectsTree,
+    ObjectsTreeLevel,
+    EngineersTree,
+    AllTagsTree,
+    GroupsTree,
+    TasksTagsTree,
+    ObjectsTagsTree,
+)
+
+
+class UserCachedTree(CachedTree):
+    """
+    Дерево, зависящее от прав пользователя: одна запись кеша на класс доступа (см. `visibility`).
+    """
+
+    @staticmethod
+    def visibility_fingerprint(user) -> str:
+        return objects_tree_fingerprint(user)
 
+    @property
+    def unique_cache_part(self) -> str:
+        user = self._context.get("user")
+        if user is None:
+            return "none"
+        return self.visibility_fingerprint(user)
 
-class CachedObjectsTree(CachedTree, ObjectsTree):
+
+class SharedCachedTree(CachedTree):
+    """
+    Дерево, не зависящее от пользователя: одна запись кеша на всех.
+    """
 
     @property
     def unique_cache_part(self) -> str:
-        return f"user:{self._context.get('user', 'none')}"
+        return "all"
+
+
+class CachedObjectsTree(UserCachedTree, ObjectsTree):
+    pass
+
+
+class CachedObjectsTreeLevel(UserCachedTree, ObjectsTreeLevel):
+    """Уровень дерева объектов: отдельная запись на каждый раскрываемый узел класса доступа."""
+
+    @property
+    def unique_cache_part(self) -> str:
+        return f'{super().unique_cache_part}:{self._context.get("parent") or "root"}'
+
+
+class CachedGroupsTree(UserCachedTree, GroupsTree):
+    pass
+
+
+class CachedObjectsTagsTree(UserCachedTree, ObjectsTagsTree):
+    pass
+
+
+class CachedTasksTagsTree(UserCachedTree, TasksTagsTree):
+
+    @staticmethod
+    def visibility_fingerprint(user) -> str:
+        return tasks_tags_tree_fingerprint(user)
+
+
+class CachedEngineersTree(SharedCachedTree, EngineersTree):
+    pass
+
+
+class CachedAllTagsTree(SharedCachedTree, AllTagsTree):
+    pass
+
+
+_SAVE_DELETE = (post_save, post_delete)
+# UserObjectGroup - промежуточная модель ObjectGroup.users: `group.users.add()` отправляет только m2m_changed
+_MEMBERSHIP = (post_save, post_delete, m2m_changed)
+
+# Какие изменения моделей делают дерево неактуальным: {класс дерева: ((сигналы, отправитель), ...)}.
+# Удаление групп и тегов каскадно удаляет строки m2m без сигнала m2m_changed,
+# поэтому деревья зависят и от самих групп и тегов.
+TREE_DEPENDENCIES: dict[type[CachedTree], tuple] = {
+    CachedObjectsTree: (
+        (_SAVE_DELETE, Object),
+        (_SAVE_DELETE, ObjectGroup),
+        (_MEMBERSHIP, UserObjectGroup),
+        ((m2m_changed,), Object.groups.through),
+    ),
+    CachedObjectsTreeLevel: (
+        (_SAVE_DELETE, Object),
+        (_SAVE_DELETE, ObjectGroup),
+        (_MEMBERSHIP, UserObjectGroup),
+        ((m2m_changed,), Object.groups.through),
+    ),
+    CachedGroupsTree: (
+        (_SAVE_DELETE, ObjectGroup),
+        (_MEMBERSHIP, UserObjectGroup),
+    ),
+    CachedObjectsTagsTree: (
+        (_SAVE_DELETE, Tag),
+        ((post_delete,), Object),
+        (_SAVE_DELETE, ObjectGroup),
+        (_MEMBERSHIP, UserObjectGroup),
+        ((m2m_changed,), Object.tags.through),
+        ((m2m_changed,), Object.groups.through),
+    ),
+    CachedTasksTagsTree: (
+        (_SAVE_DELETE, Tag),
+        ((post_delete,), Task),
+        (_SAVE_DELETE, Engineer),
+        (_SAVE_DELETE, Department),
+        ((m2m_changed,), Task.tags.through),
+        ((m2m_changed,), Task.engineers.through),
+        ((m2m_changed,), Task.departments.through),
+    ),
+    CachedEngineersTree: (
+        (_SAVE_DELETE, Engineer),
+        (_SAVE_DELETE, Department),
+    ),
+    CachedAllTagsTree: (
+        (_SAVE_DELETE, Tag),
+    ),
+}
+
+
+def trees_signal_callback(sender, signal, action=None, **kwargs):
+    """
+    Увеличивает глобальные версии деревьев, зависящих от изменённой модели.
+    """
+    if signal is m2m_changed and action not in ("post_add", "post_remove", "post_clear"):
+        return
 
+    for tree_class, dependencies in TREE_DEPENDENCIES.items():
+        if any(signal in signals and sender is model for signals, model in dependencies):
+            tree_class(context={}).increment_global_version()
 
-def objects_signal_callback(**kwargs):
-    print("objects_signal_callback", kwargs)
 
-    CachedObjectsTree(context=kwargs).increment_global_version()
+def connect_tree_signals() -> None:
+    """
+    Подключает `trees_signal_callback` к сигналам моделей из `TREE_DEPENDENCIES`.
+    Вызывается из `AppConfig.ready`.
+    """
+    for dependencies in TREE_DEPENDENCIES.values():
+        for signals, model in dependencies:
+            for signal in signals:
+                # Повторное подключение той же пары (функция, отправитель) сигнал игнорирует
+                signal.connect(trees_signal_callback, sender=model)
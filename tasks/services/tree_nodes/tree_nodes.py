@@ -1,7 +1,9 @@
+from django.db.models import Exists, OuterRef, F
 from django.db.models.query import Q
 
 from tasks.models import Tag, ObjectGroup, Object, Engineer, Department
-from tasks.services.tree_nodes.base import Node, Tree
+from tasks.services.object_visibility import visible_objects_query
+from tasks.services.tree_nodes.base import Node, Tree, build_forest
 
 
 class ObjectsTagsTree(Tree):
@@ -16,10 +18,12 @@ class ObjectsTagsTree(Tree):
         if user is None:
             return qs.none()
 
-        if not user.is_superuser:
-            qs = qs.filter(objects_set__groups__users=user)
+        if user.is_superuser:
+            return qs.distinct()
 
-        return qs.distinct()
+        # Теги доступных объектов подзапросом по связующей таблице, без размножения строк и DISTINCT
+        object_tags = Object.tags.through.objects.filter(object_id__in=visible_objects_query(user))
+        return Tag.objects.filter(id__in=object_tags.values("tag_id"))
 
     def get_nodes(self) -> list[Node]:
         # Получаем теги, к которым есть доступ
@@ -101,49 +105,66 @@ class ObjectsTree(Tree):
         qs = Object.objects.all().values("id", "name", "parent")
 
         if not user.is_superuser:
-            # Запрос к базе данных для получения всех объектов с полями id, name и parent
-            qs = qs.filter(groups__users=user)
+            # Только объекты, доступные по группам
+            qs = qs.filter(id__in=visible_objects_query(user))
 
         return qs
 
     def get_nodes(self) -> list[Node]:
         """
         Вытягивает дерево объектов. Каждый объект может иметь родительский объект (parent),
-        и функция строит дерево родительских и дочерних объектов.
+        и функция строит дерево родительских и дочерних объектов. Объекты под недоступным
+        родителем показываются как корни (см. `build_forest`).
         """
-        objects_qs = list(self._get_queryset())
-
-        # Преобразуем список объектов в словарь, где ключом является id объекта
-        objects: dict = {obj["id"]: obj for obj in objects_qs}
-
-        # Строим отношения "родитель-дети" для каждого объекта
-        for obj in objects_qs:
-            obj_id = obj["id"]
-            parent = objects[obj_id]["parent"]
-
-            if parent is not None and objects.get(parent):  # Если у объекта есть родитель
-                # Добавляем дочерний объект к родителю в словарь
-                objects[parent].setdefault("children", [])  # Если еще нет списка детей, создаем его
-                if obj_id not in objects[parent]["children"]:
-                    objects[parent]["children"].append(obj_id)  # Добавляем id дочернего объекта
-
-        # Вспомогательная функция для преобразования объекта и его детей в нужный формат
-        def transform(object_id: int) -> Node:
-            item = objects[object_id]
-            node: Node = {
-                "id": item["id"],  # Добавляем идентификатор объекта
-                "label": item["name"],  # Добавляем имя объекта
-            }
-            if item.get("children"):  # Если у объекта есть дети
-                # Рекурсивно преобразуем детей
-                node["children"] = [transform(child) for child in item["children"]]
-            return node
-
-        # Применяем преобразование к корневым элементам (у которых нет родителя)
-        result: list[Node] = [transform(obj_id) for obj_id in objects if objects[obj_id]["parent"] is None]
+        return build_forest(
+            (obj["id"], obj["parent"], {"id": obj["id"], "label": obj["name"]})
+            for obj in self._get_queryset()
+        )
+
+
+class ObjectsTreeLevel(Tree):
+    """
+    Один уровень дерева объектов: дочерние объекты `parent` из контекста (None - корни),
+    доступные пользователю. Для виджета выбора с подгрузкой веток при раскрытии.
+    Как и в `ObjectsTree`, объекты под недоступным родителем - среди корней.
+    """
+
+    def _get_queryset(self):
+        user = self._context.get("user", 0)
+        parent = self._context.get("parent")
+        children = Object.objects.filter(parent=OuterRef("pk"))
+        qs = Object.objects.filter(parent=parent)
+
+        if not user.is_superuser:
+            visible = visible_objects_query(user)
+            if parent is None:
+                qs = Object.objects.filter(Q(parent__isnull=True) | ~Q(parent__in=visible))
+            qs = qs.filter(id__in=visible)
+            children = children.filter(id__in=visible)
+
+        return qs.annotate(has_children=Exists(children)).values("id", "name", "has_children").order_by("id")
+
+    def get_nodes(self) -> list[Node]:
+        result: list[Node] = []
+        for item in self._get_queryset():
+            node: Node = {"id": item["id"], "label": item["name"]}
+            if item["has_children"]:
+                node["children"] = None
+            result.append(node)
         return result
 
 
+def selected_objects_nodes(user, ids) -> list[Node]:
+    """
+    Узлы выбранных объектов для виджета с подгрузкой веток: ветки с ними могут быть
+    ещё не загружены, поэтому виджет получает выбранные значения вместе с названиями.
+    """
+    qs = Object.objects.filter(id__in=[int(obj_id) for obj_id in ids if str(obj_id).isdigit()])
+    if not user.is_superuser:
+        qs = qs.filter(id__in=visible_objects_query(user))
+    return list(qs.order_by("id").values("id", label=F("name")))
+
+
 class EngineersTree(Tree):
 
     @staticmethod
@@ -157,32 +178,17 @@ class EngineersTree(Tree):
         return Department.objects.all().values("id", "name")  # Получаем все департаменты
 
     def get_nodes(self) -> list[Node]:
-        engineers_qs = list(self._get_queryset())
-        departments_qs = list(self._get_departments())  # Получаем все департаменты
-
-        departments: dict[int, Node] = {  # Создаем департаменты заранее
-            dep["id"]: {
-                "id": f"dep_{dep['id']}",
-                "label": dep["name"],
-                "children": [],
-            }
-            for dep in departments_qs
-        }
-
-        no_department_engineers: list[Node] = []
-
-        for engineer in engineers_qs:
-            engineer_id: int = engineer["id"]
-            engineer_label: str = engineer["first_name"] + " " + engineer["second_name"]
-            department_id: int | None = engineer["department"]
-
-            if department_id is None:
-                no_department_engineers.append({"id": f"eng_{engineer_id}", "label": engineer_label})
-            else:
-                departments[department_id]["children"].append(
-                    {"id": f"eng_{engineer_id}", "label": engineer_label}
-                )
-
-        engineers_tree = list(departments.values())  # Все департаменты, даже пустые
-        engineers_tree.extend(no_department_engineers)
-        return engineers_tree
+        # Все департаменты, даже пустые, затем инженеры: без отдела - корнями после департаментов
+        items = [
+            (f"dep_{dep['id']}", None, {"id": f"dep_{dep['id']}", "label": dep["name"], "children": []})
+            for dep in self._get_departments()
+        ]
+        items.extend(
+            (
+                f"eng_{engineer['id']}",
+                f"dep_{engineer['department']}" if engineer["department"] is not None else None,
+                {"id": f"eng_{engineer['id']}", "label": engineer["first_name"] + " " + engineer["second_name"]},
+            )
+            for engineer in self._get_queryset()
+        )
+        return build_forest(items)
@@ -0,0 +1,71 @@
+"""
+Отпечатки видимости пользователя.
+
+Отпечаток описывает, от чего зависит то, что видит пользователь, и используется в ключах кеша
+вместо имени пользователя. Пользователи с одинаковыми правами (например, все суперпользователи
+или все пользователи с одинаковым набором групп объектов) получают одни и те же записи кеша,
+поэтому объём кеша растёт с числом различных классов доступа, а не с числом сотрудников.
+"""
+
+import hashlib
+
+from .request_cache import memoize
+
+
+def _digest(values) -> str:
+    return hashlib.sha1(",".join(map(str, values)).encode()).hexdigest()[:16]
+
+
+def groups_fingerprint(user) -> str:
+    """
+    Набор групп объектов пользователя. Определяет перечень объектов (`get_objects_list`).
+    """
+
+    def compute():
+        group_ids = sorted(user.object_groups.values_list("id", flat=True))
+        return f"g:{_digest(group_ids)}" if group_ids else "g:none"
+
+    return memoize(f"groups_fingerprint:{user.pk}", compute)
+
+
+def objects_tree_fingerprint(user) -> str:
+    """
+    Деревья объектов, групп и тегов объектов: суперпользователь видит всё, остальные - по группам.
+    """
+    if user.is_superuser:
+        return "su"
+    return groups_fingerprint(user)
+
+
+def tasks_fingerprint(user) -> str:
+    """
+    Перечень задач (`permission_filter`) и счётчики задач.
+
+    Суперпользователи видят все задачи. Остальные видят задачи, созданные ими самими,
+    поэтому перечень у каждого свой. Счётчик "мои задачи" и фильтр "только мои" зависят
+    от инженера, поэтому одну запись делят суперпользователи с одним и тем же инженером
+    (на практике - все администраторы без инженера).
+    """
+    if user.is_superuser:
+        engineer = user.get_engineer_or_none()
+        return f"su:e{engineer.pk}" if engineer else "su"
+    return f"user:{user.pk}"
+
+
+def tasks_tags_tree_fingerprint(user) -> str:
+    """
+    Дерево тегов задач (`TasksTagsTree`) зависит только от роли и отдела инженера.
+    """
+    engineer = user.get_engineer_or_none()
+    if engineer and engineer.head_of_department:
+        return f"head:{engineer.department_id}"
+    if engineer:
+        return f"eng:{engineer.pk}"
+    return "su" if user.is_superuser else "none"
+
+
+def objects_page_fingerprint(user) -> str:
+    """
+    Страница объектов: перечень объектов по группам и количество задач, видимых пользователю.
+    """
+    return f"{groups_fingerprint(user)}:{tasks_fingerprint(user)}"
@@ -0,0 +1,100 @@
+import time
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from tasks.models import Engineer, Tag
+from tasks.services import autocomplete
+from tasks.services.autocomplete import Entry, PrefixIndex, OBJECTS, TAGS, ENGINEERS
+from user.models import User
+
+
+class TestPrefixIndex(TestCase):
+    def setUp(self):
+        self.index = PrefixIndex([
+            Entry(1, "Серверная", "server-room", object_id=1),
+            Entry(2, "Кабинет QA", "qa-room", object_id=2),
+            Entry(3, "Ёлка во дворе", "", object_id=3),
+            Entry(4, "Коммутатор серверной", "switch", object_id=4),
+        ])
+
+    def labels(self, query, **kwargs):
+        return [entry.label for entry in self.index.search(query, **kwargs)]
+
+    def test_prefix(self):
+        # Сначала записи, название которых начинается с запроса
+        self.assertEqual(["Серверная", "Коммутатор серверной"], self.labels("серв"))
+        self.assertEqual(["Кабинет QA"], self.labels("qa-ro"))
+        self.assertEqual(["Ёлка во дворе"], self.labels("елк"))
+        self.assertEqual(["Коммутатор серверной"], self.labels("серв комм"))
+
+    def test_infix(self):
+        self.assertEqual(["Серверная", "Коммутатор серверной"], self.labels("ерве"))
+        self.assertEqual([], self.labels("xyz"))
+        self.assertEqual([], self.labels("  "))
+
+    def test_visible_and_limit(self):
+        self.assertEqual(
+            ["Коммутатор серверной"],
+            self.labels("серв", visible=lambda entry: entry.object_id != 1),
+        )
+        self.assertEqual(["Серверная"], self.labels("серв", limit=1))
+
+    def test_speed(self):
+        entries = [Entry(i, f"Объект {i} корпус {i % 97}", f"object-{i}", object_id=i) for i in range(20_000)]
+        index = PrefixIndex(entries)
+        queries = ("объ", "корпус 5", "object-19", "1234", "пус", "нет такого")
+
+        start = time.perf_counter()
+        for _ in range(10):
+            for query in queries:
+                index.search(query)
+        average = (time.perf_counter() - start) / (10 * len(queries))
+
+        self.assertLess(average, 0.01)
+
+
+class TestAutocomplete(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        autocomplete._indexes.clear()
+        self.admin = User.objects.get(username="admin")
+        self.kyle = User.objects.get(username="kyle_shields")  # объекты 3-10, 12, 18, 19
+
+    def test_objects_visibility(self):
+        self.assertIn(13, [item["id"] for item in autocomplete.autocomplete(self.admin, OBJECTS, "qa-pc1")])
+        self.assertEqual([], autocomplete.autocomplete(self.kyle, OBJECTS, "qa-pc1"))
+
+        results = autocomplete.autocomplete(self.kyle, OBJECTS, "qa-room")
+        self.assertEqual([{"id": 12, "label": results[0]["label"], "slug": "qa-room"}], results)
+
+        for item in autocomplete.autocomplete(self.kyle, OBJECTS, "a", limit=50):
+            self.assertIn(item["id"], [3, 4, 5, 6, 7, 8, 9, 10, 12, 18, 19])
+
+    def test_engineers(self):
+        engineer = Engineer.objects.first()
+        results = autocomplete.autocomplete(self.admin, ENGINEERS, engineer.second_name)
+        self.assertIn(f"eng_{engineer.id}", [item["id"] for item in results])
+
+    def test_rebuild_on_change(self):
+        self.assertEqual([], autocomplete.autocomplete(self.kyle, TAGS, "уникальный"))
+        with self.assertNumQueries(0):
+            autocomplete.autocomplete(self.kyle, TAGS, "уникальный")
+
+        tag = Tag.objects.create(tag_name="Уникальный тег")
+        self.assertEqual(
+            [{"id": tag.id, "label": "Уникальный тег"}],
+            autocomplete.autocomplete(self.kyle, TAGS, "уникальный"),
+        )
+
+    def test_view(self):
+        self.client.force_login(self.kyle)
+
+        response = self.client.get(reverse("autocomplete", args=[OBJECTS]), {"q": "qa", "limit": "x"})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([12], [item["id"] for item in response.json()["results"]])
+
+        self.assertEqual(404, self.client.get(reverse("autocomplete", args=["users"]), {"q": "a"}).status_code)
@@ -0,0 +1,75 @@
+import sys
+
+from django.core.cache import cache
+from django.test import TestCase, SimpleTestCase
+
+from tasks.models import Object
+from tasks.services.tree_nodes import ObjectsTree, CachedObjectsTreeLevel
+from tasks.services.tree_nodes.base import build_forest
+from user.models import User
+
+
+def forest(parents: dict) -> list:
+    return build_forest((node_id, parent_id, {"id": node_id}) for node_id, parent_id in parents.items())
+
+
+class TestBuildForest(SimpleTestCase):
+
+    def test_order_and_leaves(self):
+        self.assertEqual(
+            [
+                {"id": 1, "children": [{"id": 2}, {"id": 4, "children": [{"id": 5}]}]},
+                {"id": 3},
+            ],
+            forest({1: None, 2: 1, 3: None, 4: 1, 5: 4}),
+        )
+
+    def test_orphans(self):
+        # Родителя 10 нет в перечне - узел 2 с поддеревом становится корнем
+        self.assertEqual(
+            [{"id": 1}, {"id": 2, "children": [{"id": 3}]}],
+            forest({1: None, 2: 10, 3: 2}),
+        )
+
+    def test_cycles(self):
+        with self.assertLogs("tasks.services.tree_nodes.base", level="WARNING"):
+            nodes = forest({1: 2, 2: 1, 3: None, 4: 4, 5: 1})
+
+        # Первый узел цикла становится корнем, узел 2 остаётся его потомком без ссылки обратно
+        self.assertEqual(
+            [{"id": 3}, {"id": 1, "children": [{"id": 2}, {"id": 5}]}, {"id": 4}],
+            nodes,
+        )
+
+    def test_deep_and_wide(self):
+        depth = sys.getrecursionlimit() * 5
+        nodes = forest({node_id: node_id - 1 if node_id else None for node_id in range(depth)})
+        levels = 0
+        while nodes:
+            levels += 1
+            nodes = nodes[0].get("children", [])
+        self.assertEqual(depth, levels)
+
+        nodes = forest({node_id: 0 if node_id else None for node_id in range(50_000)})
+        self.assertEqual(49_999, len(nodes[0]["children"]))
+
+
+class TestObjectsTreeOrphans(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.kyle = User.objects.get(username="kyle_shields")  # объекты 3-10, 12, 18, 19
+        # noc-room (8) - под недоступным kyle secret1 (15)
+        Object.objects.filter(pk=8).update(parent=15)
+
+    def test_objects_tree(self):
+        roots = ObjectsTree({"user": self.kyle}).get_nodes()
+
+        self.assertEqual([3, 5, 8, 18, 19], [node["id"] for node in roots])
+        self.assertEqual([7, 9], [node["id"] for node in roots[2]["children"]])
+
+    def test_tree_level(self):
+        roots = CachedObjectsTreeLevel({"user": self.kyle}).get_cached_nodes()
+
+        self.assertEqual([3, 5, 8, 18, 19], [node["id"] for node in roots])
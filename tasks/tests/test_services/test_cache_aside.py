@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from tasks.services import cache_aside as cache_aside_module
+from tasks.services.cache_aside import cache_aside
+from tasks.services.cache_tags import invalidate_tags
+
+
+class TestCacheAside(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_compute_once(self):
+        compute = mock.Mock(return_value=42)
+
+        for _ in range(3):
+            self.assertEqual(42, cache_aside("key", compute, timeout=60, beta=0))
+
+        compute.assert_called_once()
+
+    def test_stale_value_while_locked(self):
+        """Пока другой воркер пересчитывает значение, отдаётся прежнее."""
+        cache_aside("key", lambda: "old", timeout=60)
+        cache.add("lock:key:None", 1)
+
+        with mock.patch.object(cache_aside_module, "_should_refresh", return_value=True):
+            self.assertEqual("old", cache_aside("key", lambda: "new", timeout=60))
+
+    def test_early_refresh(self):
+        """Значение пересчитывается до истечения срока, если выпала ранняя перезагрузка."""
+        cache_aside("key", lambda: "old", timeout=60)
+
+        with mock.patch.object(cache_aside_module, "_should_refresh", return_value=True):
+            self.assertEqual("new", cache_aside("key", lambda: "new", timeout=60))
+
+        self.assertFalse(cache.get("lock:key:None"))
+
+    def test_invalidated_tag(self):
+        """Значение с инвалидированным тегом не отдаётся даже как устаревшее."""
+        cache_aside("key", lambda: "old", timeout=60, tags=lambda value: ["task:1"])
+        invalidate_tags("task:1")
+        cache.add("lock:key:None", 1)
+
+        with mock.patch.object(cache_aside_module, "WAIT_TIMEOUT", 0):
+            self.assertEqual("new", cache_aside("key", lambda: "new", timeout=60, tags=lambda value: ["task:1"]))
+
+    def test_invalidated_during_compute(self):
+        """Значение, вычисленное до инвалидации его тега, не считается актуальным."""
+
+        def compute():
+            value = "old"  # данные прочитаны, затем другой воркер меняет их и инвалидирует тег
+            invalidate_tags("task:1")
+            return value
+
+        self.assertEqual("old", cache_aside("key", compute, timeout=60, tags=lambda value: ["task:1"]))
+        self.assertEqual("new", cache_aside("key", lambda: "new", timeout=60, tags=lambda value: ["task:1"]))
+        self.assertEqual("new", cache_aside("key", lambda: "newer", timeout=60, tags=lambda value: ["task:1"]))
@@ -0,0 +1,50 @@
+import pickle
+
+from django.test import TestCase
+
+from tasks.models import Task, Engineer
+from tasks.services.cache_dto import task_card, TaskCard
+from user.models import User
+
+
+class TestTaskCard(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.get(username="noah_griffith")
+        cls.engineer = Engineer.objects.get(user__username="kyle_shields")
+        cls.task = Task.objects.create(
+            priority=Task.Priority.HIGH,
+            is_done=False,
+            deleted=False,
+            completion_time="2024-10-01T12:00:00Z",
+            header="header",
+            text="<p>text</p>",
+            creator=cls.creator,
+        )
+        cls.task.engineers.add(cls.engineer)
+
+    def test_pickle_roundtrip(self):
+        card = pickle.loads(pickle.dumps(task_card(self.task)))
+
+        self.assertIsInstance(card, TaskCard)
+        self.assertEqual("header", card.header)
+        self.assertEqual(self.task.completion_time, card.completion_time)
+        self.assertEqual(["Kyle Shields"], [str(engineer) for engineer in card.engineers.all()])
+
+    def test_compare_with_models(self):
+        """Карточка сравнивается с моделями так же, как это делают шаблоны."""
+        card = task_card(self.task)
+
+        self.assertTrue(self.creator == card.creator)
+        self.assertIn(self.engineer, card.engineers.all())
+        self.assertNotIn(Engineer.objects.get(pk=1), card.engineers.all())
+        self.assertNotIn(None, card.engineers.all())
+        self.assertFalse(card.creator == self.engineer)
+
+    def test_smaller_than_model(self):
+        task = Task.objects.prefetch_related("engineers", "tags", "files", "departments", "comments").get()
+        list(task.engineers.all())
+
+        self.assertLess(len(pickle.dumps(task_card(task))), len(pickle.dumps(task)))
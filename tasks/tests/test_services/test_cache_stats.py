@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from tasks.services import cache_stats
+from tasks.services.cache_aside import cache_aside
+from tasks.services.cache_tags import invalidate_tags
+from user.models import User
+
+
+class TestCacheStats(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        cache_stats.reset_stats()
+
+    def test_key_family(self):
+        self.assertEqual("tasks_page", cache_stats.key_family("tasks_page:1:8:admin:none"))
+        self.assertEqual("single_obj", cache_stats.key_family("single_obj_slug"))
+        self.assertEqual("obj_childs", cache_stats.key_family("obj_slug_childs"))
+        self.assertEqual("trees", cache_stats.key_family("CachedObjectsTree:user:admin"))
+        self.assertEqual("other", cache_stats.key_family("something"))
+
+    def test_hits_and_misses(self):
+        tags = lambda value: ["task:1"]  # noqa: E731
+        cache_aside("tasks_page:1", lambda: "page", timeout=60, tags=tags, beta=0)
+        cache_aside("tasks_page:1", lambda: "page", timeout=60, tags=tags, beta=0)
+        invalidate_tags("task:1")
+        cache_aside("tasks_page:1", lambda: "page", timeout=60, tags=tags, beta=0)
+
+        stats = cache_stats.get_stats()["tasks_page"]
+        self.assertEqual(1, stats[cache_stats.HITS])
+        self.assertEqual(1, stats[cache_stats.MISS_ABSENT])
+        self.assertEqual(1, stats[cache_stats.MISS_INVALIDATED])
+        self.assertEqual(2, stats[cache_stats.RECOMPUTES])
+        self.assertGreater(stats["avg_bytes"], 0)
+        self.assertEqual(0.333, stats["hit_ratio"])
+
+    @override_settings(DEBUG=False)
+    def test_size_sampled(self):
+        with mock.patch.object(cache_stats, "SIZE_SAMPLE_EVERY", 3), \
+                mock.patch.object(cache_stats.pickle, "dumps", return_value=b"x" * 10) as dumps:
+            for _ in range(7):
+                cache_stats.record_compute("stat", 0.001, {})
+
+        stats = cache_stats.get_stats()["stat"]
+        self.assertEqual(3, dumps.call_count)  # 1-й, 4-й и 7-й пересчёты
+        self.assertEqual(7, stats[cache_stats.RECOMPUTES])
+        self.assertEqual(3, stats[cache_stats.SIZED])
+        self.assertEqual(10, stats["avg_bytes"])
+
+    def test_staff_endpoint(self):
+        cache_aside("stat", lambda: {}, timeout=60)
+
+        self.client.force_login(User.objects.get(username="empty_user"))
+        self.assertEqual(302, self.client.get("/cache-stats/").status_code)
+
+        User.objects.filter(username="admin").update(is_staff=True)
+        self.client.force_login(User.objects.get(username="admin"))
+        response = self.client.get("/cache-stats/")
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, response.json()["families"]["stat"][cache_stats.MISS_ABSENT])
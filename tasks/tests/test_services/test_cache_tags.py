@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from tasks.models import Task, Engineer, Comment
+from tasks.services.cache_tags import (
+    get_tagged,
+    set_tagged,
+    invalidate_tags,
+    tags_snapshot,
+    task_tag,
+    user_tasks_tags,
+)
+from user.models import User
+
+
+class TestCacheTags(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+
+    def create_task(self, creator, engineers=()) -> Task:
+        task = Task.objects.create(
+            priority=Task.Priority.LOW,
+            is_done=False,
+            deleted=False,
+            completion_time="2024-10-01T12:00:00Z",
+            header="test",
+            creator=creator,
+        )
+        task.engineers.set(engineers)
+        return task
+
+    def test_set_and_get(self):
+        set_tagged("key", {"value": 1}, ["a", "b"])
+        self.assertDictEqual({"value": 1}, get_tagged("key"))
+
+    def test_invalidate_only_tagged(self):
+        """Инвалидация тега вытесняет только записи с этим тегом."""
+        set_tagged("first", 1, ["a", "b"])
+        set_tagged("second", 2, ["b", "c"])
+        set_tagged("third", 3, ["c"])
+
+        invalidate_tags("a")
+
+        self.assertIsNone(get_tagged("first"))
+        self.assertEqual(2, get_tagged("second"))
+        self.assertEqual(3, get_tagged("third"))
+
+    def test_invalidated_after_snapshot(self):
+        """Тег, инвалидированный после снимка, сохраняется устаревшим."""
+        invalidate_tags("a")
+        snapshot = tags_snapshot()
+        invalidate_tags("b")
+
+        set_tagged("key", 1, ["a", "b"], snapshot=snapshot)
+        self.assertIsNone(get_tagged("key"))
+
+        set_tagged("key", 1, ["a", "b"], snapshot=tags_snapshot())
+        self.assertEqual(1, get_tagged("key"))
+
+    def test_task_edit_evicts_only_its_pages(self):
+        """Редактирование задачи вытесняет только страницы, на которых она показана."""
+        admin = User.objects.get(username="admin")
+        noc_engineer = Engineer.objects.get(user__username="kyle_shields")
+        qa_head = User.objects.get(username="chad_orr")
+
+        noc_task = self.create_task(admin, [noc_engineer])
+        qa_task = self.create_task(admin, [Engineer.objects.get(user=qa_head)])
+
+        set_tagged("noc_page", "noc", {*user_tasks_tags(noc_engineer.user), task_tag(noc_task.id)})
+        set_tagged("qa_page", "qa", {*user_tasks_tags(qa_head), task_tag(qa_task.id)})
+
+        noc_task.header = "new header"
+        noc_task.save()
+
+        self.assertIsNone(get_tagged("noc_page"))
+        self.assertEqual("qa", get_tagged("qa_page"))
+
+    def test_comment_evicts_task_pages(self):
+        admin = User.objects.get(username="admin")
+        task = self.create_task(admin)
+        set_tagged("page", "data", {task_tag(task.id)})
+
+        Comment.objects.create(task=task, author=admin, text="comment")
+
+        self.assertIsNone(get_tagged("page"))
+
+    def test_new_task_evicts_assignee_listing(self):
+        """Новая задача вытесняет перечни задач назначенного инженера и суперпользователя."""
+        admin = User.objects.get(username="admin")
+        engineer = Engineer.objects.get(user__username="megan_horne")
+        set_tagged("engineer_page", "data", user_tasks_tags(engineer.user))
+        set_tagged("admin_page", "data", user_tasks_tags(admin))
+        set_tagged("it_head_page", "data", user_tasks_tags(User.objects.get(username="jeffrey_mason")))
+
+        self.create_task(admin, [engineer])
+
+        self.assertIsNone(get_tagged("engineer_page"))
+        self.assertIsNone(get_tagged("admin_page"))
+        self.assertEqual("data", get_tagged("it_head_page"))
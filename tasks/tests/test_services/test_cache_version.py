@@ -0,0 +1,61 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from tasks.services.cache_version import CacheVersion, get_version
+
+
+class TestCacheVersion(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_initial_version(self):
+        """Отсутствующая версия создаётся со значением 1."""
+        self.assertEqual(1, CacheVersion("test_version").get_cache_version())
+        self.assertEqual(1, cache.get("test_version"))
+
+    def test_increment_without_key(self):
+        """Инкремент отсутствующей версии сразу даёт 2, как если бы она была равна 1."""
+        self.assertEqual(2, CacheVersion("test_version").increment_cache_version())
+        self.assertEqual(2, CacheVersion("test_version").get_cache_version())
+
+    def test_increment_is_not_lost(self):
+        """Каждый инкремент учитывается, даже если экземпляры CacheVersion разные."""
+        first, second = CacheVersion("test_version"), CacheVersion("test_version")
+        first.get_cache_version()
+        for _ in range(5):
+            first.increment_cache_version()
+            second.increment_cache_version()
+
+        self.assertEqual(11, CacheVersion("test_version").get_cache_version())
+
+    def test_version_has_no_timeout(self):
+        """Версия не должна истекать, иначе старые записи кеша снова станут актуальными."""
+        CacheVersion("test_version").increment_cache_version()
+        CacheVersion("created_version").get_cache_version()
+        CacheVersion.set_many({"set_version": 5})
+
+        later = time.time() + cache.default_timeout + 1
+        with mock.patch("time.time", return_value=later):
+            self.assertDictEqual(
+                {"test_version": 2, "created_version": 1, "set_version": 5},
+                cache.get_many(["test_version", "created_version", "set_version"]),
+            )
+
+    def test_get_many(self):
+        """Версии нескольких ключей получаются одним вызовом, отсутствующие создаются."""
+        CacheVersion("first").increment_cache_version()
+
+        versions = CacheVersion.get_many("first", "second")
+
+        self.assertDictEqual({"first": 2, "second": 1}, versions)
+        self.assertEqual(1, cache.get("second"))
+
+    def test_get_version_uses_prefetched(self):
+        """get_version берёт значение из словаря, не обращаясь к кешу."""
+        self.assertEqual(7, get_version("first", {"first": 7}))
+        self.assertIsNone(cache.get("first"))
+        self.assertEqual(1, get_version("first", {}))
@@ -0,0 +1,28 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from tasks.services.cache_version import CacheVersion, TASKS_PAGE_VERSION, OBJECTS_PAGE_VERSION
+
+
+class TestWarmCaches(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_warm_in_process(self):
+        out = StringIO()
+        call_command("warm_caches", workers=0, pages=2, users=["admin"], stdout=out)
+
+        tasks_version = CacheVersion(TASKS_PAGE_VERSION).get_cache_version()
+        objects_version = CacheVersion(OBJECTS_PAGE_VERSION).get_cache_version()
+        self.assertIsNotNone(cache.get("tasks_page:k:8:su:none", version=tasks_version))
+        self.assertIsNotNone(cache.get("objects_page:k:8:g:none:su", version=objects_version))
+        self.assertIsNotNone(cache.get("stat"))
+
+        report = out.getvalue()
+        for family in ("tasks", "objects", "filters", "stat"):
+            self.assertIn(family, report)
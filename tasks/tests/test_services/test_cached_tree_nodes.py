@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from tasks.models import Tag, ObjectGroup, Engineer, Department
+from tasks.services.tree_nodes import CachedAllTagsTree, CachedGroupsTree, CachedEngineersTree, CachedObjectsTree
+from user.models import User
+
+
+class TestCachedTrees(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(username="empty_user")
+        self.context = {"user": self.user}
+
+    def test_cached_nodes(self):
+        """Повторное построение дерева не обращается к БД."""
+        nodes = CachedEngineersTree(self.context).get_cached_nodes()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(nodes, CachedEngineersTree(self.context).get_cached_nodes())
+
+    def test_shared_tree(self):
+        """Дерево, не зависящее от пользователя, кешируется одно на всех."""
+        CachedAllTagsTree(self.context).get_cached_nodes()
+        admin = User.objects.get(username="admin")
+
+        with self.assertNumQueries(0):
+            CachedAllTagsTree({"user": admin}).get_cached_nodes()
+
+    def test_tag_signal(self):
+        CachedAllTagsTree(self.context).get_cached_nodes()
+        tag = Tag.objects.create(tag_name="new_tag")
+
+        self.assertIn({"id": tag.id, "label": "new_tag"}, CachedAllTagsTree(self.context).get_cached_nodes())
+
+    def test_engineer_signal(self):
+        CachedEngineersTree(self.context).get_cached_nodes()
+        Department.objects.filter(pk=1).update(name="old")  # update() не отправляет сигналов
+        Engineer.objects.create(first_name="New", second_name="Engineer")
+
+        nodes = CachedEngineersTree(self.context).get_cached_nodes()
+        self.assertIn({"id": "dep_1", "label": "old", "children": nodes[0]["children"]}, nodes)
+
+    def test_user_groups_signal(self):
+        """Добавление пользователя в группу обновляет его деревья групп и объектов."""
+        self.assertEqual([], CachedGroupsTree(self.context).get_cached_nodes())
+        self.assertEqual([], CachedObjectsTree(self.context).get_cached_nodes())
+
+        group = ObjectGroup.objects.filter(objects_set__isnull=False).first()
+        group.users.add(self.user)
+
+        self.assertEqual([{"id": group.id, "label": group.name}], CachedGroupsTree(self.context).get_cached_nodes())
+        self.assertNotEqual([], CachedObjectsTree(self.context).get_cached_nodes())
@@ -0,0 +1,130 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import TestCase, RequestFactory
+
+from tasks import filters
+from tasks.filters import filter_signature, get_fields_for_filter, TASKS_FILTER_PARAMS, TASKS_FILTER_DEFAULTS, \
+    OBJECTS_FILTER_PARAMS
+from tasks.models import Task, Tag, Engineer
+from tasks.services.tree_json import tree_url, ENGINEERS, OBJECTS
+from tasks.services.tasks_prepare import get_tasks
+from user.models import User
+
+
+class TestFilterSignature(TestCase):
+
+    def signature(self, query: str) -> str:
+        return filter_signature(QueryDict(query), TASKS_FILTER_PARAMS, TASKS_FILTER_DEFAULTS)
+
+    def test_defaults(self):
+        """Параметры по умолчанию и пагинация не считаются фильтром."""
+        self.assertEqual("", self.signature(""))
+        self.assertEqual("", self.signature("sort_order=desc&show_active_task=true&page=2&per_page=16"))
+
+    def test_empty_value_kept(self):
+        """Явно пустой параметр отличается от отсутствующего: TaskFilterByDone подставляет значение по умолчанию."""
+        self.assertNotEqual(self.signature("show_done_task=true"), self.signature("show_active_task=&show_done_task=true"))
+
+    def test_order_independent(self):
+        self.assertEqual(
+            self.signature("tags=1&tags=2&engineers=eng_1,dep_2&search=x"),
+            self.signature("search=x&engineers=dep_2,eng_1&tags=2&tags=1"),
+        )
+        self.assertNotEqual(self.signature("search=x"), self.signature("search=y"))
+        self.assertNotEqual(self.signature(""), self.signature("sort_order=asc"))
+
+    def test_unknown_params_ignored(self):
+        """Посторонние параметры не создают новых записей кеша."""
+        self.assertEqual("", self.signature("utm_source=mail&_=1700000000000"))
+        self.assertEqual(self.signature("search=x"), self.signature("search=x&utm_campaign=y&_=1"))
+        self.assertNotEqual(self.signature(""), self.signature("subtree=true"))
+        self.assertEqual(
+            filter_signature(QueryDict("tags=1"), OBJECTS_FILTER_PARAMS),
+            filter_signature(QueryDict("tags=1&show_done_task=true&_=1"), OBJECTS_FILTER_PARAMS),
+        )
+
+
+class TestFilteredTasksCache(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.get(username="admin")
+        self.task = Task.objects.create(
+            priority=Task.Priority.HIGH,
+            is_done=False,
+            deleted=False,
+            completion_time="2024-10-01T12:00:00Z",
+            header="header",
+            creator=self.admin,
+        )
+
+    def get_page(self, query: str):
+        request = RequestFactory().get("/", QueryDict(query))
+        request.user = self.admin
+        return get_tasks(request, 1, 8)
+
+    def test_filtered_page_cached(self):
+        self.get_page("search=head&sort_order=desc")
+
+        with self.assertNumQueries(0):
+            page = self.get_page("sort_order=desc&search=head")
+        self.assertEqual([self.task.id], [task.id for task in page["tasks"]])
+
+    def test_search_invalidated(self):
+        """Изменение задачи, которой не было на отфильтрованной странице, обновляет страницу."""
+        other = Task.objects.create(
+            priority=Task.Priority.LOW,
+            is_done=False,
+            deleted=False,
+            completion_time="2024-10-01T12:00:00Z",
+            header="other",
+            creator=self.admin,
+        )
+        self.assertEqual(1, len(self.get_page("search=head")["tasks"]))
+
+        other.header = "second header"
+        other.save()
+
+        self.assertEqual(2, len(self.get_page("search=head")["tasks"]))
+
+    def test_tags_invalidated(self):
+        tag = Tag.objects.create(tag_name="tag")
+        self.assertEqual(0, len(self.get_page(f"tags={tag.id}")["tasks"]))
+
+        self.task.tags.add(tag)
+
+        self.assertEqual(1, len(self.get_page(f"tags={tag.id}")["tasks"]))
+
+
+class TestFilterFieldsCache(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        # kyle и megan - в одних группах, у chad и admin доступ другой
+        self.users = [User.objects.get(username=name) for name in ("kyle_shields", "megan_horne", "chad_orr", "admin")]
+
+    def test_shared_part_built_once(self):
+        with (
+            mock.patch.object(filters, "_get_shared_fields", wraps=filters._get_shared_fields) as shared,
+            mock.patch.object(filters, "_get_tree_fields", wraps=filters._get_tree_fields) as personal,
+        ):
+            fields = [get_fields_for_filter(user, "tasks") for user in self.users]
+
+        self.assertEqual(1, shared.call_count)
+        self.assertEqual(4, personal.call_count)  # общая часть и три класса доступа
+
+        self.assertEqual({tree_url(None, ENGINEERS)}, {user_fields["engineers_url"] for user_fields in fields})
+        self.assertEqual(fields[0]["objects_url"], fields[1]["objects_url"])
+        self.assertNotEqual(fields[0]["objects_url"], fields[3]["objects_url"])
+        self.assertEqual(tree_url(self.users[0], OBJECTS), fields[0]["objects_url"])
+
+    def test_shared_part_invalidated(self):
+        engineers_url = get_fields_for_filter(self.users[0], "tasks")["engineers_url"]
+
+        Engineer.objects.create(first_name="New", second_name="Engineer")
+
+        self.assertNotEqual(engineers_url, get_fields_for_filter(self.users[1], "tasks")["engineers_url"])
@@ -0,0 +1,183 @@
+import datetime
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from tasks.filters import tasks_ordering
+from tasks.models import Task
+from tasks.services.keyset import paginate_keyset, add_total, encode_cursor, cursor_digest, NEXT
+from tasks.services.listing_counts import ListingCount
+from tasks.services.objects import get_objects, get_objects_list
+from tasks.services.tasks_prepare import get_tasks
+from user.models import User
+
+
+class TestKeysetPagination(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.get(username="admin")
+        start = datetime.datetime(2024, 10, 1, 12, tzinfo=datetime.timezone.utc)
+        # Повторяющиеся сроки - порядок внутри них задают create_time и id
+        for i in range(23):
+            Task.objects.create(
+                priority=Task.Priority.LOW,
+                is_done=False,
+                deleted=False,
+                completion_time=start + datetime.timedelta(days=i // 3),
+                header=f"task {i}",
+                creator=self.admin,
+            )
+
+    def walk(self, queryset, ordering, per_page):
+        pages, cursor = [], ""
+        while cursor is not None:
+            data = paginate_keyset(queryset, ordering, cursor, per_page)
+            pages.append([row.id for row in data["page_obj"]])
+            cursor = data["next_cursor"]
+        return pages
+
+    def test_pages_cover_ordering(self):
+        for sort_order in ("asc", "desc"):
+            with self.subTest(sort_order=sort_order):
+                ordering = tasks_ordering(sort_order)
+                expected = list(Task.objects.order_by(*ordering).values_list("id", flat=True))
+
+                pages = self.walk(Task.objects.all(), ordering, 5)
+
+                self.assertEqual([5, 5, 5, 5, 3], [len(page) for page in pages])
+                self.assertEqual(expected, [task_id for page in pages for task_id in page])
+
+    def test_previous_page(self):
+        ordering = tasks_ordering("desc")
+        first = paginate_keyset(Task.objects.all(), ordering, "", 5)
+        second = paginate_keyset(Task.objects.all(), ordering, first["next_cursor"], 5)
+        back = paginate_keyset(Task.objects.all(), ordering, second["previous_cursor"], 5)
+
+        self.assertEqual(2, second["page_obj"].number)
+        self.assertEqual(list(first["page_obj"]), list(back["page_obj"]))
+        self.assertEqual(1, back["page_obj"].number)
+        self.assertFalse(back["page_obj"].has_previous())
+        self.assertTrue(back["page_obj"].has_next())
+
+    def test_stable_after_insert(self):
+        """Новая задача в начале перечня не сдвигает уже открытую следующую страницу."""
+        ordering = tasks_ordering("asc")
+        first = paginate_keyset(Task.objects.all(), ordering, "", 5)
+        expected = [task.id for task in paginate_keyset(Task.objects.all(), ordering, first["next_cursor"], 5)["page_obj"]]
+
+        Task.objects.create(
+            priority=Task.Priority.LOW, is_done=False, deleted=False,
+            completion_time="2024-01-01T00:00:00Z", header="early", creator=self.admin,
+        )
+
+        second = paginate_keyset(Task.objects.all(), ordering, first["next_cursor"], 5)
+        self.assertEqual(expected, [task.id for task in second["page_obj"]])
+
+    def test_invalid_cursor(self):
+        ordering = tasks_ordering("desc")
+        first = paginate_keyset(Task.objects.all(), ordering, "", 5)
+        tampered = paginate_keyset(Task.objects.all(), ordering, first["next_cursor"][:-2] + "xx", 5)
+
+        self.assertEqual(list(first["page_obj"]), list(tampered["page_obj"]))
+        self.assertEqual(1, tampered["page_obj"].number)
+
+    def test_stable_cursor(self):
+        """Одна и та же позиция всегда кодируется одним курсором, иначе ключи кеша страниц не совпадут."""
+        ordering = tasks_ordering("desc")
+        first = paginate_keyset(Task.objects.all(), ordering, "", 5)
+        with mock.patch("time.time", return_value=time.time() + 60):
+            again = paginate_keyset(Task.objects.all(), ordering, "", 5)
+
+        self.assertEqual(first["next_cursor"], again["next_cursor"])
+        values = (datetime.datetime(2024, 10, 1, 12, tzinfo=datetime.timezone.utc), 1)
+        self.assertEqual(encode_cursor(values, NEXT, 2), encode_cursor(values, NEXT, 2))
+        self.assertEqual(cursor_digest(first["next_cursor"]), cursor_digest(again["next_cursor"]))
+        self.assertNotEqual(cursor_digest(first["next_cursor"]), cursor_digest(encode_cursor(values, NEXT, 2)))
+        self.assertEqual("", cursor_digest(first["next_cursor"][:-2] + "xx"))
+
+    def test_no_count_and_offset(self):
+        ordering = tasks_ordering("desc")
+        cursor = paginate_keyset(Task.objects.all(), ordering, "", 5)["next_cursor"]
+
+        with CaptureQueriesContext(connection) as queries:
+            data = paginate_keyset(Task.objects.all(), ordering, cursor, 5)
+
+        self.assertEqual(1, len(queries))
+        self.assertNotIn("OFFSET", queries[0]["sql"].upper())
+        self.assertNotIn("COUNT", queries[0]["sql"].upper())
+        self.assertIsNone(data["count"])
+
+    def test_last_page(self):
+        ordering = tasks_ordering("asc")
+        expected = list(Task.objects.order_by(*ordering).values_list("id", flat=True))
+        total = ListingCount(len(expected), is_exact=True)
+        first = add_total(paginate_keyset(Task.objects.all(), ordering, "", 8), total)
+        last = paginate_keyset(Task.objects.all(), ordering, first["last_cursor"], 8)
+
+        num_pages = -(-len(expected) // 8)
+        self.assertEqual(num_pages, first["num_pages"])
+        self.assertEqual(num_pages, last["page_obj"].number)
+        # На последней странице - остаток строк, а не последние 8
+        self.assertEqual(expected[(num_pages - 1) * 8:], [task.id for task in last["page_obj"]])
+        self.assertFalse(last["page_obj"].has_next())
+        self.assertTrue(last["page_obj"].has_previous())
+
+        # Назад от последней страницы - те же страницы и номера, что и вперёд от первой
+        pages, data = [], last
+        while True:
+            pages.insert(0, (data["page_obj"].number, [task.id for task in data["page_obj"]]))
+            if not data["previous_cursor"]:
+                break
+            data = paginate_keyset(Task.objects.all(), ordering, data["previous_cursor"], 8)
+        forward = self.walk(Task.objects.all(), ordering, 8)
+        self.assertEqual(list(enumerate(forward, start=1)), pages)
+
+    def test_last_page_estimate(self):
+        """При количестве по оценке остаток неизвестен: страницы от последней назад без номера."""
+        ordering = tasks_ordering("asc")
+        first = add_total(paginate_keyset(Task.objects.all(), ordering, "", 8), ListingCount(1000, is_exact=False))
+        last = paginate_keyset(Task.objects.all(), ordering, first["last_cursor"], 8)
+        previous = paginate_keyset(Task.objects.all(), ordering, last["previous_cursor"], 8)
+        following = paginate_keyset(Task.objects.all(), ordering, previous["next_cursor"], 8)
+
+        self.assertEqual(0, last["page_obj"].number)
+        self.assertEqual(0, previous["page_obj"].number)
+        self.assertEqual(list(last["page_obj"]), list(following["page_obj"]))
+        self.assertEqual(0, following["page_obj"].number)
+
+    def test_page_param_redirect(self):
+        """Старые ссылки `?page=N` ведут на первую страницу с теми же фильтрами."""
+        self.client.force_login(self.admin)
+        for name in ("tasks", "home", "calendar"):
+            with self.subTest(name=name):
+                url = reverse(name)
+                response = self.client.get(url, {"page": 3, "cursor": "x", "sort_order": "asc"})
+                self.assertRedirects(response, f"{url}?sort_order=asc", fetch_redirect_response=False)
+                self.assertRedirects(self.client.get(url, {"page": 2}), url, fetch_redirect_response=False)
+
+    def test_cached_pages(self):
+        request = RequestFactory().get("/")
+        request.user = self.admin
+
+        first = get_tasks(request, 1, 8, cursor="")
+        second = get_tasks(request, 1, 8, cursor=first["pagination_data"]["next_cursor"])
+
+        self.assertEqual(8, len(second["tasks"]))
+        self.assertTrue(second["tasks"].has_previous())
+        self.assertTrue(set(t.id for t in first["tasks"]).isdisjoint(t.id for t in second["tasks"]))
+
+        request.user = User.objects.get(username="kyle_shields")
+        first = get_objects(request, 1, 8, cursor="")
+        second = get_objects(request, 1, 8, cursor=first["pagination_data"]["next_cursor"])
+        self.assertEqual(
+            list(get_objects_list(request.user).values_list("id", flat=True)),
+            [obj.id for page in (first, second) for obj in page["objects_qs"]],
+        )
+        self.assertFalse(second["objects_qs"].has_next())
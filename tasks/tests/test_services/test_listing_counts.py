@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory
+
+from tasks.models import Task, Object, ObjectGroup
+from tasks.services import listing_counts
+from tasks.services.listing_counts import ListingCount, count_listing, estimated_count
+from tasks.services.objects import get_objects, objects_total
+from tasks.services.tasks_prepare import get_tasks, tasks_total
+from user.models import User
+
+
+class TestListingCounts(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.kyle = User.objects.get(username="kyle_shields")
+        for i in range(10):
+            self.create_task(is_done=i % 4 == 0)
+
+    def create_task(self, is_done=False) -> Task:
+        return Task.objects.create(
+            priority=Task.Priority.LOW,
+            is_done=is_done,
+            deleted=False,
+            completion_time="2024-10-01T12:00:00Z",
+            header="task",
+            creator=self.kyle,
+        )
+
+    def request(self, query: str = ""):
+        request = RequestFactory().get(f"/?{query}")
+        request.user = self.kyle
+        return request
+
+    def test_tasks_total(self):
+        self.assertEqual(ListingCount(7, is_exact=True), tasks_total(self.request()))
+        self.assertEqual(ListingCount(3, is_exact=True), tasks_total(self.request("show_done_task=true&show_active_task=false")))
+
+        with self.assertNumQueries(0):  # общая запись для всех страниц перечня
+            tasks_total(self.request())
+
+    def test_invalidated_with_listing(self):
+        self.assertEqual(7, tasks_total(self.request()).value)
+
+        self.create_task()
+        self.assertEqual(8, tasks_total(self.request()).value)
+
+        Object.objects.get(pk=11).groups.add(ObjectGroup.objects.get(pk=5))
+        self.assertEqual(12, objects_total(self.request()).value)
+
+    def test_pages_with_total(self):
+        result = get_tasks(self.request(), 1, 3, cursor="", with_total=True)
+
+        self.assertEqual(ListingCount(7, is_exact=True), result["pagination_data"]["count"])
+        self.assertEqual(3, result["pagination_data"]["num_pages"])
+        self.assertIsNotNone(result["pagination_data"]["last_cursor"])
+
+        objects = get_objects(self.request(), 1, 8, cursor="", with_total=True)
+        self.assertEqual(ListingCount(11, is_exact=True), objects["pagination_data"]["count"])
+
+    def test_estimate(self):
+        self.assertIsNone(estimated_count(Task.objects.all()))  # SQLite оценок не даёт
+
+        with mock.patch.object(listing_counts, "estimated_count", return_value=listing_counts.EXACT_COUNT_LIMIT):
+            self.assertEqual(
+                ListingCount(listing_counts.EXACT_COUNT_LIMIT, is_exact=False),
+                count_listing(Task.objects.all(), allow_estimate=True),
+            )
+            # С фильтрами считается точно
+            self.assertEqual(ListingCount(10, is_exact=True), count_listing(Task.objects.all()))
@@ -0,0 +1,115 @@
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+
+from tasks.models import Object, Task
+from tasks.services import object_hierarchy
+from tasks.services.objects import get_breadcrumbs
+from tasks.services.tasks_prepare import get_filtered_tasks
+from user.models import User
+
+
+class TestObjectHierarchy(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+
+    def descendants(self, obj_id):
+        return sorted(object_hierarchy.descendant_ids(obj_id).values_list("descendant_id", flat=True))
+
+    def ancestors(self, obj_id):
+        return [obj.id for obj in object_hierarchy.ancestors(obj_id)]
+
+    def test_loaded_fixture(self):
+        # noc-pc1 (7) в фикстуре идёт раньше своего родителя noc-room (8)
+        self.assertEqual({}, object_hierarchy.verify())
+        self.assertEqual([3, 4, 7, 8, 9, 10, 11], self.descendants(3))
+        self.assertEqual([3, 8], self.ancestors(7))
+
+    def test_single_queries(self):
+        with self.assertNumQueries(1):
+            self.assertEqual([3, 8], self.ancestors(9))
+        with self.assertNumQueries(1):
+            self.assertTrue(object_hierarchy.is_descendant(13, 5))
+
+    def test_move_subtree(self):
+        noc_room = Object.objects.get(pk=8)
+        noc_room.parent_id = 16
+        noc_room.save()
+
+        self.assertEqual({}, object_hierarchy.verify())
+        self.assertEqual([5, 16, 8], self.ancestors(7))
+        self.assertEqual([3, 4, 10, 11], self.descendants(3))
+
+        noc_room.parent = None
+        noc_room.save()
+        self.assertEqual([8], self.ancestors(7))
+        self.assertEqual({}, object_hierarchy.verify())
+
+    def test_create_and_delete(self):
+        obj = Object.objects.create(priority=Object.Priority.LOW, name="rack", slug="rack", parent_id=7)
+        self.assertEqual([3, 8, 7], self.ancestors(obj.id))
+
+        Object.objects.get(pk=8).delete()
+        self.assertEqual([7], self.ancestors(obj.id))
+        self.assertEqual([], self.ancestors(9))
+        self.assertEqual({}, object_hierarchy.verify())
+
+    def test_cycle(self):
+        building = Object.objects.get(pk=3)
+        building.parent_id = 9  # noc-pc2 - потомок building1
+        with self.assertNumQueries(1), self.assertRaises(ValidationError):
+            building.clean()
+
+        building.parent_id = 15
+        building.clean()
+
+    def test_rebuild(self):
+        Object.objects.filter(pk=8).update(parent=5)  # в обход сигналов
+        self.assertIn("missing", object_hierarchy.verify())
+
+        object_hierarchy.rebuild_all()
+        self.assertEqual({}, object_hierarchy.verify())
+        self.assertEqual([5, 8], self.ancestors(7))
+
+    def test_breadcrumbs(self):
+        kyle = User.objects.get(username="kyle_shields")  # группы Buildings и NOC
+        car = Object.objects.get(pk=10)
+        self.assertEqual(
+            [{"id": 3, "name": car.parent.parent.name, "slug": "building1"},
+             {"id": 4, "name": car.parent.name, "slug": "parking-building-1"}],
+            get_breadcrumbs(kyle, car),
+        )
+
+        # Недоступный предок - без ссылки
+        Object.objects.filter(pk=8).update(parent=15)
+        object_hierarchy.rebuild_all()
+        self.assertEqual([(15, None), (8, "noc-room")], [
+            (crumb["id"], crumb["slug"]) for crumb in get_breadcrumbs(kyle, Object.objects.get(pk=7))
+        ])
+
+    def test_subtree_tasks(self):
+        admin = User.objects.get(username="admin")
+        own, nested = (
+            Task.objects.create(
+                priority=Task.Priority.LOW, is_done=False, deleted=False, completion_time=timezone.now(),
+                header=header, creator=admin,
+            )
+            for header in ("room", "pc")
+        )
+        Object.objects.get(pk=8).tasks.add(own)
+        Object.objects.get(pk=7).tasks.add(nested)
+        Object.objects.get(pk=9).tasks.add(nested)  # задача на двух потомках - без повторов
+
+        request = RequestFactory().get("/", {"subtree": "true"})
+        request.user = admin
+        result = get_filtered_tasks(request, obj=Object.objects.get(pk=8))
+        self.assertEqual(sorted([own.id, nested.id]), sorted(task.id for task in result.tasks))
+        self.assertEqual(2, result.tasks_counters.available_tasks_count)
+
+        request = RequestFactory().get("/")
+        request.user = admin
+        result = get_filtered_tasks(request, obj=Object.objects.get(pk=8))
+        self.assertEqual([own.id], [task.id for task in result.tasks])
@@ -0,0 +1,92 @@
+from django.core.cache import cache
+from django.http import Http404
+from django.test import TestCase
+
+from tasks.models import Object, ObjectGroup, Task
+from tasks.services.object_visibility import visible_object_ids, can_view_object
+from tasks.services.objects import get_single_object, get_child_objects, get_objects_list
+from tasks.services.tree_nodes.tree_nodes import ObjectsTree
+from user.models import User
+
+
+class TestObjectVisibility(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.kyle = User.objects.get(username="kyle_shields")  # группы Buildings и NOC
+        self.chad = User.objects.get(username="chad_orr")  # группы Buildings и QA
+
+    def test_visible_ids(self):
+        ids = visible_object_ids(self.kyle)
+
+        self.assertEqual([3, 4, 5, 6, 7, 8, 9, 10, 12, 18, 19], list(ids))
+        self.assertTrue(can_view_object(self.kyle, 7))
+        self.assertFalse(can_view_object(self.kyle, 11))
+        self.assertEqual(list(ids), sorted(get_objects_list(self.kyle).values_list("id", flat=True)))
+
+    def test_subquery_in_sql(self):
+        """В SQL доступ - подзапросом по группам, а не списком id в параметрах запроса."""
+        through = Object.groups.through._meta.db_table
+        for qs in (get_objects_list(self.kyle), ObjectsTree({"user": self.kyle})._get_queryset()):
+            sql, params = qs.query.sql_with_params()
+            self.assertIn(through, sql)
+            self.assertLess(len(params), len(visible_object_ids(self.kyle)))
+
+    def test_shared_by_groups(self):
+        """Перечень строится один раз для пользователей с одинаковым набором групп."""
+        expected = list(visible_object_ids(self.kyle))
+        megan = User.objects.get(username="megan_horne")
+
+        with self.assertNumQueries(1):  # только группы пользователя для отпечатка
+            self.assertEqual(expected, list(visible_object_ids(megan)))
+
+    def test_invalidation(self):
+        self.assertFalse(can_view_object(self.kyle, 11))
+
+        # Изменение групп пользователя
+        ObjectGroup.objects.get(pk=6).users.add(self.kyle, through_defaults={"permission": "R"})
+        self.assertTrue(can_view_object(self.kyle, 11))
+
+        # Изменение состава группы
+        Object.objects.get(pk=15).groups.add(ObjectGroup.objects.get(pk=5))
+        self.assertTrue(can_view_object(self.kyle, 15))
+
+    def test_single_object_shared(self):
+        """Данные объекта кешируются один раз, доступ проверяется для каждого пользователя."""
+        self.assertEqual(12, get_single_object(self.kyle, "qa-room")["object"].id)
+
+        with self.assertRaises(Http404):
+            get_single_object(self.kyle, "qa-pc1")
+        self.assertEqual(13, get_single_object(self.chad, "qa-pc1")["object"].id)
+
+        with self.assertNumQueries(1):  # только группы пользователя для отпечатка
+            get_single_object(self.chad, "qa-room")
+
+    def test_child_objects_per_user(self):
+        parent = Object.objects.get(slug="qa-room")
+
+        self.assertEqual([14, 13], [card.id for card in get_child_objects(self.chad, parent)])
+        self.assertEqual([], get_child_objects(self.kyle, parent))
+
+    def test_child_objects_fresh(self):
+        """Перенесённый дочерний объект и количество задач видны сразу, без ожидания TTL записи."""
+        parent = Object.objects.get(slug="qa-room")
+        self.assertEqual([14, 13], [card.id for card in get_child_objects(self.chad, parent)])
+
+        moved = Object.objects.get(pk=11)
+        moved.parent = parent
+        moved.save()
+        task = Task.objects.create(
+            priority=Task.Priority.LOW,
+            is_done=False,
+            deleted=False,
+            completion_time="2024-10-01T12:00:00Z",
+            header="header",
+            creator=self.chad,
+        )
+        task.objects_set.add(Object.objects.get(pk=13))
+
+        children = get_child_objects(self.chad, parent)
+        self.assertEqual([14, 13, 11], [card.id for card in children])
+        self.assertEqual([0, 1, 0], [card.tasks_count for card in children])
@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from tasks.models import Task, Object, Engineer
+from tasks.services.objects import add_tasks_count_to_objects
+from tasks.services.tasks_prepare import permission_filter
+from user.models import User
+
+
+class TestObjectsTasksCount(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.noah = User.objects.get(username="noah_griffith")
+        self.kyle = User.objects.get(username="kyle_shields")
+        self.objects = list(Object.objects.filter(pk__in=range(3, 11)).order_by("id"))
+
+        for i, obj in enumerate(self.objects):
+            for j in range(i % 3 + 1):
+                task = Task.objects.create(
+                    priority=Task.Priority.LOW,
+                    is_done=j == 2,
+                    deleted=False,
+                    completion_time="2024-10-01T12:00:00Z",
+                    header=f"task {i}-{j}",
+                    creator=self.kyle if j else self.noah,
+                )
+                task.objects_set.add(obj)
+
+    def expected(self, user: User) -> list[int]:
+        return [permission_filter(user).filter(objects_set=obj, is_done=False).count() for obj in self.objects]
+
+    def counts(self, user: User) -> list[int]:
+        objects = add_tasks_count_to_objects(Object.objects.filter(pk__in=range(3, 11)).order_by("id"), user, "count")
+        return [obj.count for obj in objects]
+
+    def test_counts(self):
+        for user in (self.noah, self.kyle):
+            with self.subTest(user=user.username):
+                self.assertEqual(self.expected(user), self.counts(user))
+
+    def test_queries_do_not_depend_on_page_size(self):
+        self.counts(self.kyle)
+        cache.clear()
+
+        # Объекты страницы и один сгруппированный подсчёт
+        with self.assertNumQueries(2):
+            self.counts(self.kyle)
+
+        # Повторно счётчики берутся из кеша
+        with self.assertNumQueries(1):
+            self.counts(self.kyle)
+
+    def test_invalidation(self):
+        self.counts(self.kyle)
+
+        task = permission_filter(self.kyle).filter(objects_set=self.objects[1], is_done=False).first()
+        task.is_done = True
+        task.save()
+        Task.objects.get(header="task 2-0").objects_set.add(self.objects[0])
+
+        self.assertEqual(self.expected(self.kyle), self.counts(self.kyle))
+
+    def test_engineer_moved(self):
+        """Перевод подчинённого в другой отдел меняет счётчики начальника отдела."""
+        before = self.counts(self.noah)
+
+        engineer = Engineer.objects.get(user=self.kyle)
+        engineer.department_id = 2
+        engineer.save()
+
+        self.assertNotEqual(before, self.expected(self.noah))
+        self.assertEqual(self.expected(self.noah), self.counts(self.noah))
@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from tasks.models import Object, ObjectGroup
+from tasks.services.request_cache import start_request_cache, end_request_cache
+from tasks.services.tree_nodes import CachedObjectsTreeLevel, selected_objects_nodes
+from user.models import User
+
+
+class TestObjectsTreeLevel(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.kyle = User.objects.get(username="kyle_shields")  # объекты 3-10, 12, 18, 19
+
+    def level(self, user, parent=None):
+        return CachedObjectsTreeLevel({"user": user, "parent": parent}).get_cached_nodes()
+
+    def test_levels(self):
+        # У building-2 (5) есть недоступный secret2 (16), но ветку раскрывают доступные 6 и 12
+        self.assertEqual(
+            [(3, True), (5, True), (18, False), (19, False)],
+            [(node["id"], "children" in node) for node in self.level(self.kyle)],
+        )
+        self.assertIsNone(self.level(self.kyle)[0]["children"])
+        self.assertEqual([7, 9], [node["id"] for node in self.level(self.kyle, parent=8)])
+        self.assertEqual([], self.level(self.kyle, parent=15))
+
+    def test_cached_per_visibility_class(self):
+        self.level(self.kyle, parent=3)
+
+        megan = User.objects.get(username="megan_horne")  # те же группы, что у kyle
+        token = start_request_cache()
+        try:
+            with self.assertNumQueries(1):  # только группы пользователя для отпечатка
+                self.assertEqual([4, 8], [node["id"] for node in self.level(megan, parent=3)])
+        finally:
+            end_request_cache(token)
+
+    def test_invalidation(self):
+        self.assertNotIn("children", self.level(self.kyle)[2])
+
+        rack = Object.objects.create(priority=Object.Priority.LOW, name="rack", slug="rack", parent_id=18)
+        rack.groups.add(ObjectGroup.objects.get(pk=5))
+
+        self.assertIsNone(self.level(self.kyle)[2]["children"])
+        self.assertEqual([rack.id], [node["id"] for node in self.level(self.kyle, parent=18)])
+
+    def test_selected_nodes(self):
+        self.assertEqual(
+            [{"id": 7, "label": Object.objects.get(pk=7).name}],
+            selected_objects_nodes(self.kyle, ["7", "11", "x"]),
+        )
+
+    def test_view(self):
+        self.client.force_login(self.kyle)
+
+        response = self.client.get(reverse("ajax-objects-tree"), {"parent": 3})
+        self.assertEqual([4, 8], [node["id"] for node in response.json()["nodes"]])
+
+        response = self.client.get(reverse("ajax-objects-tree"))
+        self.assertEqual([3, 5, 18, 19], [node["id"] for node in response.json()["nodes"]])
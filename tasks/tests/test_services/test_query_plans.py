@@ -0,0 +1,186 @@
+import datetime
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, RequestFactory
+
+from tasks.filters import TaskFilter
+from tasks.models import Task, Engineer, Department, Notification, Object, ObjectGroup, Tag, UserObjectGroup
+from tasks.services.objects import get_objects_list
+from tasks.services.service import day_range
+from tasks.services.task_visibility import rebuild_all
+from tasks.services.tasks_prepare import permission_filter
+from tasks.services.tree_nodes import ObjectsTree, ObjectsTagsTree, TasksTagsTree
+from user.models import User
+
+# Полный просмотр таблицы допустим, пока в ней не больше строк, чем здесь
+SEQ_SCAN_ROW_THRESHOLD = 300
+
+_SQLITE_SCAN = re.compile(r"\bSCAN (?:TABLE )?(\w+)")
+_POSTGRES_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def full_scans(queryset) -> list[str]:
+    """
+    Таблицы, которые план запроса просматривает целиком.
+
+    На Postgres последовательный просмотр выключается для запроса, поэтому в плане он
+    остаётся только там, где подходящего индекса нет. SQLite без собранной статистики
+    (ANALYZE) и так выбирает индекс, если он подходит.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        pattern = _POSTGRES_SCAN
+    else:
+        pattern = _SQLITE_SCAN
+
+    plan = queryset.explain()
+    aliases = _table_aliases(str(queryset.query))
+    tables = {aliases.get(name, name) for name in pattern.findall(plan)}
+    return sorted(table for table in tables if table in aliases.values() and _rows(table) > SEQ_SCAN_ROW_THRESHOLD)
+
+
+def _table_aliases(sql: str) -> dict[str, str]:
+    # Django даёт таблицам в подзапросах и повторных соединениях псевдонимы (U0, T3 и т.д.)
+    aliases = {}
+    for table, alias in re.findall(r'"(\w+)"(?: (?:AS )?"?(\w+)"?)?', sql):
+        aliases.setdefault(table, table)
+        if alias and alias not in ("ON", "WHERE", "INNER", "LEFT", "ORDER", "GROUP", "AND", "OR"):
+            aliases[alias] = table
+    return aliases
+
+
+def _rows(table: str) -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+        return cursor.fetchone()[0]
+
+
+class TestQueryPlans(TestCase):
+    """
+    Планы горячих запросов не должны просматривать большие таблицы целиком.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        departments = Department.objects.bulk_create([Department(name=f"dep_{i}") for i in range(10)])
+        users = User.objects.bulk_create([User(username=f"user_{i}") for i in range(110)])
+        engineers = Engineer.objects.bulk_create([
+            Engineer(
+                first_name="engineer",
+                second_name=str(i),
+                user=user,
+                department=departments[i % 10] if i % 5 else None,
+                head_of_department=i < 10,
+            )
+            for i, user in enumerate(users[:100])
+        ])
+        cls.head, cls.engineer, cls.no_engineer = users[1], users[11], users[105]
+
+        now = datetime.datetime(2024, 10, 1, 12, tzinfo=datetime.timezone.utc)
+        tasks = Task.objects.bulk_create([
+            Task(
+                priority=Task.Priority.LOW,
+                is_done=i % 3 == 0,
+                deleted=i % 20 == 0,
+                completion_time=now + datetime.timedelta(hours=i),
+                header=f"task {i}",
+                creator=users[i % len(users)],
+            )
+            for i in range(1500)
+        ])
+        Task.engineers.through.objects.bulk_create([
+            Task.engineers.through(task_id=task.id, engineer_id=engineers[(i * 7 + shift) % 100].id)
+            for i, task in enumerate(tasks) for shift in range(2)
+        ])
+        Task.departments.through.objects.bulk_create([
+            Task.departments.through(task_id=task.id, department_id=departments[i % 10].id)
+            for i, task in enumerate(tasks) if i % 4 == 0
+        ])
+        rebuild_all()
+
+        tags = Tag.objects.bulk_create([Tag(tag_name=f"tag_{i}") for i in range(20)])
+        groups = ObjectGroup.objects.bulk_create([ObjectGroup(name=f"group_{i}") for i in range(20)])
+        objects = Object.objects.bulk_create([
+            Object(priority=Object.Priority.LOW, name=f"object {i}", slug=f"object-{i}") for i in range(600)
+        ])
+        Object.groups.through.objects.bulk_create([
+            Object.groups.through(object_id=obj.id, objectgroup_id=groups[i % 20].id) for i, obj in enumerate(objects)
+        ])
+        Object.tags.through.objects.bulk_create([
+            Object.tags.through(object_id=obj.id, tag_id=tags[i % 20].id) for i, obj in enumerate(objects)
+        ])
+        groups[0].users.add(cls.engineer, through_defaults={"permission": "R"})
+
+        Notification.objects.bulk_create([
+            Notification(user=users[i % len(users)], task=tasks[i], is_read=i % 2 == 0) for i in range(1500)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNoFullScans(self, queryset):
+        self.assertEqual([], full_scans(queryset), queryset.explain())
+
+    def task_filter_qs(self, user, query: str):
+        request = RequestFactory().get("/", QueryDict(query))
+        request.user = user
+        return TaskFilter(request.GET, queryset=permission_filter(user), request=request).qs
+
+    def test_detects_full_scan(self):
+        self.assertEqual(["object_tasks"], full_scans(Task.objects.filter(header="task 1")))
+        self.assertEqual([], full_scans(Tag.objects.filter(tag_name__startswith="tag")))  # таблица меньше порога
+
+    def test_tasks_list(self):
+        for user in (self.head, self.engineer, self.no_engineer):
+            with self.subTest(user=user.username):
+                self.assertNoFullScans(self.task_filter_qs(user, ""))
+
+    def test_visible_to(self):
+        """Обратные индексы связующих таблиц: задачи инженера и отдела."""
+        for user in (self.head, self.engineer, self.no_engineer):
+            with self.subTest(user=user.username):
+                self.assertNoFullScans(Task.objects.visible_to(user))
+
+    def test_tasks_counters(self):
+        tasks = permission_filter(self.engineer)
+        today_start, today_end = day_range(datetime.date(2024, 10, 5))
+
+        self.assertNoFullScans(tasks.filter(is_done=False))
+        self.assertNoFullScans(tasks.filter(engineers=self.engineer.engineer))
+        self.assertNoFullScans(tasks.filter(completion_time__gte=today_start, completion_time__lt=today_end))
+
+    def test_tasks_filters(self):
+        engineer = self.engineer.engineer
+        for query in (
+            "completion_time_after=2024-10-03&completion_time_before=2024-10-04",
+            f"engineers=eng_{engineer.id}",
+            f"engineers=dep_{engineer.department_id}",
+        ):
+            with self.subTest(query=query):
+                self.assertNoFullScans(self.task_filter_qs(self.engineer, query))
+
+    def test_due_today_range(self):
+        """Диапазон по сроку выполнения идёт по индексу даже без видимости, в отличие от `__date`."""
+        today_start, today_end = day_range(datetime.date(2024, 10, 5))
+        self.assertNoFullScans(
+            Task.objects.filter(deleted=False, is_done=False, completion_time__gte=today_start,
+                                completion_time__lt=today_end)
+        )
+
+    def test_objects_list(self):
+        group_ids = UserObjectGroup.objects.filter(user=self.engineer).values("group_id")
+        self.assertNoFullScans(Object.groups.through.objects.filter(objectgroup_id__in=group_ids))
+        self.assertNoFullScans(get_objects_list(self.engineer))
+
+    def test_notifications(self):
+        self.assertNoFullScans(Notification.objects.filter(user=self.engineer, is_read=False))
+
+    def test_trees(self):
+        context = {"user": self.engineer}
+        self.assertNoFullScans(ObjectsTree(context)._get_queryset())
+        self.assertNoFullScans(ObjectsTagsTree(context)._get_queryset())
+        self.assertNoFullScans(TasksTagsTree(context)._get_queryset())
@@ -0,0 +1,54 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from tasks.services.cache_version import CacheVersion
+from tasks.services.request_cache import memoize, start_request_cache, end_request_cache, get_request_cache
+
+
+class TestRequestCache(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.token = start_request_cache()
+
+    def tearDown(self):
+        end_request_cache(self.token)
+
+    def test_memoize(self):
+        """Значение вычисляется один раз за запрос, повторные обращения считаются сэкономленными."""
+        getter = mock.Mock(return_value=42)
+
+        for _ in range(3):
+            self.assertEqual(42, memoize("key", getter))
+
+        getter.assert_called_once()
+        self.assertEqual(2, get_request_cache().saved_round_trips)
+
+    def test_memoize_without_request(self):
+        """Вне запроса значение вычисляется при каждом обращении."""
+        end_request_cache(self.token)
+        getter = mock.Mock(return_value=42)
+
+        memoize("key", getter)
+        memoize("key", getter)
+
+        self.assertEqual(2, getter.call_count)
+        self.token = start_request_cache()
+
+    def test_versions_read_once(self):
+        """Версии кеша читаются из Redis один раз за запрос."""
+        CacheVersion.get_many("first", "second")
+
+        with mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+            CacheVersion("first").get_cache_version()
+            CacheVersion.get_many("first", "second")
+            get_many.assert_not_called()
+
+    def test_increment_updates_memo(self):
+        """После инкремента в рамках запроса видна новая версия."""
+        CacheVersion("first").get_cache_version()
+        CacheVersion("first").increment_cache_version()
+
+        self.assertEqual(2, CacheVersion("first").get_cache_version())
@@ -0,0 +1,82 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, RequestFactory
+
+from tasks.filters import TaskFilter, ObjectFilter
+from tasks.models import Task, Object, SearchDocument
+from tasks.services.search import html_to_text, search, ranked, search_filter
+from user.models import User
+
+
+class TestSearch(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        self.admin = User.objects.get(username="admin")
+        self.server = self.create_task("Замена сервера", "<p>Сервер в стойке <b>3</b>&nbsp;не отвечает</p>")
+        self.switch = self.create_task("Коммутатор", '<p class="сервер">Перезагрузить коммутатор</p>')
+        self.both = self.create_task("Сервер и коммутатор", "<p>Сервер, сервер, коммутатор</p>")
+
+    def create_task(self, header: str, text: str) -> Task:
+        return Task.objects.create(
+            priority=Task.Priority.LOW,
+            is_done=False,
+            deleted=False,
+            completion_time="2024-10-01T12:00:00Z",
+            header=header,
+            text=text,
+            creator=self.admin,
+        )
+
+    def found(self, query: str) -> set[int]:
+        return set(search_filter(Task.objects.all(), SearchDocument.Kind.TASK, query).values_list("id", flat=True))
+
+    def test_plain_text_document(self):
+        self.assertEqual("Сервер в стойке 3 не отвечает", html_to_text(self.server.text))
+        self.assertEqual(
+            "Замена сервера Сервер в стойке 3 не отвечает",
+            SearchDocument.objects.get(kind="task", ref_id=self.server.id).body,
+        )
+
+    def test_no_matches_in_markup(self):
+        # "сервер" есть в атрибуте class второй задачи, но не в тексте
+        self.assertEqual({self.server.id, self.both.id}, self.found("сервер"))
+        self.assertEqual(set(), self.found("stойке class"))
+        self.assertEqual({self.both.id}, self.found("серв КОММУТ"))  # все слова, по началу слова
+
+    def test_ranked(self):
+        hits = search(SearchDocument.Kind.TASK, "сервер")
+
+        self.assertEqual([self.both.id, self.server.id], [hit.id for hit in hits])
+        self.assertGreater(hits[0].rank, hits[1].rank)
+        self.assertEqual([self.server], ranked(Task.objects.exclude(pk=self.both.pk), SearchDocument.Kind.TASK, "сервер"))
+
+    def test_signals(self):
+        self.switch.header = "Маршрутизатор"
+        self.switch.save()
+        self.assertEqual({self.switch.id}, self.found("маршрут"))
+
+        self.switch.delete()
+        self.assertEqual(set(), self.found("маршрут"))
+        self.assertFalse(SearchDocument.objects.filter(kind="task", ref_id=self.switch.id).exists())
+
+    def test_filters(self):
+        request = RequestFactory().get("/", {"search": "сервер"})
+        request.user = self.admin
+        tasks = TaskFilter(request.GET, queryset=Task.objects.all(), request=request).qs
+
+        self.assertEqual({self.server.id, self.both.id}, set(tasks.values_list("id", flat=True)))
+        names = ObjectFilter({"search": "qa"}, queryset=Object.objects.all()).qs.values_list("name", flat=True)
+        self.assertTrue(names)
+        self.assertTrue(all("qa" in name.lower() for name in names))
+
+    def test_rebuild_command(self):
+        SearchDocument.objects.all().delete()
+        self.assertEqual(set(), self.found("сервер"))
+
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+
+        self.assertEqual({self.server.id, self.both.id}, self.found("сервер"))
+        self.assertIn(str(Task.objects.count() + Object.objects.count()), out.getvalue())
@@ -0,0 +1,160 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from tasks.management.commands.benchmark_task_visibility import baseline_queryset
+from tasks.models import Task, TaskVisibility, Engineer, Department
+from tasks.services.task_visibility import verify, reference_queryset
+from tasks.services.tasks_prepare import permission_filter
+from user.models import User
+
+
+def create_task(creator: User) -> Task:
+    return Task.objects.create(
+        priority=Task.Priority.HIGH,
+        is_done=False,
+        deleted=False,
+        completion_time="2024-10-01T12:00:00Z",
+        header="header",
+        creator=creator,
+    )
+
+
+class TestTaskVisibility(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        self.noah = User.objects.get(username="noah_griffith")  # руководитель NOC
+        self.kyle = User.objects.get(username="kyle_shields")  # инженер NOC
+        self.chad = User.objects.get(username="chad_orr")  # руководитель QA
+        self.empty_user = User.objects.get(username="empty_user")  # без инженера
+
+    def visible(self, user: User) -> set[int]:
+        return set(permission_filter(user).values_list("id", flat=True))
+
+    def test_creator_and_heads(self):
+        task = create_task(self.kyle)
+
+        self.assertEqual({task.id}, self.visible(self.kyle))
+        self.assertEqual({task.id}, self.visible(self.noah))  # создана подчинённым
+        self.assertEqual(set(), self.visible(self.chad))
+        self.assertEqual({}, verify())
+
+    def test_m2m_changes(self):
+        task = create_task(self.empty_user)
+        self.assertEqual(set(), self.visible(self.chad))
+
+        task.engineers.add(Engineer.objects.get(pk=4))  # инженер QA без пользователя
+        self.assertEqual({task.id}, self.visible(self.chad))
+
+        task.departments.add(Department.objects.get(pk=1))
+        self.assertEqual({task.id}, self.visible(self.kyle))
+
+        task.engineers.clear()
+        Department.objects.get(pk=1).tasks.clear()
+        self.assertEqual(set(), self.visible(self.chad))
+        self.assertEqual(set(), self.visible(self.kyle))
+        self.assertEqual({}, verify())
+
+    def test_engineer_department_change(self):
+        task = create_task(self.kyle)
+        task.engineers.add(self.kyle.engineer)
+        self.assertEqual({task.id}, self.visible(self.noah))
+
+        engineer = self.kyle.engineer
+        engineer.department_id = 2
+        engineer.save()
+
+        self.assertEqual(set(), self.visible(self.noah))
+        self.assertEqual({task.id}, self.visible(self.chad))
+        self.assertEqual({}, verify())
+
+    def test_department_delete(self):
+        task = create_task(self.empty_user)
+        task.departments.add(Department.objects.get(pk=1))
+        self.assertEqual({task.id}, self.visible(self.kyle))
+
+        Department.objects.get(pk=1).delete()
+
+        self.assertEqual(set(), self.visible(self.kyle))
+        self.assertEqual({}, verify())
+
+    def test_table_matches_reference(self):
+        tasks = [create_task(creator) for creator in (self.kyle, self.chad, self.empty_user)]
+        tasks[1].engineers.add(self.kyle.engineer)
+        tasks[2].departments.add(Department.objects.get(pk=2))
+
+        for user in (self.noah, self.kyle, self.chad, self.empty_user):
+            with self.subTest(user=user.username):
+                expected = set(reference_queryset(user).values_list("id", flat=True))
+                self.assertEqual(expected, self.visible(user))
+
+    def test_single_join(self):
+        task = create_task(self.kyle)
+        task.engineers.add(self.kyle.engineer)
+        task.departments.add(Department.objects.get(pk=1))
+
+        sql = str(permission_filter(self.noah).query).upper()
+        self.assertNotIn("DISTINCT", sql)
+        self.assertEqual(1, sql.count("JOIN"))
+        self.assertEqual(1, permission_filter(self.noah).count())
+
+    def test_rebuild_command(self):
+        task = create_task(self.kyle)
+        TaskVisibility.objects.all().delete()  # как после изменений в обход сигналов
+        self.assertEqual(set(), self.visible(self.kyle))
+
+        out = StringIO()
+        call_command("rebuild_task_visibility", stdout=out)
+
+        self.assertEqual({task.id}, self.visible(self.kyle))
+        self.assertIn("совпадает", out.getvalue())
+
+
+class TestVisibleTo(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        admin = User.objects.get(username="admin")
+        kyle = User.objects.get(username="kyle_shields")
+        megan = User.objects.get(username="megan_horne")
+        chad = User.objects.get(username="chad_orr")
+        Engineer.objects.filter(user=megan).update(department=None)
+
+        # Задачи на все правила видимости: создатель, исполнитель, отдел, подчинённые
+        tasks = [create_task(creator) for creator in (admin, kyle, megan, chad, admin, admin)]
+        tasks[4].engineers.add(kyle.engineer, megan.engineer, Engineer.objects.get(pk=4))
+        tasks[5].departments.add(Department.objects.get(pk=1), Department.objects.get(pk=2))
+        tasks[0].deleted = True
+        tasks[0].save()
+
+        self.users = {
+            "head": User.objects.get(username="noah_griffith"),
+            "engineer": kyle,
+            "engineer_no_dep": megan,
+            "no_engineer": User.objects.get(username="empty_user"),
+        }
+
+    def test_equivalent_to_baseline(self):
+        """visible_to даёт те же задачи, что и прежний OR + DISTINCT из permission_filter."""
+        for role, user in self.users.items():
+            with self.subTest(role=role):
+                user.refresh_from_db()
+                expected = list(baseline_queryset(user).order_by("id").values_list("id", flat=True))
+                actual = list(Task.objects.visible_to(user).order_by("id").values_list("id", flat=True))
+                self.assertEqual(expected, actual)
+                self.assertEqual(len(expected), Task.objects.visible_to(user).count())
+
+    def test_no_distinct(self):
+        for user in self.users.values():
+            self.assertNotIn("DISTINCT", str(Task.objects.visible_to(user).query).upper())
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_task_visibility", tasks=300, engineers=40, departments=4, repeat=1, stdout=out)
+
+        report = out.getvalue()
+        for role in self.users:
+            self.assertIn(role, report)
+        self.assertIn("совпадают", report)
@@ -0,0 +1,62 @@
+import datetime
+
+from django.http import QueryDict
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+
+from tasks.filters import TaskFilter
+from tasks.models import Task, Tag
+from tasks.services.tasks_prepare import get_tasks_count, permission_filter, TasksCounter
+from user.models import User
+
+
+class TestTasksCounters(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        self.noah = User.objects.get(username="noah_griffith")
+        self.kyle = User.objects.get(username="kyle_shields")
+        self.tag = Tag.objects.create(tag_name="tag")
+
+        today = timezone.localtime().replace(hour=12)
+        for i in range(12):
+            task = Task.objects.create(
+                priority=Task.Priority.LOW,
+                is_done=i % 3 == 0,
+                deleted=i == 11,
+                completion_time=today + datetime.timedelta(days=i % 2),
+                header=f"task {i}",
+                creator=self.kyle,
+            )
+            if i % 2:
+                task.engineers.add(self.noah.engineer)
+            if i % 4 == 0:
+                task.tags.add(self.tag)
+
+    def expected(self, filtered, engineer, available) -> TasksCounter:
+        today = timezone.localdate()
+        return TasksCounter(
+            done_count=filtered.filter(is_done=True).count(),
+            not_done_count=filtered.filter(is_done=False).count(),
+            tasks_due_today_count=sum(
+                1 for task in filtered.filter(is_done=False)
+                if timezone.localtime(task.completion_time).date() == today
+            ),
+            my_tasks_count=filtered.filter(engineers=engineer).count(),
+            available_tasks_count=available.count(),
+        )
+
+    def test_single_query(self):
+        for query in ("", f"tags={self.tag.id}", "show_my_tasks_only=true"):
+            with self.subTest(query=query):
+                request = RequestFactory().get("/", QueryDict(query))
+                request.user = self.noah
+                available = permission_filter(self.noah)
+                filtered = TaskFilter(request.GET, queryset=available, request=request).qs
+                engineer = self.noah.engineer
+
+                with self.assertNumQueries(1):
+                    counters = get_tasks_count(filtered, engineer, available)
+
+                self.assertEqual(self.expected(filtered, engineer, available), counters)
+                self.assertEqual(11, counters.available_tasks_count)
@@ -0,0 +1,84 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from tasks.filters import get_fields_for_filter
+from tasks.models import Tag
+from tasks.services import tree_json
+from tasks.services.tree_json import TAGS, OBJECTS, GROUPS
+from tasks.services.tree_nodes import CachedAllTagsTree, TreePayload
+from user.models import User
+
+
+class TestTreeJson(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+        self.kyle = User.objects.get(username="kyle_shields")  # объекты 3-10, 12, 18, 19
+        self.client.force_login(self.kyle)
+
+    def get(self, url, **headers):
+        return self.client.get(url, headers=headers)
+
+    def test_payload(self):
+        payload = CachedAllTagsTree({}).get_cached_payload()
+
+        nodes = [{"id": tag.id, "label": tag.tag_name} for tag in Tag.objects.all()]
+        # Компактный JSON без пробелов и экранирования кириллицы
+        self.assertEqual(json.dumps(nodes, ensure_ascii=False, separators=(",", ":")).encode(), payload.data)
+        self.assertEqual(TreePayload.from_nodes(nodes).etag, payload.etag)
+        with mock.patch("tasks.services.tree_nodes.base.orjson", None):  # без orjson - тот же результат
+            self.assertEqual(payload, TreePayload.from_nodes(nodes))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(nodes, CachedAllTagsTree({}).get_cached_nodes())
+
+        Tag.objects.create(tag_name="new_tag")
+        self.assertNotEqual(payload.etag, CachedAllTagsTree({}).get_cached_payload().etag)
+
+    def test_versioned_url(self):
+        url = tree_json.tree_url(self.kyle, OBJECTS)
+        response = self.get(url)
+
+        self.assertEqual([3, 5, 18, 19], [node["id"] for node in response.json()])
+        self.assertEqual(f'"{url.rsplit("/", 1)[1].removesuffix(".json")}"', response["ETag"])
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("private", response["Cache-Control"])
+
+        self.assertEqual(304, self.get(url, if_none_match=response["ETag"]).status_code)
+
+        # Устаревший адрес - актуальное дерево без долгого кеширования
+        stale = reverse("tree-json", kwargs={"kind": TAGS, "etag": "0" * 16})
+        response = self.get(stale)
+        self.assertEqual(200, response.status_code)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        self.assertEqual(404, self.get(reverse("tree-json", kwargs={"kind": "users", "etag": "x"})).status_code)
+
+    def test_per_user(self):
+        admin = User.objects.get(username="admin")
+        self.assertNotEqual(tree_json.tree_url(self.kyle, GROUPS), tree_json.tree_url(admin, GROUPS))
+        self.assertEqual(tree_json.tree_url(self.kyle, TAGS), tree_json.tree_url(admin, TAGS))
+
+        self.client.logout()
+        self.assertEqual(302, self.get(tree_json.tree_url(self.kyle, GROUPS)).status_code)
+
+    def test_filter_fields(self):
+        fields = get_fields_for_filter(self.kyle, "tasks")
+
+        self.assertEqual(tree_json.tree_url(self.kyle, OBJECTS), fields["objects_url"])
+        self.assertNotIn("objects_json", fields)
+
+    def test_objects_level_etag(self):
+        response = self.client.get(reverse("ajax-objects-tree"), {"parent": 3})
+        self.assertEqual([4, 8], [node["id"] for node in response.json()["nodes"]])
+        self.assertIn("no-cache", response["Cache-Control"])
+
+        response = self.client.get(reverse("ajax-objects-tree"), {"parent": 3}, headers={
+            "if-none-match": response["ETag"]
+        })
+        self.assertEqual(304, response.status_code)
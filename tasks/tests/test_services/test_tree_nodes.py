@@ -1,5 +1,6 @@
 import re
 
+from django.core.cache import cache
 from django.test import TestCase
 
 from tasks.models import Object, ObjectGroup, UserObjectGroup, Engineer, Tag
@@ -18,6 +19,10 @@ def find_all_ids_in_tree(nodes) -> list[int]:
 class TestObjectsTree(TestCase):
     fixtures = ["tasks/tests/fixtures/v1.json"]
 
+    def setUp(self):
+        # Перечни доступных объектов кешируются, а откат транзакции теста кеш не откатывает
+        cache.clear()
+
     def test_empty_user(self):
         """Пользователь без групп не видит перечень объектов."""
         user = User.objects.get(username="empty_user")
@@ -254,6 +259,10 @@ class TestGroupsTree(TestCase):
 class TestObjectsTagsTree(TestCase):
     fixtures = ["tasks/tests/fixtures/v1.json"]
 
+    def setUp(self):
+        # Перечни доступных объектов кешируются, а откат транзакции теста кеш не откатывает
+        cache.clear()
+
     def test_empty_user(self):
         """Пользователь без групп не видит перечень групп объектов."""
         user = User.objects.get(username="empty_user")
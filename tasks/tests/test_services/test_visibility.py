@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory
+
+from tasks.models import ObjectGroup
+from tasks.services.objects import get_objects
+from tasks.services.visibility import objects_tree_fingerprint, tasks_fingerprint, objects_page_fingerprint
+from user.models import User
+
+
+class TestVisibilityFingerprint(TestCase):
+    fixtures = ["tasks/tests/fixtures/v1.json"]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_same_groups(self):
+        """У пользователей с одинаковыми группами одинаковый отпечаток деревьев объектов."""
+        kyle = User.objects.get(username="kyle_shields")
+        megan = User.objects.get(username="megan_horne")
+        chad = User.objects.get(username="chad_orr")
+
+        self.assertEqual(objects_tree_fingerprint(kyle), objects_tree_fingerprint(megan))
+        self.assertNotEqual(objects_tree_fingerprint(kyle), objects_tree_fingerprint(chad))
+
+    def test_group_change(self):
+        kyle = User.objects.get(username="kyle_shields")
+        before = objects_tree_fingerprint(kyle)
+
+        ObjectGroup.objects.get(pk=6).users.add(kyle)
+
+        self.assertNotEqual(before, objects_tree_fingerprint(kyle))
+
+    def test_superusers(self):
+        """Суперпользователи без инженера делят записи задач и деревьев."""
+        admin = User.objects.get(username="admin")
+        other_admin = User.objects.create(username="other_admin", is_superuser=True)
+
+        self.assertEqual(tasks_fingerprint(admin), tasks_fingerprint(other_admin))
+        self.assertEqual(objects_tree_fingerprint(admin), objects_tree_fingerprint(other_admin))
+        self.assertNotEqual(tasks_fingerprint(admin), tasks_fingerprint(User.objects.get(username="kyle_shields")))
+
+    def test_shared_objects_page(self):
+        """Страница объектов строится один раз для пользователей с одинаковой видимостью."""
+        admin = User.objects.get(username="admin")
+        other_admin = User.objects.create(username="other_admin", is_superuser=True)
+        self.assertEqual(objects_page_fingerprint(admin), objects_page_fingerprint(other_admin))
+
+        request = RequestFactory().get("/objects/")
+        request.user = admin
+        get_objects(request, 1, 8)
+
+        request.user = other_admin
+        with self.assertNumQueries(1):  # только группы пользователя для отпечатка
+            get_objects(request, 1, 8)
@@ -1,29 +1,55 @@
-from urllib.parse import urlencode
-
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import get_object_or_404, render
+from django.db.models import F
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 
-from tasks.services.objects import get_objects, get_single_object, get_child_objects
-from tasks.services.tasks_prepare import get_tasks
-from tasks.services.tree_nodes import GroupsTree
+from tasks.services.objects import get_objects, get_single_object, get_child_objects, get_breadcrumbs
+from tasks.services.tasks_prepare import get_tasks, with_subtree
+from tasks.services.tree_json import payload_response
+from tasks.services.tree_nodes import CachedObjectsTreeLevel
 from .filters import ObjectFilter, get_current_filter_params, get_fields_for_filter, TaskFilter, filter_url, \
     applied_filters_count
 from .forms import CKEditorEditForm, CKEditorCreateForm, CKEditorEditObjForm, CKEditorCreateObjForm, CKEditorAnswerForm
 from .models import Object, Task
+from .services.cache_version import (
+    CacheVersion,
+    TASKS_PAGE_VERSION,
+    OBJECTS_PAGE_VERSION,
+    FILTER_TASKS_VERSION,
+    FILTER_OBJECTS_VERSION,
+)
 from .services.statistics import get_stat
-from .services.tree_nodes.tree_nodes import AllTagsTree
+
+
+def drop_page_param(request):
+    """
+    Перечни листаются по курсору (`?cursor=`), номер страницы `?page=` не поддерживается.
+    Старые ссылки с ним перенаправляются на первую страницу с теми же фильтрами, а не
+    показывают её молча под чужим адресом. None - параметра нет.
+    """
+    if "page" not in request.GET:
+        return None
+    params = request.GET.copy()
+    params.pop("page")
+    params.pop("cursor", None)
+    return redirect(f"{request.path}?{params.urlencode()}" if params else request.path)
 
 
 @login_required
 def get_home(request):
-    page_number = request.GET.get("page", 1)
+    if response := drop_page_param(request):
+        return response
+
+    page_number = 1
     per_page = request.GET.get("per_page", 8)
-    filter_params = urlencode({key: value for key, value in request.GET.items() if key not in ["page"]})
+    cursor = request.GET.get("cursor", "")  # постраничный вывод по ключу сортировки, "" - первая страница
 
-    objects = get_objects(request, filter_params, page_number, per_page)
+    # Все версии кеша, нужные странице, получаем одним запросом
+    versions = CacheVersion.get_many(OBJECTS_PAGE_VERSION, FILTER_OBJECTS_VERSION)
 
-    filter_fields_items = get_fields_for_filter(request.user, "objects")
+    objects = get_objects(request, page_number, per_page, versions=versions, cursor=cursor, with_total=True)
+
+    filter_fields_items = get_fields_for_filter(request.user, "objects", versions=versions)
 
     current_filter_params = get_current_filter_params(request, "objects")
 
@@ -43,17 +69,23 @@ def get_home(request):
 
 @login_required
 def get_object_page(request, object_slug):
-    page_number = request.GET.get("page", 1)
+    if response := drop_page_param(request):
+        return response
+
+    page_number = 1
     per_page = request.GET.get("per_page", 8)
+    cursor = request.GET.get("cursor", "")
 
-    filter_params = urlencode({key: value for key, value in request.GET.items() if key not in ["page"]})
+    versions = CacheVersion.get_many(TASKS_PAGE_VERSION, FILTER_TASKS_VERSION)
 
     obj = get_single_object(request.user, object_slug)  # Получаем объект
-    child_objects = get_child_objects(user=request.user, parent=obj["object"])
+    child_objects = get_child_objects(user=request.user, parent=obj["object"], versions=versions)
 
-    tasks = get_tasks(request, filter_params, page_number, per_page, obj=obj["object"])
+    tasks = get_tasks(
+        request, page_number, per_page, obj=obj["object"], versions=versions, cursor=cursor, with_total=True
+    )
 
-    fields = get_fields_for_filter(user=request.user, page="tasks")
+    fields = get_fields_for_filter(user=request.user, page="tasks", versions=versions)
     ckeditor = CKEditorCreateForm(request.POST)
 
     context = {
@@ -61,6 +93,8 @@ def get_object_page(request, object_slug):
         **tasks,
         **fields,
         "child_objects": child_objects,
+        "breadcrumbs": get_breadcrumbs(request.user, obj["object"]),
+        "subtree": with_subtree(request),
         "ckeditor": ckeditor,
         "filter_data": filter_url(request, obj=obj["object"]),  # Передаем объект в filter_url
     }
@@ -70,19 +104,23 @@ def get_object_page(request, object_slug):
 
 @login_required
 def get_tasks_page(request):
-    page_number = request.GET.get("page", 1)
+    if response := drop_page_param(request):
+        return response
+
+    page_number = 1
     per_page = request.GET.get("per_page", 8)
+    cursor = request.GET.get("cursor", "")
     obj_id = request.GET.get("object_id")  # Получаем объект из запроса, если есть
     obj = None
 
     if obj_id:
         obj = get_object_or_404(Object, id=obj_id)  # Получаем объект по ID
 
-    filter_params = urlencode({key: value for key, value in request.GET.items() if key not in ["page"]})
+    versions = CacheVersion.get_many(TASKS_PAGE_VERSION, FILTER_TASKS_VERSION)
 
-    tasks = get_tasks(request, filter_params, page_number, per_page, obj=obj)
+    tasks = get_tasks(request, page_number, per_page, obj=obj, versions=versions, cursor=cursor, with_total=True)
 
-    fields = get_fields_for_filter(user=request.user, page="tasks")
+    fields = get_fields_for_filter(user=request.user, page="tasks", versions=versions)
     current_filter_params = get_current_filter_params(request=request, page="tasks")
 
     task_filter = TaskFilter(request.GET)
@@ -117,12 +155,17 @@ def get_task_view(request, task_id: int):
 
 @login_required
 def get_calendar_page(request):
-    page_number = request.GET.get("page", 1)
+    if response := drop_page_param(request):
+        return response
+
+    page_number = 1
     per_page = request.GET.get("per_page", 1000)
-    filter_params = urlencode({key: value for key, value in request.GET.items() if key not in ["page"]})
+    cursor = request.GET.get("cursor", "")
 
-    tasks = get_tasks(request, filter_params, page_number, per_page)
-    fields = get_fields_for_filter(user=request.user, page="tasks")
+    versions = CacheVersion.get_many(TASKS_PAGE_VERSION, FILTER_TASKS_VERSION)
+
+    tasks = get_tasks(request, page_number, per_page, versions=versions, cursor=cursor)
+    fields = get_fields_for_filter(user=request.user, page="tasks", versions=versions)
     current_filter_params = get_current_filter_params(request=request, page="tasks")
     task_filter = TaskFilter(request.GET)
 
@@ -161,7 +204,7 @@ def get_task_edit_form(request, task_id: int):
         "current_engineers": current_engineers,
         "ckeditor_form": ckeditor_form,
         "current_tags_edit": list(task.tags.all().values_list("tag_name", flat=True)),
-        "current_objects_edit": list(task.objects_set.all().values_list("id", flat=True)),
+        "current_objects_edit": list(task.objects_set.order_by("id").values("id", label=F("name"))),
     }
     return render(request, "components/task/edit_task_form.html", context)
 
@@ -169,8 +212,8 @@ def get_task_edit_form(request, task_id: int):
 @login_required
 def get_obj_edit_form(request, slug: int):
     obj = get_object_or_404(Object, slug=slug)
-    groups = GroupsTree({"user": request.user}).get_nodes()
-    tags = AllTagsTree({"user": request.user}).get_nodes()
+    # Теги и группы - те же деревья, что и в фильтре страницы объектов
+    fields = get_fields_for_filter(request.user, "objects")
 
     ckeditor__obj_form = CKEditorEditObjForm(initial={"description": obj.description})
 
@@ -178,10 +221,10 @@ def get_obj_edit_form(request, slug: int):
         "object": obj,
         "ckeditor__obj_form": ckeditor__obj_form,
 
-        "edit_tags_json": tags,
+        "edit_tags_url": fields["tags_url"],
         "edit_current_tags": list(obj.tags.all().values_list("tag_name", flat=True)),
 
-        "edit_groups_json": groups,
+        "edit_groups_url": fields["groups_url"],
         "edit_current_groups": list(obj.groups.all().values_list("id", flat=True)),
     }
     return render(request, "components/object/edit_obj_form.html", context)
@@ -230,3 +273,16 @@ def get_stat_page(request):
     stat = get_stat()
     context = {**stat}
     return render(request, 'stat_page.html', context)
+
+
+@login_required
+def get_objects_tree_level(request):
+    """
+    Дочерние объекты узла `?parent=` (без параметра - корни) для виджета выбора объектов.
+    У узлов с дочерними объектами `children` - null, их ветки запрашиваются при раскрытии.
+    """
+    parent = request.GET.get("parent", "")
+    context = {"user": request.user, "parent": int(parent) if parent.isdigit() else None}
+    # Готовый JSON уровня из кеша, без разбора и повторной сериализации
+    payload = CachedObjectsTreeLevel(context).get_cached_payload()
+    return payload_response(request, payload, data=b'{"nodes":' + payload.data + b"}")
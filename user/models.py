@@ -1,9 +1,15 @@
 from django.contrib.auth.models import AbstractUser
 
+from tasks.services.request_cache import memoize
+
 
 class User(AbstractUser):
 
     def get_engineer_or_none(self):
+        # Отсутствие инженера Django не кеширует на экземпляре, поэтому запоминаем результат на время запроса
+        return memoize(f"user_engineer:{self.pk}", self._get_engineer_or_none)
+
+    def _get_engineer_or_none(self):
         try:
             return getattr(self, "engineer")
         except Exception: